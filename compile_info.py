@@ -3,33 +3,698 @@
     Compile all information requested by the config .json file.
 """
 
-from glob import iglob
+from argparse import ArgumentParser, ArgumentTypeError
+from contextlib import contextmanager
+from typing import (
+    Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+)
 import json
+import math
+import os
+import random
+import time
+import zlib
+
+from pandas.core.frame import DataFrame
 
 from file_definitions import *
+from file_definitions.file_definition_utilities import (
+    PARSE_ERRORS, CheckedReader
+)
+from file_discovery import (
+    DiscoveredFile, discover, find_duplicates, open_asset, pattern_root
+)
+from result_store import ResultStore
+from scheduler import Scheduler, memory_budget, time_budget
 from value_range_logger import ValueRangeLogger
 
 
-if __name__ == "__main__":
-    with open(".\\config.json", encoding="utf-8") as config:
+def new_logger(current_format: dict) -> ValueRangeLogger:
+    value_logger = ValueRangeLogger(
+        current_format["var_to_check"],
+        exact_bits=current_format.get("exact_bits", False),
+        batch_size=current_format.get("batch_size", 0)
+    )
+    value_logger.set_data_type(current_format["data_type"])
+    return value_logger
+
+
+@contextmanager
+def parsed_file(
+    data_type: type,
+    file_path: str,
+    hardened: bool = False,
+    timeout: float = 0,
+    memory_limit: int = 0,
+    max_records: int = 0,
+    seed: int = 0,
+    streaming: bool = False
+):
+    """
+    Parse a file into a data_type kept open inside the block, hardened
+    parsing checks every seek and read against the file size and a file
+    taking more than timeout seconds or growing the address space by more
+    than memory_limit bytes is given up on, raises one of PARSE_ERRORS for
+    a malformed file.
+    With max_records, a data type able to sample its records only decodes
+    max_records of each list picked at random from the seed and the path.
+    With streaming, a data type able to read its records in chunks only
+    decodes them when they are counted inside the block
+    """
+    with open_asset(file_path) as reader, time_budget(timeout), \
+            memory_budget(memory_limit):
+        if hardened:
+            reader = CheckedReader(reader)
+        # Reject malformed files before decoding them
+        if hasattr(data_type, "probe") and \
+                not data_type.probe(reader).valid:
+            raise ValueError(f"{file_path} failed its probe")
+        reader.seek(0)
+        if max_records and hasattr(data_type, "sample_records"):
+            file_data_structure = data_type(reader, streaming=True)
+            file_data_structure.sample_records(
+                max_records, random.Random(f"{seed}:{file_path}")
+            )
+        elif streaming and hasattr(data_type, "streamedLists"):
+            file_data_structure = data_type(reader, streaming=True)
+        else:
+            file_data_structure = data_type(reader)
+        yield file_data_structure
+
+
+def parse_file(
+    data_type: type,
+    file_path: str,
+    hardened: bool = False,
+    timeout: float = 0,
+    memory_limit: int = 0,
+    max_records: int = 0,
+    seed: int = 0
+):
+    """Structure parsed by parsed_file, every record is decoded"""
+    with parsed_file(
+        data_type, file_path, hardened, timeout, memory_limit, max_records,
+        seed
+    ) as file_data_structure:
+        return file_data_structure
+
+
+def read_file(
+    data_type: type,
+    file_path: str,
+    value_logger: ValueRangeLogger,
+    hardened: bool = False,
+    timeout: float = 0,
+    memory_limit: int = 0,
+    max_records: int = 0,
+    seed: int = 0,
+    streaming: bool = False
+) -> None:
+    """
+    Parse a file with parsed_file and count its values in value_logger,
+    a streamed file is counted inside parsed_file in a logger of its own,
+    merged once every record is read
+    """
+    file_logger = None
+    try:
+        with parsed_file(
+            data_type, file_path, hardened, timeout, memory_limit,
+            max_records, seed, streaming
+        ) as file_data_structure:
+            if getattr(file_data_structure, "streaming", False):
+                file_logger = ValueRangeLogger(
+                    list(value_logger.logged_var), value_logger.exact_bits
+                )
+                file_logger.update(file_data_structure)
+    except PARSE_ERRORS as error:
+        value_logger.file_not_read(
+            file_path, reason=f"{type(error).__name__}: {error}"
+        )
+        return
+
+    value_logger.file_read(file_path)
+    if file_logger is not None:
+        value_logger.merge(file_logger)
+        return
+    try:
+        value_logger.update(file_data_structure)
+    except IndexError:
+        return
+
+
+def read_format_file(
+    current_format: dict,
+    file_path: str,
+    value_logger: ValueRangeLogger
+) -> None:
+    """read_file with the data type, parse limits and sample of a format"""
+    read_file(
+        globals()[current_format["data_type"]],
+        file_path,
+        value_logger,
+        current_format.get("hardened", False),
+        current_format.get("timeout", 0),
+        current_format.get("memory_limit", 0) * 1024 * 1024,
+        current_format.get("max_records", 0),
+        current_format.get("seed", 0),
+        current_format.get("streaming", False)
+    )
+
+
+def read_copies(
+    current_format: dict,
+    file_path: str,
+    copies: List[str],
+    value_logger: ValueRangeLogger
+) -> None:
+    """Parse a file once and count it again for each of its copies"""
+    if not copies:
+        read_format_file(current_format, file_path, value_logger)
+        return
+    file_logger = new_logger(current_format)
+    read_format_file(current_format, file_path, file_logger)
+    for copy in copies:
+        file_logger.file_duplicate(copy, file_path)
+    value_logger.merge(file_logger, factor=1 + len(copies))
+
+
+def in_shard(file_path: str, root: str, shard: Tuple[int, int]) -> bool:
+    """
+    Whether a file belongs to shard i of N, decided from its path relative
+    to the root of the pattern so every machine splits the files the same
+    """
+    index, count = shard
+    relative = os.path.relpath(file_path, root).replace(os.sep, "/")
+    return zlib.crc32(relative.encode("utf-8")) % count == index
+
+
+def sample_files(
+    files: Sequence[DiscoveredFile],
+    fraction: float,
+    seed: int = 0
+) -> List[DiscoveredFile]:
+    """
+    Random share of the files of each directory, the files of a directory
+    are shuffled from the seed and the directory only, so a larger fraction
+    with the same seed keeps every file of a smaller one
+    """
+    directories: Dict[str, List[DiscoveredFile]] = {}
+    for file in files:
+        directories.setdefault(os.path.dirname(file.path), []).append(file)
+
+    sample = []
+    for directory, directory_files in directories.items():
+        generator = random.Random(f"{seed}:{directory}")
+        # Rounded at random so each directory keeps fraction of its files
+        # on average, even those holding a single file
+        count = math.floor(
+            fraction * len(directory_files) + generator.random()
+        )
+        directory_files.sort(key=lambda file: file.path)
+        generator.shuffle(directory_files)
+        sample.extend(directory_files[:count])
+    return sample
+
+
+class FormatFiles(NamedTuple):
+    """Files to parse for a format"""
+    files: List[DiscoveredFile]
+    copies: Dict[str, List[str]]
+    # Files matched before sampling, 0 when every file is parsed
+    population: int
+
+
+def discover_format_files(current_format: dict) -> FormatFiles:
+    """
+    Files matched by a format, only those of its shard if it has one and
+    a sample of them if asked, with dedup only the first of identical files
+    is kept and the others are returned as its copies
+    """
+    pattern = current_format["files"]
+    files = discover(pattern)
+    shard = current_format.get("shard")
+    if shard:
+        root = pattern_root(pattern)
+        files = (file for file in files if in_shard(file.path, root, shard))
+    files = list(files)
+
+    population = 0
+    fraction = current_format.get("sample", 1)
+    if fraction < 1:
+        population = len(files)
+        files = sample_files(files, fraction, current_format.get("seed", 0))
+    if current_format.get("dedup", False):
+        return FormatFiles(*find_duplicates(files), population)
+    return FormatFiles(files, {}, population)
+
+
+def write_results(
+    current_format: dict,
+    value_logger: ValueRangeLogger
+) -> None:
+    """Write the logs, or the partial result of a shard"""
+    shard = current_format.get("shard")
+    if not shard:
+        value_logger.write_log()
+        return
+    if not os.path.exists(value_logger.log_path):
+        os.makedirs(value_logger.log_path)
+    value_logger.shard = tuple(shard)
+    value_logger.save(os.path.join(
+        value_logger.log_path, f"partial_{shard[0]}of{shard[1]}.pkl.gz"
+    ))
+
+
+def check_partials(partials: List[Tuple[str, ValueRangeLogger]]) -> None:
+    """
+    Raise a ValueError unless the partials of a data type were counted with
+    the same settings, hold each shard of a single run once and every
+    shard of it, and never count a file twice
+    """
+    first_path, first = partials[0]
+    settings = (sorted(first.logged_var), first.exact_bits)
+    shards: Dict[int, str] = {}
+    counts = set()
+    for path, partial in partials:
+        if (sorted(partial.logged_var), partial.exact_bits) != settings:
+            raise ValueError(
+                f"{path} was counted with other settings than {first_path}"
+            )
+        # Spilled partials aren't shards
+        shard = getattr(partial, "shard", None)
+        counts.add(shard and shard[1])
+        if shard:
+            if shard[0] in shards:
+                raise ValueError(
+                    f"{path} and {shards[shard[0]]} are both shard"
+                    f" {shard[0]}/{shard[1]}"
+                )
+            shards[shard[0]] = path
+
+    if len(counts) > 1:
+        raise ValueError(
+            f"The partials of {first.log_path} come from runs split in"
+            " different numbers of shards"
+        )
+    count = counts.pop()
+    missing = [
+        f"{index}/{count}" for index in range(count or 0)
+        if index not in shards
+    ]
+    if missing:
+        raise ValueError(
+            f"The partials of {first.log_path} miss the shards"
+            f" {', '.join(missing)}"
+        )
+
+    owners: Dict[str, str] = {}
+    for path, partial in partials:
+        for file in partial.read_files + partial.error:
+            if owners.setdefault(file, path) != path:
+                raise ValueError(
+                    f"{file} was counted by both {owners[file]} and {path}"
+                )
+
+
+def merge_partials(patterns: Sequence[str]) -> None:
+    """
+    Combine the partial results of shards into the logs of each type, see
+    check_partials for the partials accepted
+    """
+    partials: Dict[str, List[Tuple[str, ValueRangeLogger]]] = {}
+    paths = set()
+    for pattern in patterns:
+        for discovered in discover(pattern):
+            # A partial matched by several patterns is only merged once
+            if discovered.path in paths:
+                continue
+            paths.add(discovered.path)
+            partial = ValueRangeLogger.load(discovered.path)
+            partials.setdefault(partial.log_path, []).append(
+                (discovered.path, partial)
+            )
+
+    for group in partials.values():
+        check_partials(group)
+    for group in partials.values():
+        value_logger = group[0][1]
+        for _, partial in group[1:]:
+            value_logger.merge(partial)
+        value_logger.write_log()
+        print(
+            f"{os.path.basename(value_logger.log_path)} : "
+            f"{len(value_logger.read_files)} files read, "
+            f"{len(value_logger.error)} errors"
+        )
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ArgumentTypeError(f"{text} isn't of the form i/N")
+    if not 0 <= index < count:
+        raise ArgumentTypeError(f"{text} needs 0 <= i < N")
+    return index, count
+
+
+def investigate(current_format: dict) -> None:
+    """Count the values of var_to_check across the files"""
+    value_logger = new_logger(current_format)
+    files, copies, value_logger.population = \
+        discover_format_files(current_format)
+
+    for discovered in files:
+        read_copies(
+            current_format,
+            discovered.path,
+            copies.get(discovered.path, []),
+            value_logger
+        )
+
+    write_results(current_format, value_logger)
+
+
+def scan_files(
+    file_paths: List[str],
+    current_format: dict,
+    copies: Optional[Dict[str, List[str]]] = None
+) -> ValueRangeLogger:
+    """Count the values of a batch of files inside a worker"""
+    value_logger = new_logger(current_format)
+    copies = copies or {}
+    for file_path in file_paths:
+        read_copies(
+            current_format, file_path, copies.get(file_path, []), value_logger
+        )
+    value_logger.flush()
+    return value_logger
+
+
+def investigate_in_parallel(current_format: dict, workers: int) -> None:
+    """Count the values across a pool of processes, largest files first"""
+    value_logger = new_logger(current_format)
+    scheduler = Scheduler(
+        workers, current_format.get("memory_limit", 0) * 1024 * 1024
+    )
+    files, copies, value_logger.population = \
+        discover_format_files(current_format)
+
+    def unread(file_path: str, error: MemoryError) -> ValueRangeLogger:
+        batch_logger = new_logger(current_format)
+        batch_logger.file_not_read(
+            file_path, reason=f"{type(error).__name__}: {error}"
+        )
+        for copy in copies.get(file_path, []):
+            batch_logger.file_duplicate(copy, file_path)
+        return batch_logger
+
+    for batch_logger in scheduler.run(
+        scan_files, files, current_format, copies, on_error=unread
+    ):
+        value_logger.merge(batch_logger)
+
+    write_results(current_format, value_logger)
+    print(f"{current_format['data_type']} : {scheduler.utilization()}")
+
+
+def read_each_file(
+    current_format: dict,
+    files: List[DiscoveredFile]
+) -> Iterator[Tuple[DiscoveredFile, ValueRangeLogger]]:
+    """
+    Yield each file with a logger of its own counts, with dedup identical
+    files are parsed once and their copies get the same counts
+    """
+    copies = {}
+    if current_format.get("dedup", False):
+        by_path = {file.path: file for file in files}
+        files, copies = find_duplicates(files)
+    for file in files:
+        file_logger = new_logger(current_format)
+        read_format_file(current_format, file.path, file_logger)
+        yield file, file_logger
+        for copy in copies.get(file.path, []):
+            yield by_path[copy], file_logger.for_copy(copy, file.path)
+
+
+def investigate_incrementally(
+    current_format: dict,
+    store: ResultStore
+) -> None:
+    """
+    Only parse the files changed since the last run, the counts of the
+    others come from the store, with dedup identical changed files are
+    parsed once
+    """
+    data_type_name = current_format["data_type"]
+    settings = ResultStore.settings(current_format)
+    file_paths = []
+    changed = []
+
+    for file in discover(current_format["files"]):
+        file_paths.append(file.path)
+        if not store.is_current(data_type_name, file.path, file.size,
+                                file.mtime, settings):
+            changed.append(file)
+    for file, value_logger in read_each_file(current_format, changed):
+        store.replace_file(data_type_name, file.path, file.size, file.mtime,
+                           settings, value_logger)
+
+    store.remove_missing(data_type_name, file_paths)
+    write_results(current_format, store.to_logger(
+        data_type_name,
+        current_format["var_to_check"],
+        current_format.get("exact_bits", False)
+    ))
+
+
+class FormatWatcher:
+    """
+    Keep the counts of every file matched by a format in memory and
+    update them when files are added, changed or removed
+    """
+
+    def __init__(self, current_format: dict) -> None:
+        self.current_format = current_format
+        self.value_logger = new_logger(current_format)
+        self.files: Dict[str, Tuple[int, float, ValueRangeLogger]] = {}
+
+    def refresh(self) -> bool:
+        """
+        Reparse changed files, return whether anything changed, with dedup
+        identical changed files are parsed once
+        """
+        seen = set()
+        changed = []
+
+        for file in discover(self.current_format["files"]):
+            seen.add(file.path)
+            previous = self.files.get(file.path)
+            if not previous or previous[:2] != (file.size, file.mtime):
+                changed.append(file)
+
+        for file, file_logger in read_each_file(self.current_format, changed):
+            previous = self.files.get(file.path)
+            if previous:
+                self.value_logger.merge(previous[2], factor=-1)
+            self.value_logger.merge(file_logger)
+            self.files[file.path] = (file.size, file.mtime, file_logger)
+
+        removed = set(self.files) - seen
+        for file_path in removed:
+            self.value_logger.merge(self.files.pop(file_path)[2], factor=-1)
+
+        return bool(changed or removed)
+
+
+def watch(formats_to_investigate: List[dict], interval: float) -> None:
+    """Poll the files every interval seconds and rewrite changed logs"""
+    watchers = [
+        FormatWatcher(current_format)
+        for current_format in formats_to_investigate
+    ]
+    while True:
+        for watcher in watchers:
+            if watcher.refresh():
+                watcher.value_logger.write_log()
+                print(
+                    f"{time.strftime('%X')} "
+                    f"{watcher.current_format['data_type']} updated, "
+                    f"{len(watcher.files)} files"
+                )
+        time.sleep(interval)
+
+
+def triage(current_format: dict) -> None:
+    """Classify the files by only reading their headers"""
+    data_type = globals()[current_format["data_type"]]
+    rows = []
+
+    for discovered in discover(current_format["files"]):
+        file_path = discovered.path
+        with open_asset(file_path) as reader:
+            probe = data_type.probe(reader)
+        rows.append({
+            "Path": file_path,
+            "Valid": probe.valid,
+            "Reason": probe.reason,
+            "Size": probe.fileSize,
+            **probe.counts
+        })
+
+    log_path = os.path.join("results", data_type.__name__)
+    if not os.path.exists(log_path):
+        os.makedirs(log_path)
+    with open(os.path.join(log_path, "triage.csv"), "wb") as writer:
+        DataFrame(rows).to_csv(writer)
+    valid = sum(row["Valid"] for row in rows)
+    print(f"{data_type.__name__} : {valid} valid, {len(rows) - valid} invalid")
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="parse the files across this many processes"
+    )
+    parser.add_argument(
+        "--store",
+        help="SQLite database keeping the counts of every file between runs"
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="keep running and update the logs when files change"
+    )
+    parser.add_argument(
+        "--triage",
+        action="store_true",
+        help="only probe the headers of the files to find malformed ones"
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="i/N",
+        help="only parse the i-th of N parts of the files and write a"
+             " partial result"
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="PARTIAL",
+        help="combine the partial results of shards into the logs"
+    )
+    parser.add_argument(
+        "--sample",
+        type=float,
+        metavar="FRACTION",
+        help="only parse this share of the files of each directory and"
+             " estimate the counts over every file"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="seed of the sample, keep it to refine a sample"
+    )
+    parser.add_argument(
+        "--max-records",
+        type=int,
+        metavar="N",
+        help="only decode N records picked at random from each list of"
+             " records of a file and estimate the counts over every record"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="decode the vertices, stride data and indexes of a model one"
+             " chunk at a time while counting them"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="parse identical files once and count them once per copy"
+    )
+    parser.add_argument(
+        "--hardened",
+        action="store_true",
+        help="check every read against the file size before doing it"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="give up on a file taking longer than this to parse"
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        metavar="MB",
+        help="address space a file may take on top of what the process"
+             " already uses while it is parsed, and each worker process on"
+             " top of what it uses when it starts"
+    )
+    args = parser.parse_args()
+    if args.merge:
+        try:
+            merge_partials(args.merge)
+        except ValueError as error:
+            parser.error(str(error))
+        return
+    if (args.shard or args.sample) and \
+            (args.store or args.watch or args.triage):
+        parser.error(
+            "--shard and --sample can't be used with --store, --watch or"
+            " --triage"
+        )
+    store = ResultStore(args.store) if args.store else None
+
+    with open(args.config, encoding="utf-8") as config:
         formats_to_investigate = json.load(config)
         formats_to_investigate = formats_to_investigate["to_investigate"]
         for current_format in formats_to_investigate:
-            value_logger = ValueRangeLogger(current_format["var_to_check"])
-            data_type = globals()[current_format["data_type"]]
-
-            for file_path in iglob(current_format["files"]):
-                try:
-                    with open(file_path, "rb") as reader:
-                        file_data_structure = data_type(reader)
-                except ValueError:
-                    value_logger.file_not_read(file_path)
-                    continue
-
-                value_logger.file_read(file_path)
-                try:
-                    value_logger.update(file_data_structure)
-                except IndexError:
-                    continue
-
-            value_logger.write_log()
+            if args.shard:
+                current_format["shard"] = args.shard
+            if args.sample:
+                current_format["sample"] = args.sample
+            if args.seed is not None:
+                current_format["seed"] = args.seed
+            if args.max_records:
+                current_format["max_records"] = args.max_records
+            if args.streaming:
+                current_format["streaming"] = True
+            if args.dedup:
+                current_format["dedup"] = True
+            if args.hardened:
+                current_format["hardened"] = True
+            if args.timeout:
+                current_format["timeout"] = args.timeout
+            if args.memory_limit:
+                current_format["memory_limit"] = args.memory_limit
+            if store and current_format.get("max_records"):
+                parser.error(
+                    "--max-records can't be used with --store, the share of"
+                    " the records read isn't stored"
+                )
+        if args.watch:
+            watch(formats_to_investigate, args.watch)
+            return
+        for current_format in formats_to_investigate:
+            if args.triage:
+                triage(current_format)
+            elif store:
+                investigate_incrementally(current_format, store)
+            elif args.workers:
+                investigate_in_parallel(current_format, args.workers)
+            else:
+                investigate(current_format)
+
+    if store:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
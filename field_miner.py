@@ -0,0 +1,246 @@
+# coding=utf-8
+"""
+    Look for relations between fields listed under "correlate" in the
+    config .json file, in a single parallel pass over the files.
+    Pairs of fields get their correlation and most frequent value pairs,
+    each field is checked against the file size and section boundaries
+    to find likely offsets, sizes and counts.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import math
+import os
+
+from pandas.core.frame import DataFrame
+
+from file_definitions import *
+from file_definitions.file_definition_utilities import PARSE_ERRORS
+from file_discovery import discover, open_asset
+from value_range_logger import canonical_key, extract_values
+
+
+BOUNDARY_KINDS = ("fileSize", "offset", "end", "size", "count")
+
+
+def field_values(file_data_structure, field: str) -> Optional[List[float]]:
+    """
+    Numeric values of a field, a field can be a sum of variables like
+    "self.a[0] + self.a[1]" which are added element wise
+    """
+    columns = []
+    for var_name in field.split("+"):
+        values = []
+        for value in extract_values(file_data_structure, var_name.strip()):
+            elements = value if isinstance(value, tuple) else (value,)
+            values.extend(
+                element for element in elements
+                if isinstance(element, (int, float))
+            )
+        columns.append(values)
+
+    if any(len(column) != len(columns[0]) for column in columns):
+        return None
+    return [sum(elements) for elements in zip(*columns)]
+
+
+class CorrelationMiner:
+    """
+    Statistics on the values of fields, miners of different files can be
+    merged together
+    """
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields = list(fields)
+        self.files = 0
+        # Sums needed for the pearson coefficient of each aligned pair
+        self.pairs: Dict[Tuple[str, str], List[float]] = {
+            pair: [0, 0.0, 0.0, 0.0, 0.0, 0.0, 0]
+            for pair in combinations(self.fields, 2)
+        }
+        self.co_occurrences: Dict[Tuple[str, str], Dict[Tuple, int]] = {
+            pair: {} for pair in self.pairs
+        }
+        self.boundaries: Dict[str, Dict[str, int]] = {
+            field: {"samples": 0, "inFile": 0,
+                    **{kind: 0 for kind in BOUNDARY_KINDS}}
+            for field in self.fields
+        }
+
+    def add_file(self, file_data_structure, file_size: int) -> None:
+        self.files += 1
+        values = {
+            field: field_values(file_data_structure, field)
+            for field in self.fields
+        }
+
+        sections = file_data_structure.sections()
+        limits = {
+            "fileSize": {file_size},
+            "offset": {section.offset for section in sections},
+            "end": {section.offset + section.size for section in sections},
+            "size": {section.size for section in sections},
+            "count": {section.count for section in sections},
+        }
+        for field, field_value in values.items():
+            if field_value is None:
+                continue
+            stats = self.boundaries[field]
+            for value in field_value:
+                stats["samples"] += 1
+                stats["inFile"] += 0 <= value <= file_size
+                for kind in BOUNDARY_KINDS:
+                    stats[kind] += value in limits[kind]
+
+        for (first, second), sums in self.pairs.items():
+            if values[first] is None or values[second] is None or \
+                    len(values[first]) != len(values[second]):
+                continue
+            co_occurrence = self.co_occurrences[(first, second)]
+            for a, b in zip(values[first], values[second]):
+                key = canonical_key((a, b))
+                co_occurrence[key] = co_occurrence.get(key, 0) + 1
+                # A NaN or infinity would turn every sum into NaN
+                if not math.isfinite(a) or not math.isfinite(b):
+                    continue
+                sums[0] += 1
+                sums[1] += a
+                sums[2] += b
+                sums[3] += a * a
+                sums[4] += b * b
+                sums[5] += a * b
+                sums[6] += a == b
+
+    def merge(self, other: "CorrelationMiner") -> None:
+        self.files += other.files
+        for pair, sums in other.pairs.items():
+            self.pairs[pair] = [a + b for a, b in zip(self.pairs[pair], sums)]
+            co_occurrence = self.co_occurrences[pair]
+            for key, count in other.co_occurrences[pair].items():
+                # NaN keys don't survive pickling as the same object
+                key = canonical_key(key)
+                co_occurrence[key] = co_occurrence.get(key, 0) + count
+        for field, stats in other.boundaries.items():
+            for kind, count in stats.items():
+                self.boundaries[field][kind] += count
+
+    def write_log(self, log_path: str, top_pairs: int = 10) -> None:
+        if not os.path.exists(log_path):
+            os.makedirs(log_path)
+
+        rows = []
+        for (first, second), sums in self.pairs.items():
+            n, sum_a, sum_b, sum_aa, sum_bb, sum_ab, equal = sums
+            pearson = math.nan
+            if n:
+                covariance = sum_ab - sum_a * sum_b / n
+                variance = (sum_aa - sum_a ** 2 / n)\
+                    * (sum_bb - sum_b ** 2 / n)
+                if variance > 0:
+                    pearson = covariance / math.sqrt(variance)
+            co_occurrence = sorted(
+                self.co_occurrences[(first, second)].items(),
+                key=lambda item: item[1],
+                reverse=True
+            )
+            rows.append({
+                "FieldA": first,
+                "FieldB": second,
+                "Samples": n,
+                "Pearson": pearson,
+                "EqualRate": equal / n if n else math.nan,
+                "TopPairs": " ".join(
+                    f"{a}/{b}:{count}"
+                    for (a, b), count in co_occurrence[:top_pairs]
+                ),
+            })
+        with open(os.path.join(log_path, "correlations.csv"), "wb") as writer:
+            DataFrame(rows).to_csv(writer)
+
+        rows = []
+        for field, stats in self.boundaries.items():
+            samples = stats["samples"]
+            rows.append({
+                "Field": field,
+                "Samples": samples,
+                **{
+                    f"{kind}Rate": stats[kind] / samples if samples
+                    else math.nan
+                    for kind in ("inFile",) + BOUNDARY_KINDS
+                },
+            })
+        with open(os.path.join(log_path, "boundaries.csv"), "wb") as writer:
+            DataFrame(rows).to_csv(writer)
+
+
+def mine_files(
+    data_type_name: str,
+    fields: Sequence[str],
+    file_paths: Sequence[str]
+) -> Tuple[CorrelationMiner, List[str]]:
+    """Mine a chunk of files, return the miner and the unreadable files"""
+    data_type = globals()[data_type_name]
+    miner = CorrelationMiner(fields)
+    errors = []
+    for file_path in file_paths:
+        try:
+            with open_asset(file_path) as reader:
+                file_data_structure = data_type(reader)
+                file_size = reader.seek(0, os.SEEK_END)
+            miner.add_file(file_data_structure, file_size)
+        except PARSE_ERRORS:
+            errors.append(file_path)
+    return miner, errors
+
+
+def mine(
+    current_format: dict,
+    processes: Optional[int] = None,
+    chunk_size: int = 16
+) -> CorrelationMiner:
+    file_paths = [
+        discovered.path for discovered in discover(current_format["files"])
+    ]
+    chunks = [
+        file_paths[i:i + chunk_size]
+        for i in range(0, len(file_paths), chunk_size)
+    ]
+    miner = CorrelationMiner(current_format["correlate"])
+    errors = []
+    with ProcessPoolExecutor(processes) as executor:
+        for chunk_miner, chunk_errors in executor.map(
+            mine_files,
+            [current_format["data_type"]] * len(chunks),
+            [current_format["correlate"]] * len(chunks),
+            chunks
+        ):
+            miner.merge(chunk_miner)
+            errors.extend(chunk_errors)
+
+    for error in errors:
+        print(f"Couldn't read {error}")
+    return miner
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as config:
+        formats_to_investigate = json.load(config)["to_investigate"]
+    for current_format in formats_to_investigate:
+        if "correlate" not in current_format:
+            continue
+        miner = mine(current_format, args.processes)
+        miner.write_log(
+            os.path.join("results", current_format["data_type"])
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 # coding=utf-8
 
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from io import BufferedReader
+from typing import Dict, List, Sequence, Union
+import mmap
 import os
+import struct
 
 from numpy import byte
 
@@ -13,28 +17,142 @@ else:
 
 
 class AlFile:
+    """
+    Binary animation file (.al)
+    With processes > 1 the animation data blocks of a file on disk are
+    decoded concurrently from memory mappings of it, those of an archive
+    member or of a hardened reader are decoded from reader
+    When streaming, animation data is only decoded by read_animation_data
+    and reader must stay open
+    """
 
-    def __init__(self, reader: BufferedReader) -> None:
+    def __init__(
+        self,
+        reader: BufferedReader,
+        processes: int = 1,
+        streaming: bool = False
+    ) -> None:
         if reader:
             self.header = AlHeader(reader)
             self.skeleton = Skeleton(
                 reader, self.header.animationMetadataOffset
                 )
+            self.metadataOffset = reader.tell()
+            self.fileSize = reader.seek(0, os.SEEK_END)
+            reader.seek(self.metadataOffset)
             self.animationMetadataArray = [
                 AnimationMetadata(reader)
                 for _ in range(self.header.animationCount)
                 ]
-            self.animationDataArray = [
-                AnimationData(
-                    reader,
-                    self.animationMetadataArray[i].animationOffset
+            offsets = [
+                metadata.animationOffset
+                for metadata in self.animationMetadataArray
+                ]
+            self.streaming = streaming
+            if streaming:
+                self.reader = reader
+                self.animationDataArray = []
+                return
+            if processes > 1 and on_disk(reader):
+                self.animationDataArray = decode_animation_data(
+                    reader.name, offsets, processes
                     )
-                for i in range(self.header.animationCount)
+                return
+            self.animationDataArray = [
+                AnimationData(reader, offset) for offset in offsets
                 ]
             return
         else:
             raise ValueError("Need a valid BufferedReader")
 
+    @staticmethod
+    def probe(reader: BufferedReader) -> Probe:
+        """
+        Validate the header against the size of the file without decoding
+        anything else
+        """
+        path = getattr(reader, "name", "")
+        fileSize = reader.seek(0, os.SEEK_END)
+        reader.seek(0)
+
+        def invalid(reason: str, counts: dict = {}) -> Probe:
+            return Probe(path, "AlFile", False, reason, fileSize, counts)
+
+        if fileSize < 0x68:
+            return invalid("File too small to hold the headers")
+        try:
+            header = AlHeader(reader)
+        except ValueError as error:
+            return invalid(str(error))
+        boneCount = read_int32(reader)
+
+        counts = {
+            "animationCount": header.animationCount,
+            "boneCount": boneCount,
+        }
+        metadataEnd = 0x60 + header.animationMetadataOffset\
+            + 0x94 * header.animationCount
+        if metadataEnd > fileSize:
+            return invalid("Animation metadata goes past the end", counts)
+        if 8 + boneCount * 0x24 > header.animationMetadataOffset:
+            return invalid("Bones don't fit in the skeleton", counts)
+
+        return Probe(path, "AlFile", True, "", fileSize, counts)
+
+    def read_animation_data(
+        self,
+        index: int,
+        decode_keyframes: bool = True
+    ) -> "AnimationData":
+        if not self.streaming:
+            return self.animationDataArray[index]
+        return AnimationData(
+            self.reader,
+            self.animationMetadataArray[index].animationOffset,
+            decode_keyframes
+            )
+
+    def sample_records(self, maxRecords: int, generator) -> None:
+        """
+        Decode at most maxRecords animations picked by generator, a
+        random.Random, out of a streaming file, sampledRecords holds how
+        many were decoded out of how many
+        """
+        count = len(self.animationMetadataArray)
+        indexes = sorted(
+            generator.sample(range(count), min(maxRecords, count))
+            )
+        self.animationDataArray = [
+            self.read_animation_data(index) for index in indexes
+            ]
+        self.sampledRecords = {"animationDataArray": (len(indexes), count)}
+        # The sample is every record left to read
+        self.streaming = False
+
+    def sections(self) -> List[Section]:
+        """Offset, size and record count of every section of the file"""
+        metadataSize = 0x94 * self.header.animationCount
+        sections = [
+            Section("header", 0, 0x60, 1),
+            Section("skeleton", 0x60, self.metadataOffset - 0x60, 1),
+            Section(
+                "animationMetadataArray", self.metadataOffset,
+                metadataSize, self.header.animationCount
+                ),
+        ]
+        # Animation data blocks end where the next one begins
+        offsets = sorted(
+            metadata.animationOffset
+            for metadata in self.animationMetadataArray
+            )
+        ends = dict(zip(offsets, offsets[1:] + [self.fileSize]))
+        for i, metadata in enumerate(self.animationMetadataArray):
+            offset = metadata.animationOffset
+            sections.append(Section(
+                f"animationDataArray[{i}]", offset, ends[offset] - offset, 1
+                ))
+        return sections
+
 
 class AlHeader:
     """
@@ -149,17 +267,21 @@ class AnimationEvent:
         self.bone = bytearray()
         c = reader.read(1)
         while c != b'\x00':
+            if not c:
+                raise ValueError("Unterminated bone name in AnimationEvent")
             self.bone.append(int.from_bytes(c, 'little'))
             c = reader.read(1)
-        self.bone = self.bone.decode("utf-8")
+        self.bone = string_table.decode(bytes(self.bone))
 
         reader.seek(self.nameOffset + offset, os.SEEK_SET)
         self.name = bytearray()
         c = reader.read(1)
         while c != b'\x00':
+            if not c:
+                raise ValueError("Unterminated name in AnimationEvent")
             self.name.append(int.from_bytes(c, 'little'))
             c = reader.read(1)
-        self.name = self.name.decode("utf-8")
+        self.name = string_table.decode(bytes(self.name))
 
         reader.seek(currentPos)
         return
@@ -167,7 +289,8 @@ class AnimationEvent:
 class AnimationKeyFrame:
     def __init__(self, reader: BufferedReader, numBones: int) -> None:
         self.boneRotation = [
-            read_vector(reader, 3, read_int16) for _ in range(numBones)
+            [read_int16(reader, signed=True) for _ in range(3)]
+            for _ in range(numBones)
         ]
         self.boneRotation = [
             [val * 0.000030518509 for val in bone]
@@ -179,8 +302,16 @@ class AnimationData:
     """
     Maybe binary data of an animation
     Size : 0x90 + ???
+    Keyframes are frameCount - 1 blocks of frameSize signed int16 triples
+    starting at keyFramesOffset, without decode_keyframes keyFrames is None
+    and single frames are decoded by frame or pose from the same reader
     """
-    def __init__(self, reader: BufferedReader, offset: int) -> None:
+    def __init__(
+        self,
+        reader: BufferedReader,
+        offset: int,
+        decode_keyframes: bool = True
+    ) -> None:
         if reader:
             reader.seek(offset)
             self.animationInfo = AnimationHeader(reader)
@@ -225,10 +356,13 @@ class AnimationData:
             ]
 
             frameSize = self.unknowns1[0] + self.unknowns1[1]
-            self.keyFrames = [
-                [read_vector(reader, 3, read_int16) for _ in range(frameSize)]
-                for _ in range(self.animationInfo.frameCount - 1)
-            ]
+            self.frameSize = frameSize
+            self.keyFramesOffset = reader.tell()
+            self.keyFrameCount = max(0, self.animationInfo.frameCount - 1)
+            if not decode_keyframes:
+                self.keyFrames = None
+                return
+            self.keyFrames = self.read_keyframes(reader)
             """self.keyFrames = [
                 [[val / 32767.0 for val in vector] for vector in frame]
                 for frame in self.keyFrames
@@ -237,10 +371,123 @@ class AnimationData:
         else:
             raise ValueError("Need a valid BufferedReader")
 
+    def read_keyframes(self, reader: BufferedReader) -> List[List[List[int]]]:
+        """Every keyframe, reader being at keyFramesOffset"""
+        return [
+            [
+                [read_int16(reader, signed=True) for _ in range(3)]
+                for _ in range(self.frameSize)
+            ]
+            for _ in range(self.keyFrameCount)
+        ]
+
+    def frame(
+        self,
+        reader: Union[BufferedReader, mmap.mmap],
+        index: int
+    ) -> List[List[int]]:
+        """
+        Keyframe at index, only its bytes are read from reader, which may be
+        the file or a memory mapping of it
+        """
+        if not 0 <= index < self.keyFrameCount:
+            raise IndexError(
+                f"Keyframe {index} out of {self.keyFrameCount} keyframes"
+            )
+        frameStruct = struct.Struct(f"<{3 * self.frameSize}h")
+        offset = self.keyFramesOffset + index * frameStruct.size
+        if isinstance(reader, (mmap.mmap, bytes, bytearray, memoryview)):
+            values = frameStruct.unpack_from(reader, offset)
+        else:
+            reader.seek(offset)
+            values = frameStruct.unpack(reader.read(frameStruct.size))
+        return [list(values[i:i + 3]) for i in range(0, len(values), 3)]
+
+    def pose(
+        self,
+        reader: Union[BufferedReader, mmap.mmap],
+        time: float,
+        interpolate: bool = True
+    ) -> List[List[float]]:
+        """
+        Keyframe values at time seconds, sampled at samplingRate keyframes
+        per second, cyclic animations wrap around. Only the one or two
+        keyframes around time are read, interpolated linearly or the
+        nearest one is returned.
+        Time 0 is the first keyframe, a leading bind pose isn't skipped,
+        and the last keyframe of a cyclic animation is taken as a copy of
+        the first so wrapping around lands back on keyframe 0
+        """
+        if not self.keyFrameCount:
+            raise ValueError("Animation without keyframes")
+        last = self.keyFrameCount - 1
+        position = time * self.animationInfo.samplingRate
+        if self.animationInfo.isCyclic and last:
+            position %= last
+        position = min(max(position, 0.0), float(last))
+
+        if not interpolate:
+            return self.frame(reader, round(position))
+        index = min(int(position), last)
+        weight = position - index
+        first = self.frame(reader, index)
+        if not weight:
+            return [[float(value) for value in vector] for vector in first]
+        second = self.frame(reader, index + 1)
+        return [
+            [a + (b - a) * weight for a, b in zip(vectorA, vectorB)]
+            for vectorA, vectorB in zip(first, second)
+        ]
+
+
+_mappedFiles: Dict[str, mmap.mmap] = {}
+
+
+def on_disk(reader) -> bool:
+    """Whether reader is a file of the file system other processes can map"""
+    try:
+        reader.fileno()
+    except (AttributeError, OSError):
+        return False
+    return os.path.isfile(getattr(reader, "name", ""))
+
+
+def _decode_mapped_animation_data(
+    filepath: str, offset: int
+) -> "AnimationData":
+    """Decode one AnimationData from a per process mapping of the file"""
+    mapped = _mappedFiles.get(filepath)
+    if mapped is None:
+        with open(filepath, "rb") as reader:
+            mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        _mappedFiles[filepath] = mapped
+    return AnimationData(mapped, offset)
+
+
+def decode_animation_data(
+    filepath: str, offsets: Sequence[int], processes: int
+) -> List["AnimationData"]:
+    """
+    Decode the AnimationData located at offsets across a pool of processes,
+    the result keeps the order of offsets
+    """
+    chunksize = max(1, len(offsets) // (processes * 4))
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(
+            _decode_mapped_animation_data,
+            [filepath] * len(offsets),
+            offsets,
+            chunksize=chunksize
+        ))
+
 
 def main():
     for filepath in glob(
-        "G:\\Lionhead Studios\\Black & White 2\\Data\\Art\\**\\**.al"
+        os.path.join(
+            "G:\\", "Lionhead Studios", "Black & White 2", "Data", "Art",
+            "**", "**.al"
+        ),
+        recursive=True
     ):
         test = True
         with open(filepath, "rb") as alTest:
@@ -1,19 +1,18 @@
 # coding=utf-8
 """ Structures of a .bwm with associated IO """
-from io import BufferedReader, BufferedWriter
+from io import BufferedReader, BufferedWriter, BytesIO
 from colorama import Fore, Style
-from typing import List
+from typing import List, NamedTuple, Optional, Tuple, Union
 from glob import glob
 from enum import Enum
 import struct
+import os
 
 if __name__ != "__main__":
     from .file_definition_utilities import *
 else:
     from file_definition_utilities import *
-    import filecmp
     import json
-    import os
 
 
 # Section for enumated type
@@ -49,9 +48,15 @@ class BWMFile:
 
     """
     '  Initialisize the data of a BWMFile
+    '  When streaming, vertices, stride data and indexes aren't loaded,
+    '  they are read on demand from the reader which must stay open
     """
+    streamChunkSize = 0x10000
+    # Lists read in chunks by iter_records, with the number of indexes
+    # selecting a list of records inside them
+    streamedLists = {"vertices": 0, "data": 1, "indexes": 0}
 
-    def __init__(self, reader: BufferedReader = None):
+    def __init__(self, reader: BufferedReader = None, streaming=False):
         self.fileHeader = BWMHeader(reader)
         self.modelHeader = LionheadModelHeader(reader)
         self.materialDefinitions = [
@@ -79,6 +84,30 @@ class BWMFile:
         ]
         self.strides = [Stride(reader)
                         for i in range(self.modelHeader.strideCount)]
+        self.streaming = streaming
+        if streaming:
+            self.reader = reader
+            self.vertices = []
+            self.data = [[] for stride in self.strides[1:]]
+            self.indexes = []
+            reader.seek(
+                sum(stride.stride for stride in self.strides)
+                * self.modelHeader.vertexCount
+                + 2 * self.modelHeader.indexCount,
+                os.SEEK_CUR
+            )
+        else:
+            self.read_buffers(reader)
+        if self.fileHeader.version > 5:
+            self.modelHeader.modelCleaveCount = read_int32(reader)
+            self.modelCleaves = [
+                (read_float(reader), read_float(reader), read_float(reader))
+                for i in range(self.modelHeader.modelCleaveCount)
+            ]
+
+        return
+
+    def read_buffers(self, reader: BufferedReader):
         self.vertices = [
             Vertex(self.strides[0], reader)
             for vertex in range(self.modelHeader.vertexCount)
@@ -93,14 +122,204 @@ class BWMFile:
         self.indexes = [
             read_int16(reader) for i in range(self.modelHeader.indexCount)
         ]
-        if self.fileHeader.version > 5:
-            self.modelHeader.modelCleaveCount = read_int32(reader)
-            self.modelCleaves = [
-                (read_float(reader), read_float(reader), read_float(reader))
-                for i in range(self.modelHeader.modelCleaveCount)
-            ]
 
-        return
+    def _read_section(
+        self,
+        name: str,
+        start: int,
+        count: int
+    ) -> Tuple[BytesIO, int]:
+        section = next(s for s in self.sections() if s.name == name)
+        count = max(0, min(count, section.count - start))
+        recordSize = section.size // section.count if section.count else 0
+        self.reader.seek(section.offset + start * recordSize)
+        return BytesIO(self.reader.read(count * recordSize)), count
+
+    def read_vertices(self, start: int, count: int) -> List["Vertex"]:
+        if not self.streaming:
+            return self.vertices[start:start + count]
+        chunk, count = self._read_section("vertices", start, count)
+        return [Vertex(self.strides[0], chunk) for i in range(count)]
+
+    def read_data(self, strideIndex: int, start: int, count: int) -> List:
+        """
+        '  Rows of self.data[strideIndex], stride data follows the vertices
+        """
+        if not self.streaming:
+            return self.data[strideIndex][start:start + count]
+        stride = self.strides[strideIndex + 1]
+        chunk, count = self._read_section(
+            f"data[{strideIndex}]", start, count
+        )
+        return [stride.read_data(chunk) for i in range(count)]
+
+    def read_indexes(self, start: int, count: int) -> List[int]:
+        if not self.streaming:
+            return self.indexes[start:start + count]
+        chunk, count = self._read_section("indexes", start, count)
+        return list(struct.unpack(f"<{count}H", chunk.getvalue()))
+
+    def sample_records(self, maxRecords: int, generator) -> None:
+        """
+        '  Decode at most maxRecords vertices, with their stride data, and
+        '  indexes picked by generator, a random.Random, out of a streaming
+        '  model, sampledRecords holds how many of each were decoded out of
+        '  how many
+        """
+        vertexCount = self.modelHeader.vertexCount
+        indexCount = self.modelHeader.indexCount
+        vertexRows = sorted(
+            generator.sample(range(vertexCount), min(maxRecords, vertexCount))
+        )
+        indexRows = sorted(
+            generator.sample(range(indexCount), min(maxRecords, indexCount))
+        )
+        self.vertices = [self.read_vertices(i, 1)[0] for i in vertexRows]
+        self.data = [
+            [self.read_data(strideIndex, i, 1)[0] for i in vertexRows]
+            for strideIndex in range(len(self.strides) - 1)
+        ]
+        self.indexes = [self.read_indexes(i, 1)[0] for i in indexRows]
+        self.sampledRecords = {
+            "vertices": (len(vertexRows), vertexCount),
+            "data": (len(vertexRows), vertexCount),
+            "indexes": (len(indexRows), indexCount),
+        }
+        # The sample is every record left to read
+        self.streaming = False
+
+    def find_mesh(
+        self,
+        lod_level: int = None,
+        name: str = None
+    ) -> Optional["MeshDescription"]:
+        """
+        '  First mesh matching every given criteria
+        """
+        for mesh in self.meshDescriptions:
+            if lod_level is not None and mesh.lod_level != lod_level:
+                continue
+            if name is not None and mesh.name != name:
+                continue
+            return mesh
+        return None
+
+    def read_mesh(
+        self,
+        mesh: Union["MeshDescription", "MaterialRef"]
+    ) -> "MeshSlice":
+        """
+        '  Decode only the vertices, stride data and indexes used by a
+        '  mesh or a material ref, offsets and sizes count records
+        """
+        return MeshSlice(
+            self.read_vertices(mesh.vertexOffset, mesh.vertexSize),
+            [
+                self.read_data(i, mesh.vertexOffset, mesh.vertexSize)
+                for i in range(len(self.strides) - 1)
+            ],
+            self.read_indexes(mesh.indiciesOffset, mesh.indiciesSize)
+        )
+
+    def _chunk_count(self, recordSize: int, chunkSize: int) -> int:
+        chunkSize = chunkSize or BWMFile.streamChunkSize
+        return max(1, chunkSize // max(1, recordSize))
+
+    def iter_vertices(self, chunkSize: int = None):
+        """
+        '  Yield lists of vertices holding at most chunkSize bytes
+        """
+        step = self._chunk_count(self.strides[0].stride, chunkSize)
+        for start in range(0, self.modelHeader.vertexCount, step):
+            yield self.read_vertices(start, step)
+
+    def iter_data(self, strideIndex: int, chunkSize: int = None):
+        step = self._chunk_count(
+            self.strides[strideIndex + 1].stride, chunkSize
+        )
+        for start in range(0, self.modelHeader.vertexCount, step):
+            yield self.read_data(strideIndex, start, step)
+
+    def iter_indexes(self, chunkSize: int = None):
+        step = self._chunk_count(2, chunkSize)
+        for start in range(0, self.modelHeader.indexCount, step):
+            yield self.read_indexes(start, step)
+
+    def iter_records(self, name: str, chunkSize: int = None):
+        """
+        '  Yield chunks of one of streamedLists, a chunk of data holds the
+        '  rows of the same vertices for every stride
+        """
+        if name == "vertices":
+            yield from self.iter_vertices(chunkSize)
+        elif name == "indexes":
+            yield from self.iter_indexes(chunkSize)
+        elif name == "data":
+            step = self._chunk_count(
+                sum(stride.stride for stride in self.strides[1:]), chunkSize
+            )
+            for start in range(0, self.modelHeader.vertexCount, step):
+                yield [
+                    self.read_data(strideIndex, start, step)
+                    for strideIndex in range(len(self.strides) - 1)
+                ]
+        else:
+            raise ValueError(f"{name} isn't read in chunks")
+
+    @staticmethod
+    def probe(reader: BufferedReader) -> Probe:
+        """
+        '  Validate the headers against the size of the file without
+        '  decoding anything else
+        """
+        path = getattr(reader, "name", "")
+        fileSize = reader.seek(0, os.SEEK_END)
+        reader.seek(0)
+
+        def invalid(reason: str, counts: dict = {}) -> Probe:
+            return Probe(path, "BWMFile", False, reason, fileSize, counts)
+
+        if fileSize < 0x38 + 0x80:
+            return invalid("File too small to hold the headers")
+        try:
+            fileHeader = BWMHeader(reader)
+            modelHeader = LionheadModelHeader(reader)
+        except ValueError as error:
+            return invalid(str(error))
+
+        counts = {
+            "version": fileHeader.version,
+            "materialDefinitionCount": modelHeader.materialDefinitionCount,
+            "meshDescriptionCount": modelHeader.meshDescriptionCount,
+            "boneCount": modelHeader.boneCount,
+            "entityCount": modelHeader.entityCount,
+            "unknownCount1": modelHeader.unknownCount1,
+            "collisionPointCount": modelHeader.collisionPointCount,
+            "vertexCount": modelHeader.vertexCount,
+            "strideCount": modelHeader.strideCount,
+            "indexCount": modelHeader.indexCount,
+        }
+        if fileHeader.size + 0x2C != fileSize:
+            return invalid("Size in header doesn't match the file", counts)
+        if 0x38 + fileHeader.metadataSize > fileSize:
+            return invalid("Metadata goes past the end of the file", counts)
+        # Material refs are the only metadata not counted in the header
+        minimumMetadata = 0x80\
+            + modelHeader.materialDefinitionCount * 0x1C0\
+            + modelHeader.meshDescriptionCount * 0xDC\
+            + modelHeader.boneCount * 0x30\
+            + modelHeader.entityCount * 0x130\
+            + (modelHeader.unknownCount1
+               + modelHeader.collisionPointCount) * 0xC\
+            + modelHeader.strideCount * 0x88
+        if minimumMetadata > fileHeader.metadataSize:
+            return invalid("Counts don't fit in the metadata", counts)
+        minimumBuffers = modelHeader.vertexCount * modelHeader.strideCount\
+            + 2 * modelHeader.indexCount
+        if 0x38 + fileHeader.metadataSize + minimumBuffers > fileSize:
+            return invalid("Counts don't fit in the file", counts)
+
+        return Probe(path, "BWMFile", True, "", fileSize, counts)
 
     def metadataSize(self):
         size = 0x80
@@ -126,43 +345,115 @@ class BWMFile:
 
         return size
 
+    def sections(self) -> List[Section]:
+        """
+        '  Offset, size and record count of every section of the file
+        """
+        sections = []
+        offset = 0
+
+        def add(name: str, recordSize: int, count: int):
+            nonlocal offset
+            sections.append(Section(name, offset, recordSize * count, count))
+            offset += recordSize * count
+
+        add("fileHeader", 0x38, 1)
+        add("modelHeader", 0x80, 1)
+        add("materialDefinitions", 0x1C0,
+            self.modelHeader.materialDefinitionCount)
+        add("meshDescriptions", 0xDC, self.modelHeader.meshDescriptionCount)
+        add("materialRefs", 0x20,
+            sum(mesh.materialRefsCount for mesh in self.meshDescriptions))
+        add("bones", 0x30, self.modelHeader.boneCount)
+        add("entities", 0x130, self.modelHeader.entityCount)
+        add("unknowns1", 0xC, self.modelHeader.unknownCount1)
+        add("collisionPoints", 0xC, self.modelHeader.collisionPointCount)
+        add("strides", 0x88, self.modelHeader.strideCount)
+        add("vertices", self.strides[0].stride, self.modelHeader.vertexCount)
+        for i, stride in enumerate(self.strides[1:]):
+            add(f"data[{i}]", stride.stride, self.modelHeader.vertexCount)
+        add("indexes", 2, self.modelHeader.indexCount)
+        if self.fileHeader.version > 5:
+            sections.append(Section(
+                "modelCleaves", offset,
+                4 + 0xC * self.modelHeader.modelCleaveCount,
+                self.modelHeader.modelCleaveCount
+            ))
+
+        return sections
+
+    def section_at(self, offset: int) -> Optional[Section]:
+        for section in self.sections():
+            if section.offset <= offset < section.offset + section.size:
+                return section
+        return None
+
+    def pack(self) -> bytearray:
+        """
+        '  Serialize the whole file inside a single preallocated buffer
+        """
+        self.fileHeader.size = self.size()
+        self.fileHeader.metadataSize = self.metadataSize()
+        # The size stored in the header doesn't count the identifier
+        # and the size field itself
+        buffer = bytearray(0x2C + self.fileHeader.size)
+        offset = self.fileHeader.pack_into(buffer, 0)
+        offset = self.modelHeader.pack_into(buffer, offset)
+        for materialDefinition in self.materialDefinitions:
+            offset = materialDefinition.pack_into(buffer, offset)
+        materialRefs = []
+        for meshDescription in self.meshDescriptions:
+            offset = meshDescription.pack_into(buffer, offset)
+            materialRefs.extend(meshDescription.materialRefs)
+        for materialRef in materialRefs:
+            offset = materialRef.pack_into(buffer, offset)
+        for bone in self.bones:
+            offset = bone.pack_into(buffer, offset)
+        for entity in self.entities:
+            offset = entity.pack_into(buffer, offset)
+        for unknown1 in self.unknowns1:
+            offset = unknown1.pack_into(buffer, offset)
+        for collisionPoint in self.collisionPoints:
+            offset = collisionPoint.pack_into(buffer, offset)
+        for stride in self.strides:
+            offset = stride.pack_into(buffer, offset)
+        if self.vertices:
+            offset = Vertex.pack_vertices_into(
+                buffer, offset, self.strides[0], self.vertices
+            )
+        for (stride, data) in zip(self.strides[1:], self.data):
+            offset = stride.pack_data_into(buffer, offset, data)
+        struct.pack_into(
+            f"<{self.modelHeader.indexCount}H", buffer, offset, *self.indexes
+        )
+        offset += 2 * self.modelHeader.indexCount
+        if self.fileHeader.version > 5:
+            struct.pack_into(
+                "<I", buffer, offset, self.modelHeader.modelCleaveCount
+            )
+            offset += 4
+            cleaves = [value for cleave in self.modelCleaves
+                       for value in cleave]
+            struct.pack_into(f"<{len(cleaves)}f", buffer, offset, *cleaves)
+
+        return buffer
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.pack())
+
     def write(self, filepath: str):
+        buffer = self.pack()
         with open(filepath, "xb") as writer:
-            self.fileHeader.size = self.size()
-            self.fileHeader.metadataSize = self.metadataSize()
-            self.fileHeader.write(writer)
-            self.modelHeader.write(writer)
-            for materialDefinition in self.materialDefinitions:
-                materialDefinition.write(writer)
-            materialRefs = []
-            # self.meshDescriptions.sort(key = lambda x: x.id)
-            for meshDescription in self.meshDescriptions:
-                meshDescription.write(writer)
-                materialRefs.extend(meshDescription.materialRefs)
-            for materialRef in materialRefs:
-                materialRef.write(writer)
-            for bone in self.bones:
-                bone.write(writer)
-            for entity in self.entities:
-                entity.write(writer)
-            for unknown1 in self.unknowns1:
-                unknown1.write(writer)
-            for collisionPoint in self.collisionPoints:
-                collisionPoint.write(writer)
-            for stride in self.strides:
-                stride.write(writer)
-            for vertex in self.vertices:
-                vertex.write(writer)
-            for (stride, data) in zip(self.strides[1:], self.data):
-                stride.write_data(writer, data)
-            # for data in self.data:
-            #    writer.write(data)
-            for indice in self.indexes:
-                write_int16(writer, indice)
-            if self.fileHeader.version > 5:
-                write_int32(writer, self.modelHeader.modelCleaveCount)
-                for modelCleave in self.modelCleaves:
-                    write_vector(writer, modelCleave, write_float)
+            writer.write(buffer)
+
+
+class MeshSlice(NamedTuple):
+    """
+    '  Part of the buffers of a BWMFile used by one mesh
+    """
+    vertices: List["Vertex"]
+    data: List[List]
+    indexes: List[int]
 
 
 class BWMHeader:
@@ -171,11 +462,11 @@ class BWMHeader:
     '  and information on format version and file size
     '  Size :   0x38
     """
+    packer = struct.Struct("<40sIIII")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
-            self.fileIdentifier = (reader.read(40)).decode(
-                ).replace("\0", "")  # 0x00
+            self.fileIdentifier = read_str(reader, 40)  # 0x00
             if "LiOnHeAdMODEL" not in self.fileIdentifier:
                 raise ValueError(
                     "This is not a valid .bwm file (magic string mismatch)."
@@ -207,6 +498,17 @@ class BWMHeader:
             write_int32(writer, self.version)
             write_int32(writer, self.metadataSize)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        BWMHeader.packer.pack_into(
+            buffer, offset,
+            self.fileIdentifier.encode("utf-8"),
+            self.size,
+            0x2B00B1E5,
+            self.version,
+            self.metadataSize
+        )
+        return offset + BWMHeader.packer.size
+
 
 class LionheadModelHeader:
     """
@@ -214,6 +516,7 @@ class LionheadModelHeader:
     '  described by the file
     '  Size :   0x80
     """
+    packer = struct.Struct("<15fIf6I5f4I")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -301,21 +604,36 @@ class LionheadModelHeader:
         write_int32(writer, self.type.value)
         write_int32(writer, self.indexCount)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        LionheadModelHeader.packer.pack_into(
+            buffer, offset,
+            self.unknown1, *self.pnt, *self.box1, *self.box2, *self.cent,
+            self.height, self.radius, self.unknown2, self.volume,
+            self.materialDefinitionCount, self.meshDescriptionCount,
+            self.boneCount, self.entityCount, self.unknownCount1,
+            self.collisionPointCount,
+            self.unknown3, *self.unknowns2, self.unknown4,
+            self.vertexCount, self.strideCount, self.type.value,
+            self.indexCount
+        )
+        return offset + LionheadModelHeader.packer.size
+
 
 class MaterialDefinition:
     """
     '  Size    :   0x1C0
     """
+    packer = struct.Struct("<64s64s64s64s64s64s64s")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
-            self.diffuseMap = reader.read(64).decode().replace("\0", "")
-            self.lightMap = reader.read(64).decode().replace("\0", "")
-            self.growthMap = reader.read(64).decode().replace("\0", "")
-            self.specularMap = reader.read(64).decode().replace("\0", "")
-            self.animatedTexture = reader.read(64).decode().replace("\0", "")
-            self.normalMap = reader.read(64).decode().replace("\0", "")
-            self.type = reader.read(64).decode().replace("\0", "")
+            self.diffuseMap = read_str(reader, 64)
+            self.lightMap = read_str(reader, 64)
+            self.growthMap = read_str(reader, 64)
+            self.specularMap = read_str(reader, 64)
+            self.animatedTexture = read_str(reader, 64)
+            self.normalMap = read_str(reader, 64)
+            self.type = read_str(reader, 64)
             return
         else:
             self.diffuseMap = ""
@@ -335,11 +653,25 @@ class MaterialDefinition:
         write_str(writer, self.normalMap, 64)
         write_str(writer, self.type, 64)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        MaterialDefinition.packer.pack_into(
+            buffer, offset,
+            self.diffuseMap.encode("utf-8"),
+            self.lightMap.encode("utf-8"),
+            self.growthMap.encode("utf-8"),
+            self.specularMap.encode("utf-8"),
+            self.animatedTexture.encode("utf-8"),
+            self.normalMap.encode("utf-8"),
+            self.type.encode("utf-8")
+        )
+        return offset + MaterialDefinition.packer.size
+
 
 class MeshDescription:
     """
     '  Size    :   0xDC
     """
+    packer = struct.Struct("<5I12f3ff3f3f3fffIfIII64s2I")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -349,10 +681,10 @@ class MeshDescription:
             self.vertexOffset = read_int32(reader)
             self.vertexSize = read_int32(reader)
 
-            self.zaxis = struct.unpack("<fff", reader.read(12))
-            self.xaxis = struct.unpack("<fff", reader.read(12))
-            self.yaxis = struct.unpack("<fff", reader.read(12))
-            self.position = struct.unpack("<fff", reader.read(12))
+            self.zaxis = read_floats(reader, 3)
+            self.xaxis = read_floats(reader, 3)
+            self.yaxis = read_floats(reader, 3)
+            self.position = read_floats(reader, 3)
 
             self.cent = [read_float(reader) for i in range(3)]
             self.radius = read_float(reader)
@@ -366,7 +698,7 @@ class MeshDescription:
             self.materialRefsCount = read_int32(reader)
             self.u2 = read_int32(reader)
             self.lod_level = read_int32(reader)
-            self.name = reader.read(64).decode().replace("\0", "")
+            self.name = read_str(reader, 64)
             self.unknowns3 = [read_int32(reader) for i in range(2)]
             self.materialRefs: List[MaterialRef] = []
 
@@ -426,11 +758,25 @@ class MeshDescription:
         write_str(writer, self.name, 64)
         write_vector(writer, self.unknowns3, write_int32)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        MeshDescription.packer.pack_into(
+            buffer, offset,
+            self.facesCount, self.indiciesOffset, self.indiciesSize,
+            self.vertexOffset, self.vertexSize,
+            *self.zaxis, *self.xaxis, *self.yaxis, *self.position,
+            *self.cent, self.radius, *self.box1, *self.box2,
+            *self.unknowns1, self.height, self.unknown1, self.unknown_int,
+            self.bbox_volume, self.materialRefsCount, self.u2,
+            self.lod_level, self.name.encode("utf-8"), *self.unknowns3
+        )
+        return offset + MeshDescription.packer.size
+
 
 class MaterialRef:
     """
     '  Size    :   0x20
     """
+    packer = struct.Struct("<7If")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -463,11 +809,21 @@ class MaterialRef:
         write_int32(writer, self.facesSize)
         write_float(writer, self.unknown)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        MaterialRef.packer.pack_into(
+            buffer, offset,
+            self.materialDefinition, self.indiciesOffset, self.indiciesSize,
+            self.vertexOffset, self.vertexSize, self.facesOffset,
+            self.facesSize, self.unknown
+        )
+        return offset + MaterialRef.packer.size
+
 
 class Bone:
     """
     '  Size    :   0x30
     """
+    packer = struct.Struct("<12f")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -495,11 +851,19 @@ class Bone:
         write_vector(writer, self.yaxis, write_float)
         write_vector(writer, self.position, write_float)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        Bone.packer.pack_into(
+            buffer, offset,
+            *self.zaxis, *self.xaxis, *self.yaxis, *self.position
+        )
+        return offset + Bone.packer.size
+
 
 class Entity:
     """
     '  Size    :   0x130
     """
+    packer = struct.Struct("<12f256s")
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -519,7 +883,7 @@ class Entity:
                 read_float(reader),
                 read_float(reader),
                 read_float(reader))
-            self.name = reader.read(256).decode().replace("\0", "")
+            self.name = read_str(reader, 256)
             return
         else:
             self.zaxis = (0.0, 0.0, 0.0)
@@ -535,6 +899,14 @@ class Entity:
         write_vector(writer, self.position, write_float)
         write_str(writer, self.name, 256)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        Entity.packer.pack_into(
+            buffer, offset,
+            *self.zaxis, *self.xaxis, *self.yaxis, *self.position,
+            self.name.encode("utf-8")
+        )
+        return offset + Entity.packer.size
+
 
 class Unknown1:
     """
@@ -543,7 +915,7 @@ class Unknown1:
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
-            self.unknown = struct.unpack("<fff", reader.read(12))
+            self.unknown = read_floats(reader, 3)
             return
         else:
             self.unknown = (0.0, 0.0, 0.0)
@@ -551,6 +923,10 @@ class Unknown1:
     def write(self, writer: BufferedWriter = None):
         write_vector(writer, self.unknown, write_float)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        struct.pack_into("<fff", buffer, offset, *self.unknown)
+        return offset + 0xC
+
 
 class CollisionPoint:
     """
@@ -559,7 +935,7 @@ class CollisionPoint:
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
-            self.position = struct.unpack("<fff", reader.read(12))
+            self.position = read_floats(reader, 3)
             return
         else:
             self.position = (0.0, 0.0, 0.0)
@@ -567,12 +943,17 @@ class CollisionPoint:
     def write(self, writer: BufferedWriter = None):
         write_vector(writer, self.position, write_float)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        struct.pack_into("<fff", buffer, offset, *self.position)
+        return offset + 0xC
+
 
 class Stride:
     """
     '  Size    :   0x88
     """
     strideFormat = [4, 8, 12, 4, 1]
+    packFormat = ["f", "2f", "3f", "I", "B"]
 
     def __init__(self, reader: BufferedReader = None):
         if reader:
@@ -610,8 +991,6 @@ class Stride:
             else:
                 raise ValueError("This isn't a supported stride Datatype")
 
-        if len(data) > 1:
-            return data[0]
         return data
 
     def write(self, writer: BufferedWriter):
@@ -621,6 +1000,35 @@ class Stride:
             write_int32(writer, sSize.value)
         writer.write(self.unknown)
 
+    def pack_into(self, buffer: bytearray, offset: int) -> int:
+        struct.pack_into(
+            f"<I{2 * self.count}I", buffer, offset, self.count,
+            *[value.value for idSize in self.idSizes for value in idSize]
+        )
+        offset += 4 + 8 * self.count
+        buffer[offset:offset + len(self.unknown)] = self.unknown
+        return offset + len(self.unknown)
+
+    def pack_data_into(
+        self,
+        buffer: bytearray,
+        offset: int,
+        data: List[List]
+    ) -> int:
+        formats = [Stride.packFormat[sSize.value] for (_, sSize) in
+                   self.idSizes]
+        packer = struct.Struct("<" + "".join(formats))
+        for stride_data in data:
+            values = []
+            for i, (_, sSize) in enumerate(self.idSizes):
+                if sSize == StrideSize.POINT_3D or sSize == StrideSize.TUPLE:
+                    values.extend(stride_data[i])
+                else:
+                    values.append(stride_data[i])
+            packer.pack_into(buffer, offset, *values)
+            offset += packer.size
+        return offset
+
     def write_data(self, writer: BufferedWriter, data: List[List]):
         for stride_data in data:
             for i, (_, sSize) in enumerate(self.idSizes):
@@ -635,8 +1043,9 @@ class Stride:
                     write_int32(writer, stride_data[i])
                 elif sSize == StrideSize.FLOAT:
                     write_float(writer, stride_data[i])
-                elif sSize == StrideSize.VECTOR or sSize == StrideSize.TUPLE:
-                    write_vector(writer, stride_data[i], write_int32)
+                elif sSize == StrideSize.POINT_3D or \
+                        sSize == StrideSize.TUPLE:
+                    write_vector(writer, stride_data[i], write_float)
                 else:
                     raise ValueError("Not a supported stride Datatype")
 
@@ -680,53 +1089,71 @@ class Vertex:
         for uv in self.uvs:
             write_vector(writer, uv, write_float)
 
+    @staticmethod
+    def pack_vertices_into(
+        buffer: bytearray,
+        offset: int,
+        stride: Stride,
+        vertices: List["Vertex"]
+    ) -> int:
+        packer = struct.Struct(f"<{stride.stride // 4}f")
+        for vertex in vertices:
+            packer.pack_into(
+                buffer, offset,
+                *vertex.position, *vertex.normal,
+                *[value for uv in vertex.uvs for value in uv]
+            )
+            offset += packer.size
+        return offset
+
+
+def round_trip_difference(original: bytes) -> Optional[Tuple[int, str]]:
+    """
+    '  Parse a .bwm from memory and write it back to memory, return the
+    '  first offset where both differ and the section containing it
+    """
+    file = BWMFile(BytesIO(original))
+    written = file.to_bytes()
+    if written == original:
+        return None
+
+    offset = first_difference(original, written)
+    section = file.section_at(offset)
+    return (offset, section.name if section else "end of file")
+
 
 def main():
     localPath = os.path.dirname(os.path.abspath(__file__))
     with open(os.path.join(localPath, "deftests_config.json")) as cfgFile:
         config = json.load(cfgFile)
-    resultPath = os.path.join(localPath, "WriteBWM")
-
-    def clean_up():
-        for filePath in glob(f"{resultPath}\\**"):
-            os.remove(filePath)
-        os.rmdir(resultPath)
-    if os.path.exists(resultPath):
-        clean_up()
-    try:
-        os.mkdir(resultPath)
-        allSame = True
-
-        for filePath in glob(f"{config['gamePath']}\\{config['bwmsPath']}"):
-            with open(filePath, "rb") as testBWM:
-                fileName = os.path.basename(filePath)
-                try:
-                    file = BWMFile(testBWM)
-                except ValueError:
-                    print(f"{Fore.RED}Couldn't read{Style.RESET_ALL}"
-                          f" {fileName}")
-                    continue
-
-                resultFile = os.path.join(resultPath, fileName)
-                file.write(resultFile)
-                if not filecmp.cmp(filePath, resultFile):
-                    print(f"{Fore.YELLOW}Writing"
-                          f"{Style.RESET_ALL} {fileName} {Fore.YELLOW}"
-                          f"back don't yield an exact copy{Style.RESET_ALL}")
-                    allSame = False
-                os.remove(resultFile)
-
-        if allSame:
-            print(f"{Fore.GREEN}All files written are exact copies of their"
-                  f" original{Style.RESET_ALL}")
-        else:
-            print(f"{Fore.RED}Some written files aren't exact copie of their"
-                  f" original{Style.RESET_ALL}")
-
-        os.rmdir(resultPath)
-    except (KeyboardInterrupt, FileExistsError) as e:
-        clean_up()
-        print(e)
+    allSame = True
+
+    pattern = os.path.join(config['gamePath'], config['bwmsPath'])
+    for filePath in glob(pattern, recursive=True):
+        with open(filePath, "rb") as testBWM:
+            original = testBWM.read()
+        fileName = os.path.basename(filePath)
+        try:
+            difference = round_trip_difference(original)
+        except Exception as error:
+            print(f"{Fore.RED}Couldn't read{Style.RESET_ALL}"
+                  f" {fileName} ({type(error).__name__}: {error})")
+            allSame = False
+            continue
+
+        if difference:
+            print(f"{Fore.YELLOW}Writing"
+                  f"{Style.RESET_ALL} {fileName} {Fore.YELLOW}"
+                  f"back don't yield an exact copy{Style.RESET_ALL}"
+                  f" (0x{difference[0]:X} in {difference[1]})")
+            allSame = False
+
+    if allSame:
+        print(f"{Fore.GREEN}All files written are exact copies of their"
+              f" original{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.RED}Some written files aren't exact copie of their"
+              f" original{Style.RESET_ALL}")
 
     return
 
@@ -1,8 +1,35 @@
 # coding=utf-8
 """Module containing function generally usefull to parsing binary files"""
+from collections import OrderedDict
 from io import BufferedReader, BufferedWriter
-from typing import Iterable
+import math
+import os
+from typing import Dict, Iterable, NamedTuple, Tuple
 import struct
+import sys
+
+# Errors a malformed file may raise while being parsed
+PARSE_ERRORS = (
+    ValueError, struct.error, IndexError, EOFError, MemoryError, TimeoutError
+)
+
+
+class Section(NamedTuple):
+    """Location of a group of records inside a file"""
+    name: str
+    offset: int
+    size: int
+    count: int
+
+
+class Probe(NamedTuple):
+    """Summary of a file obtained by only reading its headers"""
+    path: str
+    dataType: str
+    valid: bool
+    reason: str
+    fileSize: int
+    counts: Dict[str, int]
 
 
 def read_bool(reader: BufferedReader) -> bool:
@@ -10,9 +37,43 @@ def read_bool(reader: BufferedReader) -> bool:
     return bool(int.from_bytes(reader.read(1), 'little'))
 
 
+class NaNBits(float):
+    """
+    NaN read from a file with its 32 bits pattern, converting a float to a
+    double quiets a signaling NaN so the pattern can't be found back from
+    the value
+    """
+
+    def __new__(cls, bits: int) -> "NaNBits":
+        nan = super().__new__(cls, "nan")
+        nan.bits = bits
+        return nan
+
+    def __reduce__(self):
+        return NaNBits, (self.bits,)
+
+
 def read_float(reader: BufferedReader) -> float:
     """Return the 4 next bytes in a file as a float"""
-    return struct.unpack("<f", reader.read(4))[0]
+    raw = reader.read(4)
+    value = struct.unpack("<f", raw)[0]
+    if value != value:
+        return NaNBits(int.from_bytes(raw, byteorder="little"))
+    return value
+
+
+def read_floats(reader: BufferedReader, count: int) -> Tuple[float, ...]:
+    """Return the 4 * count next bytes in a file as a tuple of floats"""
+    raw = reader.read(4 * count)
+    values = struct.unpack(f"<{count}f", raw)
+    # The sum of floats is only NaN when one of them may be
+    if not math.isnan(sum(values)):
+        return values
+    patterns = struct.unpack(f"<{count}I", raw)
+    return tuple(
+        NaNBits(bits) if value != value else value
+        for value, bits in zip(values, patterns)
+    )
 
 
 def read_int16(reader: BufferedReader, signed: bool = False) -> int:
@@ -29,8 +90,79 @@ def read_vector(reader: BufferedReader, size: int, type_fun) -> Iterable:
     return [type_fun(reader) for _ in range(size)]
 
 
+class CheckedReader:
+    """
+    Wrap a reader so every read and seek is checked against the length of
+    the file first, going out of it raises a ValueError instead of
+    returning less data
+    """
+
+    def __init__(self, reader: BufferedReader) -> None:
+        self.reader = reader
+        self.name = getattr(reader, "name", "")
+        position = reader.tell()
+        self.length = reader.seek(0, os.SEEK_END)
+        reader.seek(position)
+
+    def tell(self) -> int:
+        return self.reader.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.reader.tell()
+        elif whence == os.SEEK_END:
+            offset += self.length
+        if not 0 <= offset <= self.length:
+            raise ValueError(
+                f"Offset 0x{offset:X} outside of a 0x{self.length:X} bytes"
+                " file"
+            )
+        return self.reader.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        position = self.reader.tell()
+        if size is None or size < 0:
+            size = self.length - position
+        if position + size > self.length:
+            raise ValueError(
+                f"Reading 0x{size:X} bytes at 0x{position:X} goes past the"
+                f" end of a 0x{self.length:X} bytes file"
+            )
+        return self.reader.read(size)
+
+
+class StringTable:
+    """
+    Strings decoded from fixed size fields, identical raw bytes are only
+    decoded once and share the same str across every parsed file, the
+    least recently used are dropped past max_strings so a long running
+    process doesn't keep the strings of every file it ever read
+    """
+
+    def __init__(self, max_strings: int = 0x10000) -> None:
+        self.max_strings = max_strings
+        self.strings: OrderedDict = OrderedDict()
+
+    def decode(self, raw: bytes) -> str:
+        string = self.strings.get(raw)
+        if string is not None:
+            self.strings.move_to_end(raw)
+            return string
+        string = sys.intern(raw.decode("utf-8").replace("\0", ""))
+        self.strings[raw] = string
+        if len(self.strings) > self.max_strings:
+            self.strings.popitem(last=False)
+        return string
+
+    def clear(self) -> None:
+        self.strings.clear()
+
+
+string_table = StringTable()
+
+
 def read_str(reader: BufferedReader, size: int) -> str:
-    return reader.read(size).decode("utf-8").replace("\0", "")
+    return string_table.decode(reader.read(size))
 
 
 def write_bool(writer: BufferedWriter, value: bool) -> None:
@@ -40,6 +172,9 @@ def write_bool(writer: BufferedWriter, value: bool) -> None:
 
 def write_float(writer: BufferedWriter, value: float) -> None:
     """Return the 4 next bytes in a file as a float"""
+    if value != value and isinstance(value, NaNBits):
+        writer.write(struct.pack("<I", value.bits))
+        return
     writer.write(struct.pack("<f", value))
 
 
@@ -67,3 +202,16 @@ def write_vector(writer: BufferedWriter, vector: Iterable, type_fun) -> None:
 def write_str(writer: BufferedWriter, string: str, size: int) -> None:
     writer.write(string.encode("utf-8"))
     writer.write(bytes([0 for _ in range(size - len(string))]))
+
+
+def first_difference(first: bytes, second: bytes) -> int:
+    """Return the first offset where both buffers differ"""
+    block = 0x1000
+    length = min(len(first), len(second))
+    offset = 0
+    while offset < length and \
+            first[offset:offset + block] == second[offset:offset + block]:
+        offset += block
+    while offset < length and first[offset] == second[offset]:
+        offset += 1
+    return offset
@@ -0,0 +1,301 @@
+# coding=utf-8
+"""
+    Find the files matched by a `files` pattern with os.scandir.
+    Patterns may use / or \\ as separator whatever the OS, `**` matches any
+    number of directories and directories which can't match are never
+    listed. Patterns go through zip archives like through directories, the
+    members found are opened with open_asset.
+"""
+
+from collections import OrderedDict
+from fnmatch import fnmatch
+from io import BytesIO
+from typing import (
+    BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence,
+    Set, Tuple
+)
+from zipfile import ZipFile
+import hashlib
+import os
+import re
+
+ARCHIVE_EXTENSIONS = (".zip",)
+
+# Archives kept open by a process at once
+MAX_OPEN_ARCHIVES = 16
+
+
+class DiscoveredFile(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+
+
+def has_magic(component: str) -> bool:
+    return re.search(r"[*?[]", component) is not None
+
+
+def is_archive(file_path: str) -> bool:
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def split_pattern(pattern: str) -> List[str]:
+    """Components of a pattern written with either separator"""
+    return [
+        component
+        for component in re.split(r"[\\/]", pattern)
+        if component not in ("", ".")
+    ]
+
+
+def pattern_root(pattern: str) -> str:
+    """Leading part of the pattern without any wildcard"""
+    components = split_pattern(pattern)
+    root = []
+    for component in components[:-1]:
+        if has_magic(component) or is_archive(component):
+            break
+        root.append(component)
+    root = os.sep.join(root)
+    if re.match(r"[\\/]", pattern):
+        root = os.sep + root
+    return root or os.curdir
+
+
+def matches(name: str, component: str) -> bool:
+    # Like glob, hidden entries are only matched explicitly
+    if name.startswith(".") and not component.startswith("."):
+        return False
+    return fnmatch(name, component)
+
+
+def _match_member(parts: Sequence[str], components: Sequence[str]) -> bool:
+    """Whether the path of an archive member matches components"""
+    if not components:
+        return not parts
+    if not parts:
+        return False
+    component, rest = components[0], components[1:]
+    if component == "**":
+        return _match_member(parts, rest or ["*"]) or (
+            len(parts) > 1 and not parts[0].startswith(".")
+            and _match_member(parts[1:], components)
+        )
+    return matches(parts[0], component) and _match_member(parts[1:], rest)
+
+
+def _walk_archive(
+    archive_path: str,
+    components: Sequence[str],
+    extensions: Optional[Sequence[str]],
+    seen: Set[str]
+) -> Iterator[DiscoveredFile]:
+    """Members of an archive matched by the rest of a pattern"""
+    mtime = os.stat(archive_path).st_mtime
+    with ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            parts = info.filename.split("/")
+            if extensions and \
+                    not parts[-1].lower().endswith(tuple(extensions)):
+                continue
+            if not _match_member(parts, components):
+                continue
+            member_path = os.path.join(archive_path, *parts)
+            if member_path not in seen:
+                seen.add(member_path)
+                yield DiscoveredFile(member_path, info.file_size, mtime)
+
+
+def _child(directory: str, name: str) -> str:
+    """
+    Path of an entry of directory, entries of the working directory have
+    no ./ prefix so every pattern gives a file the same path
+    """
+    if directory == os.curdir:
+        return name
+    return os.path.join(directory, name)
+
+
+def _walk(
+    directory: str,
+    components: Sequence[str],
+    extensions: Optional[Sequence[str]],
+    seen: Set[str]
+) -> Iterator[DiscoveredFile]:
+    component, rest = components[0], components[1:]
+
+    if component == "**":
+        yield from _walk(directory, rest or ["*"], extensions, seen)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir() and not entry.name.startswith("."):
+                yield from _walk(
+                    _child(directory, entry.name), components, extensions,
+                    seen
+                )
+        return
+
+    if rest and not has_magic(component):
+        # Literal directories are entered without listing their parent
+        subdirectory = _child(directory, component)
+        if os.path.isdir(subdirectory):
+            yield from _walk(subdirectory, rest, extensions, seen)
+        elif is_archive(subdirectory) and os.path.isfile(subdirectory):
+            yield from _walk_archive(subdirectory, rest, extensions, seen)
+        return
+
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        if not matches(entry.name, component):
+            continue
+        entry_path = _child(directory, entry.name)
+        if rest:
+            if entry.is_dir():
+                yield from _walk(entry_path, rest, extensions, seen)
+            elif is_archive(entry.name) and entry.is_file():
+                yield from _walk_archive(entry_path, rest, extensions, seen)
+        elif entry.is_file() and entry_path not in seen:
+            if extensions and \
+                    not entry.name.lower().endswith(tuple(extensions)):
+                continue
+            seen.add(entry_path)
+            stat = entry.stat()
+            yield DiscoveredFile(entry_path, stat.st_size, stat.st_mtime)
+
+
+def discover(
+    pattern: str,
+    extensions: Optional[Sequence[str]] = None
+) -> Iterator[DiscoveredFile]:
+    """
+    Yield every file matched by pattern along with its size, extensions
+    optionally restricts the files to the given lower case extensions
+    """
+    components = split_pattern(pattern)
+    root = pattern_root(pattern)
+    depth = len(split_pattern(root)) if root != os.curdir else 0
+    components = components[depth:]
+
+    if not components:
+        return
+    yield from _walk(root, components, extensions, set())
+
+
+def split_archive_path(file_path: str) -> Optional[Tuple[str, str]]:
+    """Archive holding a member path found by discover and the member name"""
+    head, parts = file_path, []
+    while head:
+        if parts and is_archive(head) and os.path.isfile(head):
+            return head, "/".join(reversed(parts))
+        head, tail = os.path.split(head)
+        if not tail:
+            break
+        parts.append(tail)
+    return None
+
+
+# Archive path -> (process, mtime and size it was opened at, archive), the
+# least recently used first
+_archives: OrderedDict = OrderedDict()
+
+
+def _open_archive(archive_path: str) -> ZipFile:
+    """
+    Archive kept open across the members read, it is opened again once its
+    modification time or size changes so a rewritten archive is never read
+    from a stale handle, and a forked process opens its own
+    """
+    stat = os.stat(archive_path)
+    version = (os.getpid(), stat.st_mtime_ns, stat.st_size)
+    entry = _archives.pop(archive_path, None)
+    if entry is not None:
+        if entry[0] == version:
+            _archives[archive_path] = entry
+            return entry[1]
+        entry[1].close()
+    archive = ZipFile(archive_path)
+    _archives[archive_path] = (version, archive)
+    while len(_archives) > MAX_OPEN_ARCHIVES:
+        _, (_, oldest) = _archives.popitem(last=False)
+        oldest.close()
+    return archive
+
+
+def open_asset(file_path: str) -> BinaryIO:
+    """
+    Open a file found by discover, archive members are decompressed in
+    memory in a buffer named after their path
+    """
+    if os.path.isfile(file_path):
+        return open(file_path, "rb")
+    location = split_archive_path(file_path)
+    if location is None:
+        raise FileNotFoundError(f"No such file or archive member: {file_path}")
+    archive_path, member = location
+    try:
+        buffer = BytesIO(_open_archive(archive_path).read(member))
+    except KeyError:
+        raise FileNotFoundError(f"No such archive member: {file_path}")
+    buffer.name = file_path
+    return buffer
+
+
+def stat_asset(file_path: str) -> DiscoveredFile:
+    """Size and mtime of a file, or of an archive member and its archive"""
+    if os.path.isfile(file_path):
+        stat = os.stat(file_path)
+        return DiscoveredFile(file_path, stat.st_size, stat.st_mtime)
+    location = split_archive_path(file_path)
+    if location is None:
+        raise FileNotFoundError(f"No such file or archive member: {file_path}")
+    archive_path, member = location
+    try:
+        size = _open_archive(archive_path).getinfo(member).file_size
+    except KeyError:
+        raise FileNotFoundError(f"No such archive member: {file_path}")
+    return DiscoveredFile(file_path, size, os.stat(archive_path).st_mtime)
+
+
+def content_hash(file_path: str, chunk_size: int = 0x100000) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open_asset(file_path) as reader:
+        for chunk in iter(lambda: reader.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def find_duplicates(
+    files: Iterable[DiscoveredFile]
+) -> Tuple[List[DiscoveredFile], Dict[str, List[str]]]:
+    """
+    Split files in the first file of each distinct content and the paths
+    of the later copies of each of them, only files sharing their size with
+    another one are hashed
+    """
+    files = list(files)
+    sizes: Dict[int, int] = {}
+    for file in files:
+        sizes[file.size] = sizes.get(file.size, 0) + 1
+
+    unique = []
+    copies: Dict[str, List[str]] = {}
+    originals: Dict[Tuple[int, bytes], str] = {}
+    for file in files:
+        if sizes[file.size] == 1:
+            unique.append(file)
+            continue
+        key = (file.size, content_hash(file.path))
+        original = originals.setdefault(key, file.path)
+        if original == file.path:
+            unique.append(file)
+        else:
+            copies.setdefault(original, []).append(file.path)
+    return unique, copies
@@ -0,0 +1,319 @@
+# coding=utf-8
+"""
+    Count the values of the config .json file one file at a time under
+    tracemalloc, to find which files and records need the most memory.
+    The peak of each file is split by the record classes which allocated
+    the memory still held once it is parsed, and the growth of the counts
+    of each variable is measured. results/<data_type>/memory.csv holds a
+    row per file. With a limit, the traced memory is checked while a file
+    is parsed and counted, so a file needing too much is stopped before
+    it takes all of it.
+"""
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+import inspect
+import json
+import os
+import sys
+import tracemalloc
+
+from pandas.core.frame import DataFrame
+
+from compile_info import (
+    PARSE_ERRORS, discover_format_files, new_logger, parse_file
+)
+from file_definitions import *
+
+MEGABYTE = 1024 * 1024
+
+# Function calls between two checks of the traced memory against a limit
+CHECK_EVERY = 256
+
+# Functions whose allocations are attributed to a kind of record
+RECORD_FUNCTIONS: Dict[str, Callable] = {
+    "Vertex": Vertex.__init__,
+    "AnimationEvent": AnimationEvent.__init__,
+    "Keyframes": AnimationData.read_keyframes,
+    "StrideData": Stride.read_data,
+}
+
+
+def source_ranges() -> List[Tuple[str, str, int, int]]:
+    """File and first and last lines of each record function"""
+    ranges = []
+    for record, function in RECORD_FUNCTIONS.items():
+        lines, first = inspect.getsourcelines(function)
+        ranges.append((
+            record, inspect.getsourcefile(function),
+            first, first + len(lines) - 1
+        ))
+    return ranges
+
+
+def split_by_record(
+    snapshot: tracemalloc.Snapshot,
+    ranges: List[Tuple[str, str, int, int]]
+) -> Dict[str, int]:
+    """
+    Bytes held by each kind of record, an allocation belongs to the record
+    function closest to it in its traceback, or to Other
+    """
+    sizes = {record: 0 for record, _, _, _ in ranges}
+    sizes["Other"] = 0
+    for trace in snapshot.traces:
+        record = "Other"
+        # Frames go from the oldest to the most recent
+        for frame in reversed(trace.traceback):
+            matched = [
+                name for name, file_name, first, last in ranges
+                if first <= frame.lineno <= last
+                and frame.filename == file_name
+            ]
+            if matched:
+                record = matched[0]
+                break
+        sizes[record] += trace.size
+    return sizes
+
+
+def logged_var_size(values: Dict) -> int:
+    """Bytes of the counts of a variable, keys and counts included"""
+    return sys.getsizeof(values) + sum(
+        sys.getsizeof(value) + sys.getsizeof(count)
+        for value, count in values.items()
+    )
+
+
+class MemoryLimitError(MemoryError):
+    """Traced memory went past the limit of an aborting profile"""
+
+
+@contextmanager
+def traced_limit(limit: int, start: int):
+    """
+    Raise a MemoryLimitError inside the block once the traced memory grows
+    more than limit bytes past start, checked every CHECK_EVERY function
+    calls by a profile hook
+    """
+    if not limit:
+        yield
+        return
+    calls = 0
+
+    def check(frame, event, arg) -> None:
+        nonlocal calls
+        calls += 1
+        if calls % CHECK_EVERY:
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        if current - start > limit:
+            raise MemoryLimitError(
+                f"Traced memory grew by {(current - start) / MEGABYTE:.2f} MB,"
+                f" past the limit of {limit / MEGABYTE:.2f} MB"
+            )
+
+    previous = sys.getprofile()
+    sys.setprofile(check)
+    try:
+        yield
+    finally:
+        sys.setprofile(previous)
+
+
+class MemoryProfiler:
+    """
+    Parse and count files under tracemalloc, a file whose traced memory
+    goes past limit bytes is stopped as soon as it does and aborts the
+    run, once the counts go past it the run is aborted or they are spilled
+    to a partial result so the logger starts empty again
+    """
+
+    def __init__(
+        self,
+        current_format: dict,
+        limit: int = 0,
+        on_limit: str = "abort",
+        nframes: int = 16
+    ) -> None:
+        if on_limit not in ("abort", "spill"):
+            raise ValueError(f"Unknown limit action {on_limit}")
+        self.current_format = current_format
+        self.data_type = globals()[current_format["data_type"]]
+        self.limit = limit
+        self.on_limit = on_limit
+        self.nframes = nframes
+        self.ranges = source_ranges()
+        self.value_logger = new_logger(current_format)
+        self.spills: List[str] = []
+        self.rows: List[Dict] = []
+
+    def profile_file(self, file_path: str, size: int) -> Dict:
+        """Parse and count one file, return its row of memory.csv"""
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        before = {
+            var_name: logged_var_size(values)
+            for var_name, values in self.value_logger.logged_var.items()
+        }
+
+        row = {"Path": file_path, "Size": size, "Error": ""}
+        try:
+            with traced_limit(self.limit, start):
+                file_data_structure = parse_file(
+                    self.data_type,
+                    file_path,
+                    self.current_format.get("hardened", False),
+                    self.current_format.get("timeout", 0),
+                    max_records=self.current_format.get("max_records", 0),
+                    seed=self.current_format.get("seed", 0)
+                )
+        except PARSE_ERRORS as error:
+            # A MemoryLimitError too, run aborts once the row is written
+            row["Error"] = f"{type(error).__name__}: {error}"
+            self.value_logger.file_not_read(file_path, reason=row["Error"])
+            file_data_structure = None
+
+        if file_data_structure is not None:
+            self.value_logger.file_read(file_path)
+            try:
+                with traced_limit(self.limit, start):
+                    self.value_logger.update(file_data_structure)
+                    self.value_logger.flush()
+            except IndexError:
+                pass
+            except MemoryLimitError as error:
+                row["Error"] = f"{type(error).__name__}: {error}"
+        # Memory still held by the structure, split by record
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        del file_data_structure
+
+        row["Peak"] = peak - start
+        row["Retained"] = current - start
+        row.update(split_by_record(snapshot, self.ranges))
+        row["Counts"] = 0
+        for var_name, values in self.value_logger.logged_var.items():
+            var_size = logged_var_size(values)
+            row["Counts"] += var_size
+            row[f"logged_var {var_name}"] = var_size - before.get(var_name, 0)
+        return row
+
+    def spill(self) -> None:
+        """Save the counts so far as a partial result and start over"""
+        log_path = self.value_logger.log_path
+        if not os.path.exists(log_path):
+            os.makedirs(log_path)
+        spill_path = os.path.join(
+            log_path, f"partial_spill{len(self.spills)}.pkl.gz"
+        )
+        self.value_logger.save(spill_path)
+        self.spills.append(spill_path)
+        self.value_logger = new_logger(self.current_format)
+
+    def run(self) -> None:
+        """Profile every file of the format, then write the logs"""
+        files, _, _ = discover_format_files(self.current_format)
+        tracemalloc.start(self.nframes)
+        try:
+            for file in files:
+                row = self.profile_file(file.path, file.size)
+                self.rows.append(row)
+                if not self.limit:
+                    continue
+                if row["Peak"] > self.limit:
+                    raise MemoryLimitError(
+                        f"{file.path} peaked at"
+                        f" {row['Peak'] / MEGABYTE:.2f} MB, past the limit of"
+                        f" {self.limit / MEGABYTE:.2f} MB"
+                    )
+                if row["Counts"] <= self.limit:
+                    continue
+                if self.on_limit == "spill":
+                    self.spill()
+                    continue
+                raise MemoryLimitError(
+                    f"Counts reached {row['Counts'] / MEGABYTE:.2f} MB after"
+                    f" {file.path}, past the limit of"
+                    f" {self.limit / MEGABYTE:.2f} MB"
+                )
+        finally:
+            tracemalloc.stop()
+            self.write_log()
+
+    def write_log(self) -> None:
+        """
+        Write memory.csv and the counts, once spilled the counts are saved
+        as a last partial to merge with compile_info.py --merge
+        """
+        if self.spills:
+            self.spill()
+        else:
+            self.value_logger.write_log()
+
+        log_path = self.value_logger.log_path
+        if not os.path.exists(log_path):
+            os.makedirs(log_path)
+        rows = sorted(self.rows, key=lambda row: row["Peak"], reverse=True)
+        with open(os.path.join(log_path, "memory.csv"), "wb") as writer:
+            DataFrame(rows).to_csv(writer)
+
+    def summary(self, count: int = 5) -> str:
+        name = self.current_format["data_type"]
+        if not self.rows:
+            return f"{name} : no file profiled"
+        lines = [f"{name} : largest peaks"]
+        for row in sorted(
+            self.rows, key=lambda row: row["Peak"], reverse=True
+        )[:count]:
+            largest = max(RECORD_FUNCTIONS, key=lambda record: row[record])
+            lines.append(
+                f"  {row['Path']} : {row['Peak'] / MEGABYTE:.2f} MB peak,"
+                f" {row['Retained'] / MEGABYTE:.2f} MB held, mostly"
+                f" {largest} ({row[largest] / MEGABYTE:.2f} MB)"
+            )
+        if self.spills:
+            lines.append(
+                f"  counts spilled to {len(self.spills)} partials, merge them"
+                " with compile_info.py --merge"
+            )
+        return "\n".join(lines)
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument(
+        "--limit",
+        type=float,
+        metavar="MB",
+        help="traced memory allowed while parsing and counting a file, and"
+             " for the counts"
+    )
+    parser.add_argument(
+        "--on-limit",
+        choices=("abort", "spill"),
+        default="abort",
+        help="stop the run, or save the counts so far and start over"
+    )
+    args = parser.parse_args()
+    limit = int((args.limit or 0) * MEGABYTE)
+
+    with open(args.config, encoding="utf-8") as config:
+        formats_to_investigate = json.load(config)["to_investigate"]
+    for current_format in formats_to_investigate:
+        profiler = MemoryProfiler(current_format, limit, args.on_limit)
+        try:
+            profiler.run()
+        except MemoryLimitError as error:
+            print(profiler.summary())
+            print(f"Aborted : {error}")
+            return 1
+        print(profiler.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
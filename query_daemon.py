@@ -0,0 +1,226 @@
+# coding=utf-8
+"""
+    Long running process answering var_to_check queries from parsed files
+    kept in memory, over HTTP on localhost or a Unix socket. Files are only
+    parsed again when their size or modification time changes.
+"""
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import StreamRequestHandler
+from typing import Dict, Optional, Tuple
+import json
+import os
+import socketserver
+import time
+
+from compile_info import PARSE_ERRORS, new_logger, parse_file
+from file_definitions import *
+from file_discovery import DiscoveredFile, discover
+from result_store import encode_key
+
+
+# Data types a query can name, any other class of the modules is refused
+DATA_TYPES = {"AlFile": AlFile, "BWMFile": BWMFile}
+
+
+class StructureCache:
+    """
+    Parsed files keyed by path, data type and parse options, parsed again
+    once their size or modification time changes, the least recently used
+    are dropped past max_entries
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        # (path, data type, hardened, max records, seed)
+        #     -> (size, mtime, structure, error reason)
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        data_type: type,
+        file: DiscoveredFile,
+        hardened: bool = False,
+        max_records: int = 0,
+        seed: int = 0
+    ) -> Tuple[object, Optional[str]]:
+        """Structure of a file, or None and why it couldn't be parsed"""
+        key = (file.path, data_type.__name__, hardened, max_records, seed)
+        entry = self.entries.get(key)
+        if entry is not None and entry[:2] == (file.size, file.mtime):
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[2], entry[3]
+
+        self.misses += 1
+        structure, reason = None, None
+        try:
+            structure = parse_file(
+                data_type, file.path, hardened,
+                max_records=max_records, seed=seed
+            )
+        except PARSE_ERRORS as error:
+            reason = f"{type(error).__name__}: {error}"
+        self.entries[key] = (file.size, file.mtime, structure, reason)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return structure, reason
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def answer(cache: StructureCache, query: dict) -> dict:
+    """
+    Counts of a query written like an entry of to_investigate, values are
+    given as their repr
+    """
+    start = time.perf_counter()
+    data_type = DATA_TYPES.get(query["data_type"])
+    if data_type is None:
+        raise ValueError(f"Unknown data type {query['data_type']}")
+    value_logger = new_logger(query)
+
+    for file in discover(query["files"]):
+        structure, reason = cache.get(
+            data_type, file, query.get("hardened", False),
+            query.get("max_records", 0), query.get("seed", 0)
+        )
+        if structure is None:
+            value_logger.file_not_read(file.path, reason=reason)
+            continue
+        value_logger.file_read(file.path)
+        try:
+            value_logger.update(structure)
+        except IndexError:
+            continue
+    value_logger.flush()
+
+    return {
+        "counts": {
+            var_name: [
+                [encode_key(value), count] for value, count in values.items()
+            ]
+            for var_name, values in value_logger.logged_var.items()
+        },
+        "read_files": len(value_logger.read_files),
+        "errors": value_logger.error_reasons,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def handle_request(cache: StructureCache, request: bytes) -> dict:
+    """Answer a JSON query, errors are returned instead of raised"""
+    try:
+        query = json.loads(request)
+        if not isinstance(query, dict):
+            raise TypeError("A query must be a JSON object")
+        if query.get("stats"):
+            return cache.stats()
+        return answer(cache, query)
+    except (KeyError, TypeError, AttributeError) + PARSE_ERRORS as error:
+        return {"error": f"{type(error).__name__}: {error}"}
+
+
+class HTTPQueryHandler(BaseHTTPRequestHandler):
+    """POST a query to / or GET /stats"""
+
+    def reply(self, result: dict) -> None:
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(400 if "error" in result else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self.reply(self.server.cache.stats())
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        self.reply(handle_request(self.server.cache, self.rfile.read(length)))
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+class SocketQueryHandler(StreamRequestHandler):
+    """One JSON query per line, answered by one JSON line"""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            result = handle_request(self.server.cache, line)
+            self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def serve(
+    cache: StructureCache,
+    port: int = 8765,
+    socket_path: Optional[str] = None
+) -> None:
+    """
+    Answer queries until interrupted, requests are handled one at a time
+    so the cache is never shared between threads
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = socketserver.UnixStreamServer(socket_path, SocketQueryHandler)
+        address = socket_path
+    else:
+        server = HTTPServer(("127.0.0.1", port), HTTPQueryHandler)
+        address = f"http://127.0.0.1:{port}"
+    server.cache = cache
+    print(f"Answering queries on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--socket",
+        help="listen on this Unix socket instead of HTTP"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help="number of parsed files kept in memory"
+    )
+    parser.add_argument(
+        "--config",
+        help="parse the files of this config before answering queries"
+    )
+    args = parser.parse_args()
+
+    cache = StructureCache(args.cache_size)
+    if args.config:
+        with open(args.config, encoding="utf-8") as config:
+            for current_format in json.load(config)["to_investigate"]:
+                answer(cache, current_format)
+    serve(cache, args.port, args.socket)
+
+
+if __name__ == "__main__":
+    main()
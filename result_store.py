@@ -0,0 +1,196 @@
+# coding=utf-8
+"""
+    SQLite store of the counts contributed by each file, so a run only has
+    to parse the files which changed since the previous one.
+"""
+
+from ast import literal_eval
+from typing import Dict, Iterable, Sequence
+import json
+import sqlite3
+
+from value_range_logger import ValueRangeLogger
+
+
+def encode_key(value) -> str:
+    return repr(value)
+
+
+def decode_key(text: str):
+    """Value of a key stored by encode_key, nan and inf stay as text"""
+    try:
+        return literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+class ResultStore:
+    """
+    Counts per data type, variable and file, a file's contributions are
+    replaced as a whole when it changes
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                data_type TEXT,
+                path TEXT,
+                size INTEGER,
+                mtime REAL,
+                settings TEXT,
+                read INTEGER,
+                reason TEXT,
+                original TEXT,
+                PRIMARY KEY (data_type, path)
+            );
+            CREATE TABLE IF NOT EXISTS counts (
+                data_type TEXT,
+                variable TEXT,
+                path TEXT,
+                value TEXT,
+                count INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS counts_by_file
+                ON counts (data_type, path);
+            CREATE INDEX IF NOT EXISTS counts_by_variable
+                ON counts (data_type, variable);
+            """
+        )
+        columns = [
+            row[1] for row in self.connection.execute(
+                "PRAGMA table_info(files)"
+            )
+        ]
+        # Stores written before the reasons and copies were kept
+        with self.connection:
+            for column in ("reason", "original"):
+                if column not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE files ADD COLUMN {column} TEXT"
+                    )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @staticmethod
+    def settings(current_format: dict) -> str:
+        """
+        What a file's counts depend on besides the file itself, formats
+        reading a sample of the records can't be stored
+        """
+        return json.dumps([
+            sorted(current_format["var_to_check"]),
+            current_format.get("exact_bits", False),
+            current_format.get("hardened", False),
+            current_format.get("dedup", False),
+        ])
+
+    def is_current(
+        self,
+        data_type: str,
+        path: str,
+        size: int,
+        mtime: float,
+        settings: str
+    ) -> bool:
+        row = self.connection.execute(
+            "SELECT size, mtime, settings FROM files"
+            " WHERE data_type = ? AND path = ?",
+            (data_type, path)
+        ).fetchone()
+        return row == (size, mtime, settings)
+
+    def replace_file(
+        self,
+        data_type: str,
+        path: str,
+        size: int,
+        mtime: float,
+        settings: str,
+        value_logger: ValueRangeLogger
+    ) -> None:
+        """
+        Store the counts of a logger which only saw the file path, the
+        previous counts of that file are dropped, a copy also keeps the
+        file it duplicates
+        """
+        value_logger.flush()
+        with self.connection:
+            self.remove_file(data_type, path)
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (data_type, path, size, mtime, settings,
+                 int(path in value_logger.read_files),
+                 value_logger.error_reasons.get(path),
+                 value_logger.duplicates.get(path))
+            )
+            self.connection.executemany(
+                "INSERT INTO counts VALUES (?, ?, ?, ?, ?)",
+                [
+                    (data_type, var_name, path, encode_key(value), count)
+                    for var_name, values in value_logger.logged_var.items()
+                    for value, count in values.items()
+                ]
+            )
+
+    def remove_file(self, data_type: str, path: str) -> None:
+        for table in ("files", "counts"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE data_type = ? AND path = ?",
+                (data_type, path)
+            )
+
+    def remove_missing(self, data_type: str, paths: Iterable[str]) -> None:
+        """Drop the files which aren't part of paths anymore"""
+        paths = set(paths)
+        stored = self.connection.execute(
+            "SELECT path FROM files WHERE data_type = ?", (data_type,)
+        ).fetchall()
+        with self.connection:
+            for (path,) in stored:
+                if path not in paths:
+                    self.remove_file(data_type, path)
+
+    def aggregate(self, data_type: str, variable: str) -> Dict:
+        rows = self.connection.execute(
+            "SELECT value, SUM(count) FROM counts"
+            " WHERE data_type = ? AND variable = ? GROUP BY value",
+            (data_type, variable)
+        )
+        values = {}
+        for value, count in rows:
+            # Equal keys like 1 and 1.0 may have been stored separately
+            value = decode_key(value)
+            values[value] = values.get(value, 0) + count
+        return values
+
+    def to_logger(
+        self,
+        data_type: str,
+        variables_name: Sequence[str],
+        exact_bits: bool = False
+    ) -> ValueRangeLogger:
+        """Logger holding the totals of every stored file"""
+        value_logger = ValueRangeLogger(variables_name, exact_bits)
+        value_logger.set_data_type(data_type)
+        for var_name in variables_name:
+            value_logger.logged_var[var_name] = self.aggregate(
+                data_type, var_name
+            )
+        rows = self.connection.execute(
+            "SELECT path, read, reason, original FROM files"
+            " WHERE data_type = ? ORDER BY path",
+            (data_type,)
+        ).fetchall()
+        stored = {row[0] for row in rows}
+        for path, read, reason, original in rows:
+            if read:
+                value_logger.file_read(path)
+            else:
+                value_logger.file_not_read(path, reason or "")
+            # The original may have been removed since the copy was read
+            if original in stored:
+                value_logger.duplicates[path] = original
+        return value_logger
@@ -0,0 +1,96 @@
+# coding=utf-8
+"""
+    Check that .bwm files are written back as exact copies of themselves.
+    Files are parsed and serialized in memory, across a pool of processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Optional
+import json
+import os
+import sys
+
+from colorama import Fore, Style
+
+from file_definitions.file_definition_bwm import round_trip_difference
+from file_discovery import discover, open_asset
+
+
+class RoundTripResult(NamedTuple):
+    """Outcome of writing back one file"""
+    path: str
+    identical: bool
+    offset: Optional[int] = None
+    section: Optional[str] = None
+    error: Optional[str] = None
+
+
+def verify_file(file_path: str) -> RoundTripResult:
+    """
+    Parse, serialize and compare a single file, a malformed file or one
+    the writer fails on is reported with the error it raised
+    """
+    try:
+        with open_asset(file_path) as reader:
+            original = reader.read()
+        difference = round_trip_difference(original)
+    # Any error is a failure of this file, not of the whole corpus
+    except Exception as error:
+        return RoundTripResult(
+            file_path, False, error=f"{type(error).__name__}: {error}"
+        )
+
+    if difference is None:
+        return RoundTripResult(file_path, True)
+    return RoundTripResult(file_path, False, *difference)
+
+
+def verify_corpus(
+    file_paths: Iterable[str],
+    processes: Optional[int] = None
+) -> Iterator[RoundTripResult]:
+    """Verify every file, results are yielded in the order of file_paths"""
+    with ProcessPoolExecutor(processes) as executor:
+        yield from executor.map(verify_file, file_paths, chunksize=16)
+
+
+def main() -> int:
+    patterns = sys.argv[1:]
+    if not patterns:
+        local_path = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(
+            local_path, "file_definitions", "deftests_config.json"
+        )
+        with open(config_path, encoding="utf-8") as cfg_file:
+            config = json.load(cfg_file)
+        patterns = [os.path.join(config["gamePath"], config["bwmsPath"])]
+
+    file_paths = [
+        file_path
+        for pattern in patterns
+        for file_path, _, _ in discover(pattern)
+    ]
+    all_same = True
+    for result in verify_corpus(file_paths):
+        file_name = os.path.basename(result.path)
+        if result.error:
+            print(f"{Fore.RED}Couldn't read{Style.RESET_ALL} {file_name}"
+                  f" ({result.error})")
+            all_same = False
+        elif not result.identical:
+            print(f"{Fore.YELLOW}Writing{Style.RESET_ALL} {file_name}"
+                  f" {Fore.YELLOW}back differs at 0x{result.offset:X}"
+                  f" in {result.section}{Style.RESET_ALL}")
+            all_same = False
+
+    if all_same:
+        print(f"{Fore.GREEN}All {len(file_paths)} files written are exact"
+              f" copies of their original{Style.RESET_ALL}")
+        return 0
+    print(f"{Fore.RED}Some written files aren't exact copies of their"
+          f" original{Style.RESET_ALL}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
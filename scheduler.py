@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+    Run work over files across a pool of processes, largest files first.
+    Big files get a task of their own while small ones are batched, idle
+    workers take the next task from the shared queue so the tail of a run
+    is made of the smallest tasks.
+"""
+
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+)
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+import os
+import signal
+import threading
+import time
+
+from file_discovery import DiscoveredFile
+
+
+def address_space() -> int:
+    """
+    Bytes of address space the process already uses, 0 where it can't be
+    read from /proc
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            pages = int(statm.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def set_memory_limit(limit: int) -> None:
+    """
+    Cap the address space of the process at limit bytes more than it
+    already uses, allocations past it raise a MemoryError, only available
+    on Unix
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    if limit:
+        limit += address_space()
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+@contextmanager
+def memory_budget(limit: int):
+    """
+    Only let the address space of the process grow by limit bytes inside
+    the block, allocations past it raise a MemoryError, only available on
+    Unix
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if not limit or resource is None:
+        yield
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit += address_space()
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+@contextmanager
+def time_budget(seconds: float):
+    """
+    Raise a TimeoutError inside the block once seconds have elapsed, only
+    available on Unix in the main thread
+    """
+    if not seconds or not hasattr(signal, "setitimer") or \
+            threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TimeoutError(f"Took more than {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class WorkerReport:
+    """Work done by one process of the pool"""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.tasks = 0
+        self.files = 0
+        self.bytes = 0
+        self.busy = 0.0
+
+
+def plan_tasks(
+    files: Sequence[DiscoveredFile],
+    workers: int,
+    batch_bytes: Optional[int] = None
+) -> List[List[DiscoveredFile]]:
+    """
+    Split files in tasks of about batch_bytes, by default a sixteenth of
+    the share of each worker, tasks are sorted largest first
+    """
+    files = sorted(files, key=lambda file: file.size, reverse=True)
+    if batch_bytes is None:
+        total = sum(file.size for file in files)
+        batch_bytes = max(1, total // (workers * 16))
+
+    tasks = []
+    batch = []
+    batch_size = 0
+    for file in files:
+        if file.size >= batch_bytes:
+            tasks.append([file])
+            continue
+        batch.append(file)
+        batch_size += file.size
+        if batch_size >= batch_bytes:
+            tasks.append(batch)
+            batch = []
+            batch_size = 0
+    if batch:
+        tasks.append(batch)
+
+    tasks.sort(key=lambda task: sum(file.size for file in task), reverse=True)
+    return tasks
+
+
+def _timed_call(function: Callable, paths: List[str], *args):
+    start = time.perf_counter()
+    result = function(paths, *args)
+    return result, os.getpid(), time.perf_counter() - start
+
+
+class Scheduler:
+    """
+    Pool of processes running function(paths, *args) on planned tasks,
+    with a report of how busy each worker was
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        memory_limit: int = 0
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.reports: Dict[int, WorkerReport] = {}
+        self.wall_time = 0.0
+
+    def run(
+        self,
+        function: Callable,
+        files: Sequence[DiscoveredFile],
+        *args,
+        on_error: Optional[Callable] = None
+    ) -> Iterator:
+        """
+        Yield the result of each task as soon as it completes. The files of
+        a task running out of memory are tried again one by one, a file
+        still running out of memory yields on_error(path, error), or the
+        MemoryError is raised without on_error
+        """
+        start = time.perf_counter()
+        tasks = plan_tasks(files, self.workers)
+        with ProcessPoolExecutor(
+            self.workers,
+            initializer=set_memory_limit,
+            initargs=(self.memory_limit,)
+        ) as executor:
+            def submit(task: List[DiscoveredFile]) -> Future:
+                return executor.submit(
+                    _timed_call, function, [file.path for file in task], *args
+                )
+
+            pending = {submit(task): task for task in tasks}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    try:
+                        result, pid, busy = future.result()
+                    except MemoryError as error:
+                        # Raised while running or while sending the result
+                        if len(task) > 1:
+                            for file in task:
+                                pending[submit([file])] = [file]
+                            continue
+                        if on_error is None:
+                            raise
+                        yield on_error(task[0].path, error)
+                        continue
+                    report = self.reports.setdefault(pid, WorkerReport(pid))
+                    report.tasks += 1
+                    report.files += len(task)
+                    report.bytes += sum(file.size for file in task)
+                    report.busy += busy
+                    yield result
+        self.wall_time = time.perf_counter() - start
+
+    def utilization(self) -> str:
+        lines = [f"{len(self.reports)} workers, {self.wall_time:.2f}s wall"]
+        for report in sorted(self.reports.values(), key=lambda r: r.pid):
+            usage = report.busy / self.wall_time if self.wall_time else 0
+            lines.append(
+                f"  worker {report.pid} : {usage:6.1%} busy,"
+                f" {report.tasks} tasks, {report.files} files,"
+                f" {report.bytes} bytes"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,369 @@
+# coding=utf-8
+"""
+    Index of the bounds of .bwm models kept in a SQLite database, models are
+    registered in the cells of a regular grid they cover so those exceeding
+    a size or overlapping a region are found without parsing any file.
+"""
+
+from argparse import ArgumentParser
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import math
+import sqlite3
+
+from file_definitions import *
+from file_definitions.file_definition_utilities import PARSE_ERRORS
+from file_discovery import DiscoveredFile, discover, open_asset
+
+Vector3 = Tuple[float, float, float]
+
+# Models covering more cells are kept apart and checked by every query
+MAX_CELLS = 512
+
+
+class ModelBounds(NamedTuple):
+    """
+    Box around the header box and collision points of a model, along with
+    the other bounds of LionheadModelHeader
+    """
+    low: Vector3
+    high: Vector3
+    cent: Vector3
+    radius: float
+    height: float
+
+
+class MeshBounds(NamedTuple):
+    index: int
+    name: str
+    lod_level: int
+    low: Vector3
+    high: Vector3
+    cent: Vector3
+    radius: float
+
+
+def box_of(points: Iterable[Vector3]) -> Tuple[Vector3, Vector3]:
+    """Smallest box holding every point"""
+    points = list(points)
+    low = tuple(min(point[axis] for point in points) for axis in range(3))
+    high = tuple(max(point[axis] for point in points) for axis in range(3))
+    return low, high
+
+
+def read_bounds(file_path: str) -> Tuple[ModelBounds, List[MeshBounds]]:
+    """Bounds of a model, only its metadata is parsed"""
+    with open_asset(file_path) as reader:
+        if not BWMFile.probe(reader).valid:
+            raise ValueError(f"{file_path} failed its probe")
+        reader.seek(0)
+        model = BWMFile(reader, streaming=True)
+
+    header = model.modelHeader
+    low, high = box_of(
+        [header.box1, header.box2]
+        + [point.position for point in model.collisionPoints]
+    )
+    meshes = [
+        MeshBounds(
+            index, mesh.name, mesh.lod_level,
+            *box_of([mesh.box1, mesh.box2]), tuple(mesh.cent), mesh.radius
+        )
+        for index, mesh in enumerate(model.meshDescriptions)
+    ]
+    return ModelBounds(
+        low, high, header.cent, header.radius, header.height
+    ), meshes
+
+
+class SpatialIndex:
+    """
+    Bounds of every indexed model, entries are refreshed when the size or
+    modification time of a file changes
+    """
+
+    def __init__(self, db_path: str, cell_size: float = 16.0) -> None:
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value REAL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL
+            );
+            CREATE TABLE IF NOT EXISTS models (
+                path TEXT PRIMARY KEY,
+                min_x REAL, min_y REAL, min_z REAL,
+                max_x REAL, max_y REAL, max_z REAL,
+                cent_x REAL, cent_y REAL, cent_z REAL,
+                radius REAL,
+                height REAL,
+                extent REAL
+            );
+            CREATE INDEX IF NOT EXISTS models_by_extent ON models (extent);
+            CREATE INDEX IF NOT EXISTS models_by_radius ON models (radius);
+            CREATE INDEX IF NOT EXISTS models_by_height ON models (height);
+            CREATE TABLE IF NOT EXISTS meshes (
+                path TEXT,
+                mesh INTEGER,
+                name TEXT,
+                lod_level INTEGER,
+                min_x REAL, min_y REAL, min_z REAL,
+                max_x REAL, max_y REAL, max_z REAL,
+                cent_x REAL, cent_y REAL, cent_z REAL,
+                radius REAL,
+                PRIMARY KEY (path, mesh)
+            );
+            CREATE TABLE IF NOT EXISTS cells (
+                x INTEGER,
+                y INTEGER,
+                z INTEGER,
+                path TEXT,
+                PRIMARY KEY (x, y, z, path)
+            );
+            CREATE INDEX IF NOT EXISTS cells_by_file ON cells (path);
+            CREATE TABLE IF NOT EXISTS large (
+                path TEXT PRIMARY KEY
+            );
+            """
+        )
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO settings VALUES ('cell_size', ?)",
+                (cell_size,)
+            )
+        # The grid of an existing index is kept
+        self.cell_size = self.connection.execute(
+            "SELECT value FROM settings WHERE name = 'cell_size'"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def cell_range(
+        self,
+        low: Vector3,
+        high: Vector3
+    ) -> Optional[Tuple[Tuple[int, int], ...]]:
+        """
+        First and last cell along each axis covered by a box, None when
+        the box isn't finite
+        """
+        if not all(map(math.isfinite, low + high)):
+            return None
+        return tuple(
+            (math.floor(low[axis] / self.cell_size),
+             math.floor(high[axis] / self.cell_size))
+            for axis in range(3)
+        )
+
+    def cells_of(
+        self,
+        low: Vector3,
+        high: Vector3
+    ) -> Optional[Iterator[Tuple[int, int, int]]]:
+        """Cells covered by a box, None when there are too many of them"""
+        cell_range = self.cell_range(low, high)
+        if cell_range is None:
+            return None
+        count = 1
+        for first, last in cell_range:
+            count *= last - first + 1
+        if count > MAX_CELLS:
+            return None
+        (x0, x1), (y0, y1), (z0, z1) = cell_range
+        return (
+            (x, y, z)
+            for x in range(x0, x1 + 1)
+            for y in range(y0, y1 + 1)
+            for z in range(z0, z1 + 1)
+        )
+
+    def is_current(self, file: DiscoveredFile) -> bool:
+        row = self.connection.execute(
+            "SELECT size, mtime FROM files WHERE path = ?", (file.path,)
+        ).fetchone()
+        return row is not None and row == (file.size, file.mtime)
+
+    def remove(self, file_path: str) -> None:
+        for table in ("files", "models", "meshes", "cells", "large"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE path = ?", (file_path,)
+            )
+
+    def add(self, file: DiscoveredFile) -> None:
+        """Index a model, replacing its previous entry"""
+        bounds, meshes = read_bounds(file.path)
+        extent = max(
+            high - low for low, high in zip(bounds.low, bounds.high)
+        )
+        cells = self.cells_of(bounds.low, bounds.high)
+        with self.connection:
+            self.remove(file.path)
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?)",
+                (file.path, file.size, file.mtime)
+            )
+            self.connection.execute(
+                "INSERT INTO models VALUES"
+                " (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file.path, *bounds.low, *bounds.high, *bounds.cent,
+                 bounds.radius, bounds.height, extent)
+            )
+            self.connection.executemany(
+                "INSERT INTO meshes VALUES"
+                " (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (file.path, mesh.index, mesh.name, mesh.lod_level,
+                     *mesh.low, *mesh.high, *mesh.cent, mesh.radius)
+                    for mesh in meshes
+                ]
+            )
+            if cells is None:
+                self.connection.execute(
+                    "INSERT INTO large VALUES (?)", (file.path,)
+                )
+            else:
+                self.connection.executemany(
+                    "INSERT INTO cells VALUES (?, ?, ?, ?)",
+                    [(*cell, file.path) for cell in cells]
+                )
+
+    def build(self, files: Iterable[DiscoveredFile]) -> List[str]:
+        """
+        Index every new or changed model and drop the models not in files
+        anymore, return the ones that couldn't be read
+        """
+        errors = []
+        paths = set()
+        for file in files:
+            paths.add(file.path)
+            if self.is_current(file):
+                continue
+            try:
+                self.add(file)
+            except PARSE_ERRORS:
+                errors.append(file.path)
+                with self.connection:
+                    self.remove(file.path)
+
+        stored = self.connection.execute("SELECT path FROM files").fetchall()
+        with self.connection:
+            for (path,) in stored:
+                if path not in paths:
+                    self.remove(path)
+        return errors
+
+    def larger_than(self, size: float, measure: str = "extent") -> List[str]:
+        """
+        Models whose extent, the largest side of their box, or radius or
+        height exceeds size, largest first
+        """
+        if measure not in ("extent", "radius", "height"):
+            raise ValueError(f"Unknown measure {measure}")
+        rows = self.connection.execute(
+            f"SELECT path FROM models WHERE {measure} > ?"
+            f" ORDER BY {measure} DESC",
+            (size,)
+        )
+        return [path for (path,) in rows]
+
+    def overlapping(self, low: Vector3, high: Vector3) -> List[str]:
+        """Models whose box overlaps the box from low to high"""
+        cell_range = self.cell_range(low, high)
+        if cell_range is None:
+            raise ValueError("The region must be finite")
+        (x0, x1), (y0, y1), (z0, z1) = cell_range
+        rows = self.connection.execute(
+            """
+            SELECT path FROM models
+            WHERE path IN (
+                SELECT path FROM cells
+                WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ?
+                    AND z BETWEEN ? AND ?
+                UNION SELECT path FROM large
+            )
+            AND min_x <= ? AND max_x >= ?
+            AND min_y <= ? AND max_y >= ?
+            AND min_z <= ? AND max_z >= ?
+            ORDER BY path
+            """,
+            (x0, x1, y0, y1, z0, z1,
+             high[0], low[0], high[1], low[1], high[2], low[2])
+        )
+        return [path for (path,) in rows]
+
+    def mesh_bounds(self, file_path: str) -> List[MeshBounds]:
+        rows = self.connection.execute(
+            "SELECT mesh, name, lod_level, min_x, min_y, min_z,"
+            " max_x, max_y, max_z, cent_x, cent_y, cent_z, radius"
+            " FROM meshes WHERE path = ? ORDER BY mesh",
+            (file_path,)
+        )
+        return [
+            MeshBounds(row[0], row[1], row[2], tuple(row[3:6]),
+                       tuple(row[6:9]), tuple(row[9:12]), row[12])
+            for row in rows
+        ]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("database")
+    parser.add_argument(
+        "patterns",
+        nargs="*",
+        help="index the .bwm files matched, dropping the others"
+    )
+    parser.add_argument(
+        "--cell-size",
+        type=float,
+        default=16.0,
+        help="side of the cells of a new index"
+    )
+    parser.add_argument(
+        "--larger",
+        type=float,
+        metavar="SIZE",
+        help="list the models larger than SIZE"
+    )
+    parser.add_argument(
+        "--measure",
+        default="extent",
+        choices=("extent", "radius", "height"),
+        help="what --larger compares"
+    )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        nargs=6,
+        metavar=("X0", "Y0", "Z0", "X1", "Y1", "Z1"),
+        help="list the models overlapping this box"
+    )
+    args = parser.parse_args()
+
+    index = SpatialIndex(args.database, args.cell_size)
+    if args.patterns:
+        errors = index.build(
+            file
+            for pattern in args.patterns
+            for file in discover(pattern, extensions=[".bwm"])
+        )
+        for error in errors:
+            print(f"Couldn't index {error}")
+    if args.larger is not None:
+        for path in index.larger_than(args.larger, args.measure):
+            print(path)
+    if args.overlap:
+        for path in index.overlapping(
+            tuple(args.overlap[:3]), tuple(args.overlap[3:])
+        ):
+            print(path)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# coding=utf-8
+"""
+    Index of the sections of .al and .bwm files kept in a SQLite database,
+    records can then be read by seeking straight to them.
+"""
+
+from typing import Dict, Iterable, List
+import os
+import sqlite3
+import sys
+
+from file_definitions import *
+from file_definitions.file_definition_utilities import (
+    PARSE_ERRORS, Section, read_float, read_int16, read_vector
+)
+from file_discovery import (
+    discover, open_asset, split_archive_path, stat_asset
+)
+
+
+DATA_TYPES = {".al": AlFile, ".bwm": BWMFile}
+
+# Classes decoding one record of a fixed size section
+RECORD_TYPES = {
+    "header": AlHeader,
+    "animationMetadataArray": AnimationMetadata,
+    "fileHeader": BWMHeader,
+    "modelHeader": LionheadModelHeader,
+    "materialDefinitions": MaterialDefinition,
+    "meshDescriptions": MeshDescription,
+    "materialRefs": MaterialRef,
+    "bones": Bone,
+    "entities": Entity,
+    "unknowns1": Unknown1,
+    "collisionPoints": CollisionPoint,
+    "strides": Stride,
+}
+
+
+def read_sections(file_path: str) -> List[Section]:
+    """Walk the metadata of a file to locate its sections"""
+    data_type = DATA_TYPES[os.path.splitext(file_path)[1].lower()]
+    with open_asset(file_path) as reader:
+        return data_type(reader, streaming=True).sections()
+
+
+class StructureIndex:
+    """
+    Sections of every indexed file, entries are refreshed when the size or
+    modification time of a file changes
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL
+            );
+            CREATE TABLE IF NOT EXISTS sections (
+                path TEXT,
+                name TEXT,
+                offset INTEGER,
+                size INTEGER,
+                count INTEGER,
+                PRIMARY KEY (path, name)
+            );
+            """
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def is_current(self, file_path: str) -> bool:
+        _, size, mtime = stat_asset(file_path)
+        row = self.connection.execute(
+            "SELECT size, mtime FROM files WHERE path = ?", (file_path,)
+        ).fetchone()
+        return row is not None and row == (size, mtime)
+
+    def remove(self, file_path: str) -> None:
+        for table in ("files", "sections"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE path = ?", (file_path,)
+            )
+
+    def add(self, file_path: str) -> None:
+        """Index a file, replacing its previous entry"""
+        _, size, mtime = stat_asset(file_path)
+        sections = read_sections(file_path)
+        with self.connection:
+            self.remove(file_path)
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?)",
+                (file_path, size, mtime)
+            )
+            self.connection.executemany(
+                "INSERT INTO sections VALUES (?, ?, ?, ?, ?)",
+                [(file_path, *section) for section in sections]
+            )
+
+    def build(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        Index every outdated file, return the ones that couldn't be read,
+        their previous entry is dropped
+        """
+        errors = []
+        for file_path in file_paths:
+            if self.is_current(file_path):
+                continue
+            try:
+                self.add(file_path)
+            except PARSE_ERRORS:
+                errors.append(file_path)
+                with self.connection:
+                    self.remove(file_path)
+        return errors
+
+    def sections(self, file_path: str) -> Dict[str, Section]:
+        if not self.is_current(file_path):
+            self.add(file_path)
+        rows = self.connection.execute(
+            "SELECT name, offset, size, count FROM sections WHERE path = ?",
+            (file_path,)
+        )
+        return {row[0]: Section(*row) for row in rows}
+
+    def read(self, file_path: str, name: str, index: int = 0):
+        """
+        Decode the record at index in the section name, e.g.
+        read(path, "meshDescriptions", 2) or
+        read(path, "animationDataArray", 10)
+        """
+        sections = self.sections(file_path)
+        with open_asset(file_path) as reader:
+            if name == "animationDataArray":
+                section = sections.get(f"animationDataArray[{index}]")
+                if section is None:
+                    raise IndexError(f"No animation {index} in {file_path}")
+                return AnimationData(reader, section.offset)
+
+            section = sections[name]
+            if not 0 <= index < section.count:
+                raise IndexError(f"{name} only has {section.count} records")
+            if name == "modelCleaves":
+                # The section starts with the count of cleaves
+                reader.seek(section.offset + 4 + index * 0xC)
+                return tuple(read_vector(reader, 3, read_float))
+            record_size = section.size // section.count
+            reader.seek(section.offset + index * record_size)
+
+            if name in RECORD_TYPES:
+                return RECORD_TYPES[name](reader)
+            if name == "indexes":
+                return read_int16(reader)
+
+            # Vertices and stride data need the description of their stride
+            stride_index = 0 if name == "vertices" else int(name[5:-1]) + 1
+            position = reader.tell()
+            strides = sections["strides"]
+            reader.seek(strides.offset + stride_index * 0x88)
+            stride = Stride(reader)
+            reader.seek(position)
+            if name == "vertices":
+                return Vertex(stride, reader)
+            return stride.read_data(reader)
+
+
+def main() -> None:
+    if len(sys.argv) < 3:
+        print(
+            "Usage: structure_index.py DATABASE PATTERN...\n"
+            "       structure_index.py DATABASE FILE SECTION [INDEX]"
+        )
+        return
+
+    index = StructureIndex(sys.argv[1])
+    if len(sys.argv) >= 4 and (
+        os.path.isfile(sys.argv[2]) or split_archive_path(sys.argv[2])
+    ):
+        record = index.read(
+            sys.argv[2], sys.argv[3],
+            int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        )
+        print(vars(record) if hasattr(record, "__dict__") else record)
+    else:
+        errors = index.build(
+            file_path
+            for pattern in sys.argv[2:]
+            for file_path, _, _ in discover(pattern)
+        )
+        for error in errors:
+            print(f"Couldn't index {error}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# coding=utf-8
+"""
+    Synthetic .bwm and .al files shared by the tests, built field by field
+    so the tests don't depend on the game files.
+"""
+
+from typing import Dict
+import os
+import random
+import struct
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_bwm(
+    seed: int = 0,
+    version: int = 6,
+    vertex_count: int = 4,
+    index_count: int = 6
+) -> bytes:
+    """
+    Skin with 2 meshes, 2 collision points and two strides of data, the
+    second holding a bone index and a pair of weights per vertex
+    """
+    generator = random.Random(seed)
+
+    def floats(count):
+        return [generator.uniform(-5, 5) for _ in range(count)]
+
+    model_header = struct.pack(
+        "<15fIf6I5f4I", *floats(15), 7, 1.5, 1, 2, 1, 1, 1, 2, *floats(5),
+        vertex_count, 3, 3, index_count
+    )
+    materials = b"".join(
+        struct.pack("<64s", name.encode())
+        for name in ["diff.dds", "light", "", "", "", "norm", "Type"]
+    )
+    meshes = b""
+    refs = b""
+    for mesh in range(2):
+        meshes += struct.pack(
+            "<5I12f3ff3f3f3fffIfIII64s2I", 2, 0, index_count, 0,
+            vertex_count, *floats(12), *floats(3), 1.0, *floats(3),
+            *floats(3), *floats(3), 2.0, 0.5, 3, 9.0, 2, 0, mesh + 1,
+            f"mesh{mesh}".encode(), 0, 0
+        )
+        for _ in range(2):
+            refs += struct.pack("<7If", 0, 0, 3, 0, vertex_count, 0, 1, 0.25)
+    bones = struct.pack("<12f", *floats(12))
+    entities = struct.pack("<12f256s", *floats(12), b"entity_name")
+    unknowns = struct.pack("<3f", *floats(3))
+    collision_points = struct.pack("<6f", *floats(6))
+    vertex_stride = struct.pack("<I6I", 3, 0, 2, 1, 2, 2, 1)
+    vertex_stride += bytes(0x88 - len(vertex_stride))
+    data_stride = struct.pack("<I2I", 1, 6, 3)
+    data_stride += bytes(0x88 - len(data_stride))
+    skin_stride = struct.pack("<I4I", 2, 6, 4, 7, 1)
+    skin_stride += bytes(0x88 - len(skin_stride))
+    metadata = model_header + materials + meshes + refs + bones\
+        + entities + unknowns + collision_points + vertex_stride\
+        + data_stride + skin_stride
+
+    vertices = b"".join(
+        struct.pack("<8f", *floats(8)) for _ in range(vertex_count)
+    )
+    data = b"".join(
+        struct.pack("<I", generator.randrange(4)) for _ in range(vertex_count)
+    )
+    data += b"".join(
+        struct.pack("<B2f", generator.randrange(4), *floats(2))
+        for _ in range(vertex_count)
+    )
+    indexes = struct.pack(
+        f"<{index_count}H",
+        *[generator.randrange(vertex_count) for _ in range(index_count)]
+    )
+    cleaves = b""
+    if version > 5:
+        cleaves = struct.pack("<I6f", 2, *floats(6))
+
+    rest = metadata + vertices + data + indexes + cleaves
+    header = struct.pack(
+        "<40sIIII", b"LiOnHeAdMODEL", len(rest) + 0x38 - 0x2C, 0x2B00B1E5,
+        version, len(metadata)
+    )
+    return header + rest
+
+
+def make_al(
+    seed: int = 0,
+    animation_count: int = 3,
+    bone_count: int = 4,
+    frame_count: int = 5
+) -> bytes:
+    """Animation bank whose keyframes hold bone_count triples each"""
+    generator = random.Random(seed)
+    skeleton = struct.pack("<II", bone_count, 0) + b"".join(
+        struct.pack("<32si", f"bone{bone}".encode(), bone - 1)
+        for bone in range(bone_count)
+    )
+    skeleton += struct.pack("<4h", 1, 2, 3, 4)
+
+    event_count = 2
+    strings = b"root\0walk\0"
+    offset_block_size = 8 * frame_count + 16
+    animations = []
+    for animation in range(animation_count):
+        header = struct.pack(
+            "<II64sIII2IIIIfffBBH2II2II", 7, 2,
+            f"anim{animation}".encode(), 1, len(strings), offset_block_size,
+            bone_count - 1, 1, event_count, bone_count, frame_count, 30.0,
+            frame_count / 30.0, 1.5, 1, 0, generator.randrange(8),
+            0, 0, 0, 0, 0, 0
+        )
+        events = b"".join(
+            struct.pack(
+                "<II16f", 0x90 + 0x48 * event_count,
+                0x90 + 0x48 * event_count + 5,
+                *[generator.random() for _ in range(16)]
+            )
+            for _ in range(event_count)
+        )
+        body = header + events + strings
+        body += struct.pack("<I3f", 8, 0, 0, 0) + struct.pack("<2i", 1, 2)
+        body += b"".join(
+            struct.pack("<2i", frame, frame) for frame in range(frame_count)
+        )
+        body += bytes(16)
+        body += struct.pack(
+            "<2I8I3I3f", bone_count - 1, 1, *range(8), 1, 2, 3, 0.5, 0.5, 0.5
+        )
+        body += b"".join(
+            struct.pack("<4f", *[generator.random() for _ in range(4)])
+            for _ in range(bone_count)
+        )
+        body += b"".join(
+            struct.pack("<3f", *[generator.random() for _ in range(3)])
+            for _ in range(bone_count)
+        )
+        body += b"".join(
+            struct.pack(
+                "<3h", *[generator.randrange(-32767, 32767) for _ in range(3)]
+            )
+            for _ in range((frame_count - 1) * bone_count)
+        )
+        animations.append((header, body))
+
+    data_start = 0x60 + len(skeleton) + animation_count * 0x94
+    offsets = []
+    position = data_start
+    for _, body in animations:
+        offsets.append(position)
+        position += len(body)
+    metadata = b"".join(
+        header + struct.pack("<I", offset)
+        for (header, _), offset in zip(animations, offsets)
+    )
+    header = struct.pack(
+        "<II64sIIII2f", 1, 2, b"bank", len(skeleton), position, data_start,
+        animation_count, 0.25, generator.random()
+    )
+    return header + skeleton + metadata + b"".join(
+        body for _, body in animations
+    )
+
+
+def write_file(path, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as writer:
+        writer.write(data)
+    return str(path)
+
+
+@pytest.fixture
+def corpus(tmp_path) -> Dict[str, str]:
+    """
+    Two directories of models and animations, with one malformed model,
+    keyed by their path relative to the corpus
+    """
+    files = {}
+    for i in range(6):
+        directory = "a" if i % 2 else "b"
+        name = f"{directory}/m{i}.bwm"
+        files[name] = write_file(
+            tmp_path / "corpus" / name,
+            make_bwm(i, 5 + i % 2, 4 + i * 10, 6 + i * 6)
+        )
+    for i in range(4):
+        directory = "a" if i % 2 else "b"
+        name = f"{directory}/x{i}.al"
+        files[name] = write_file(
+            tmp_path / "corpus" / name, make_al(i, 2 + i, frame_count=3 + i)
+        )
+    files["b/bad.bwm"] = write_file(
+        tmp_path / "corpus" / "b" / "bad.bwm", b"garbage" * 10
+    )
+    return files
+
+
+def logged_counts(log_path) -> Dict[str, Dict[str, int]]:
+    """Counts of every csv of a varsDist folder, values as written"""
+    import pandas
+
+    counts = {}
+    folder = os.path.join(log_path, "varsDist")
+    for file_name in sorted(os.listdir(folder)):
+        rows = pandas.read_csv(os.path.join(folder, file_name), dtype=str)
+        counts[file_name] = dict(zip(rows["Value"], rows["Count"].astype(int)))
+    return counts
+
+
+@pytest.fixture
+def in_tmp(tmp_path, monkeypatch):
+    """Run the test from tmp_path, the logs go to its results folder"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def bwm_format(in_tmp, corpus) -> dict:
+    """Entry of to_investigate counting the models of the corpus"""
+    return {
+        "files": os.path.join(str(in_tmp), "corpus", "**", "*.bwm"),
+        "data_type": "BWMFile",
+        "var_to_check": [
+            "self.modelHeader.vertexCount",
+            "self.meshDescriptions.name",
+        ],
+    }
@@ -0,0 +1,81 @@
+# coding=utf-8
+import mmap
+
+import pytest
+
+from conftest import make_al, write_file
+from file_definitions.file_definition_al import AlFile
+
+
+@pytest.fixture
+def bank(tmp_path):
+    path = write_file(tmp_path / "bank.al", make_al(5, frame_count=6))
+    with open(path, "rb") as reader:
+        yield AlFile(reader), reader
+
+
+def test_keyframes_are_signed(bank):
+    bank, _ = bank
+    values = [
+        value
+        for data in bank.animationDataArray
+        for frame in data.keyFrames
+        for vector in frame
+        for value in vector
+    ]
+    assert min(values) < 0
+    assert all(-32768 <= value < 32768 for value in values)
+
+
+def test_frame_matches_the_keyframes(bank):
+    bank, reader = bank
+    mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+    for data in bank.animationDataArray:
+        for index, keyframe in enumerate(data.keyFrames):
+            assert data.frame(reader, index) == keyframe
+            assert data.frame(mapped, index) == keyframe
+    mapped.close()
+
+
+def test_frame_out_of_range(bank):
+    bank, reader = bank
+    data = bank.animationDataArray[0]
+    with pytest.raises(IndexError):
+        data.frame(reader, data.keyFrameCount)
+
+
+def test_pose_interpolates_across_zero(bank):
+    bank, reader = bank
+    data = bank.animationDataArray[1]
+    first, second = data.keyFrames[0], data.keyFrames[1]
+    pose = data.pose(reader, 0.25 / data.animationInfo.samplingRate)
+
+    crossing = 0
+    for vectorA, vectorB, vector in zip(first, second, pose):
+        for a, b, value in zip(vectorA, vectorB, vector):
+            assert value == pytest.approx(a + (b - a) * 0.25)
+            assert min(a, b) <= value <= max(a, b)
+            crossing += (a < 0) != (b < 0)
+    assert crossing
+    assert data.pose(reader, 0.0) == [
+        [float(value) for value in vector] for vector in first
+    ]
+    assert data.pose(reader, 0.4 / data.animationInfo.samplingRate,
+                     interpolate=False) == first
+
+
+def test_pose_starts_on_the_first_keyframe(bank):
+    bank, reader = bank
+    data = bank.animationDataArray[2]
+    rate = data.animationInfo.samplingRate
+    last = data.keyFrameCount - 1
+    first, final = (
+        [[float(value) for value in vector] for vector in keyframe]
+        for keyframe in (data.keyFrames[0], data.keyFrames[-1])
+    )
+    assert data.pose(reader, 0.0) == first
+
+    data.animationInfo.isCyclic = True
+    assert data.pose(reader, last / rate) == first
+    data.animationInfo.isCyclic = False
+    assert data.pose(reader, last / rate) == final
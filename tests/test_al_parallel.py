@@ -0,0 +1,70 @@
+# coding=utf-8
+from io import BytesIO
+import os
+import zipfile
+
+import pytest
+
+from conftest import make_al, write_file
+from file_definitions.file_definition_al import AlFile
+from file_definitions.file_definition_utilities import CheckedReader
+from file_discovery import open_asset
+
+
+def summary(animation_data):
+    return (
+        vars(animation_data.animationInfo),
+        [vars(event) for event in animation_data.animationEvents],
+        animation_data.tuple,
+        animation_data.boneRotation,
+        animation_data.keyFrames,
+    )
+
+
+def test_parallel_decode_matches_sequential(tmp_path):
+    path = write_file(tmp_path / "bank.al", make_al(3, animation_count=9))
+    with open(path, "rb") as reader:
+        sequential = AlFile(reader)
+    with open(path, "rb") as reader:
+        parallel = AlFile(reader, processes=3)
+    assert len(parallel.animationDataArray) == 9
+    assert [summary(data) for data in parallel.animationDataArray] == [
+        summary(data) for data in sequential.animationDataArray
+    ]
+
+
+def test_streaming_decodes_on_demand(tmp_path):
+    path = write_file(tmp_path / "bank.al", make_al(4, animation_count=3))
+    with open(path, "rb") as reader:
+        eager = AlFile(reader)
+    with open(path, "rb") as reader:
+        streaming = AlFile(reader, streaming=True)
+        assert streaming.animationDataArray == []
+        assert summary(streaming.read_animation_data(2)) == summary(
+            eager.animationDataArray[2]
+        )
+
+
+def test_archive_members_are_decoded_without_processes(tmp_path):
+    data = make_al(5, animation_count=4)
+    archive = str(tmp_path / "pack.zip")
+    with zipfile.ZipFile(archive, "w") as writer:
+        writer.writestr("anims/bank.al", data)
+    expected = AlFile(BytesIO(data))
+
+    with open_asset(os.path.join(archive, "anims", "bank.al")) as reader:
+        bank = AlFile(reader, processes=2)
+    with open_asset(os.path.join(archive, "anims", "bank.al")) as reader:
+        hardened = AlFile(CheckedReader(reader), processes=2)
+    for decoded in (bank, hardened):
+        assert [summary(data) for data in decoded.animationDataArray] == [
+            summary(data) for data in expected.animationDataArray
+        ]
+
+
+def test_hardened_reader_is_not_bypassed(tmp_path):
+    data = make_al(6, animation_count=2)
+    path = write_file(tmp_path / "cut.al", data[:len(data) - 10])
+    with open(path, "rb") as reader:
+        with pytest.raises(ValueError):
+            AlFile(CheckedReader(reader), processes=2)
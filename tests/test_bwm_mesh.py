@@ -0,0 +1,43 @@
+# coding=utf-8
+from io import BytesIO
+
+from conftest import make_bwm
+from file_definitions.file_definition_bwm import BWMFile
+
+
+def split_model() -> bytes:
+    """Model whose second mesh and its refs use the end of the buffers"""
+    model = BWMFile(BytesIO(make_bwm(8, vertex_count=20, index_count=30)))
+    mesh = model.meshDescriptions[1]
+    mesh.vertexOffset, mesh.vertexSize = 12, 8
+    mesh.indiciesOffset, mesh.indiciesSize = 18, 12
+    mesh.lod_level = 3
+    ref = mesh.materialRefs[0]
+    ref.vertexOffset, ref.vertexSize = 15, 3
+    ref.indiciesOffset, ref.indiciesSize = 21, 6
+    return model.to_bytes()
+
+
+def test_find_mesh_by_name_and_level():
+    model = BWMFile(BytesIO(split_model()))
+    assert model.find_mesh(name="mesh1") is model.meshDescriptions[1]
+    assert model.find_mesh(lod_level=3) is model.meshDescriptions[1]
+    assert model.find_mesh(lod_level=3, name="mesh0") is None
+
+
+def test_read_mesh_slices_the_buffers():
+    data = split_model()
+    eager = BWMFile(BytesIO(data))
+    streaming = BWMFile(BytesIO(data), streaming=True)
+    for model in (eager, streaming):
+        mesh = model.find_mesh(name="mesh1")
+        part = model.read_mesh(mesh)
+        assert [vars(vertex) for vertex in part.vertices] == [
+            vars(vertex) for vertex in eager.vertices[12:20]
+        ]
+        assert part.data == [rows[12:20] for rows in eager.data]
+        assert part.indexes == eager.indexes[18:30]
+
+        part = model.read_mesh(mesh.materialRefs[0])
+        assert len(part.vertices) == 3
+        assert part.indexes == eager.indexes[21:27]
@@ -0,0 +1,126 @@
+# coding=utf-8
+from io import BytesIO
+from itertools import chain
+import os
+import tracemalloc
+
+import pytest
+
+from compile_info import investigate, new_logger, read_format_file
+from conftest import logged_counts, make_bwm, write_file
+from file_definitions.file_definition_bwm import BWMFile
+
+
+@pytest.fixture
+def models():
+    original = make_bwm(7, vertex_count=50, index_count=90)
+    return BWMFile(BytesIO(original)), BWMFile(BytesIO(original), True)
+
+
+def test_streaming_skips_the_buffers(models):
+    eager, streaming = models
+    assert streaming.vertices == [] and streaming.indexes == []
+    assert streaming.modelCleaves == eager.modelCleaves
+
+
+@pytest.mark.parametrize("chunk_size", [32, 100, 1 << 20])
+def test_chunks_hold_every_record(models, chunk_size):
+    eager, streaming = models
+    vertices = list(chain.from_iterable(streaming.iter_vertices(chunk_size)))
+    assert [vars(vertex) for vertex in vertices] == [
+        vars(vertex) for vertex in eager.vertices
+    ]
+    assert list(
+        chain.from_iterable(streaming.iter_data(0, chunk_size))
+    ) == eager.data[0]
+    assert list(
+        chain.from_iterable(streaming.iter_indexes(chunk_size))
+    ) == eager.indexes
+    for chunk in streaming.iter_vertices(chunk_size):
+        assert len(chunk) * streaming.strides[0].stride <= max(
+            chunk_size, streaming.strides[0].stride
+        )
+
+
+def test_ranges_are_clamped_to_the_section(models):
+    eager, streaming = models
+    assert streaming.read_indexes(80, 50) == eager.indexes[80:130]
+    assert streaming.read_indexes(200, 5) == []
+    assert [
+        vars(vertex) for vertex in streaming.read_vertices(45, 10)
+    ] == [vars(vertex) for vertex in eager.vertices[45:]]
+
+
+STREAMED_VARS = [
+    "self.vertices.position",
+    "self.vertices",
+    "self.data",
+    "self.data[0]",
+    "self.data[1]",
+    "self.indexes",
+    "self.modelHeader.vertexCount",
+]
+
+
+@pytest.mark.parametrize("batch_size", [0, 7])
+def test_streamed_counts_match_an_eager_parse(
+    bwm_format, monkeypatch, batch_size
+):
+    monkeypatch.setattr(BWMFile, "streamChunkSize", 64)
+    bwm_format["var_to_check"] = STREAMED_VARS
+    bwm_format["batch_size"] = batch_size
+    investigate(bwm_format)
+    eager = logged_counts(os.path.join("results", "BWMFile"))
+
+    bwm_format["streaming"] = True
+    investigate(bwm_format)
+    assert logged_counts(os.path.join("results", "BWMFile")) == eager
+    assert eager["self.vertices.csv"] == {
+        str(count): 1 for count in (4, 14, 24, 34, 44, 54)
+    }
+
+
+def test_streamed_file_failing_half_way_leaves_no_counts(
+    tmp_path, monkeypatch
+):
+    iter_records = BWMFile.iter_records
+
+    def failing(self, name, chunkSize=None):
+        chunks = iter_records(self, name, 64)
+        yield next(chunks)
+        raise ValueError("Read past the end of the file")
+
+    monkeypatch.setattr(BWMFile, "iter_records", failing)
+    path = write_file(tmp_path / "m.bwm", make_bwm(2, vertex_count=40))
+    current_format = {
+        "data_type": "BWMFile",
+        "var_to_check": ["self.vertices.position"],
+        "streaming": True,
+    }
+    value_logger = new_logger(current_format)
+    read_format_file(current_format, path, value_logger)
+    assert value_logger.error == [path]
+    assert value_logger.error_reasons[path].startswith("ValueError: Read")
+    assert value_logger.logged_var["self.vertices.position"] == {}
+
+
+def peak_while_counting(current_format, path) -> int:
+    value_logger = new_logger(current_format)
+    tracemalloc.start()
+    try:
+        read_format_file(current_format, path, value_logger)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_bounds_the_memory_of_a_model(tmp_path):
+    path = write_file(
+        tmp_path / "large.bwm", make_bwm(3, vertex_count=20000)
+    )
+    current_format = {
+        "data_type": "BWMFile", "var_to_check": ["self.data[1]"]
+    }
+    eager = peak_while_counting(current_format, path)
+    current_format["streaming"] = True
+    assert peak_while_counting(current_format, path) < eager / 4
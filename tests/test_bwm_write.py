@@ -0,0 +1,51 @@
+# coding=utf-8
+from io import BytesIO
+
+import pytest
+
+from conftest import make_bwm
+from file_definitions.file_definition_bwm import BWMFile
+
+
+@pytest.mark.parametrize("version", [5, 6])
+def test_to_bytes_is_an_exact_copy(version):
+    original = make_bwm(3, version, vertex_count=12, index_count=18)
+    assert BWMFile(BytesIO(original)).to_bytes() == original
+
+
+def test_pack_fills_a_buffer_of_the_file_size():
+    original = make_bwm(1)
+    model = BWMFile(BytesIO(original))
+    buffer = model.pack()
+    assert isinstance(buffer, bytearray)
+    assert len(buffer) == len(original)
+    assert model.fileHeader.size + 0x2C == len(original)
+
+
+def test_pack_reflects_changed_records():
+    model = BWMFile(BytesIO(make_bwm(2)))
+    model.collisionPoints[0].position = (1.0, 2.0, 3.0)
+    written = BWMFile(BytesIO(model.to_bytes()))
+    assert written.collisionPoints[0].position == (1.0, 2.0, 3.0)
+
+
+def test_write_refuses_to_overwrite(tmp_path):
+    original = make_bwm(4)
+    path = tmp_path / "copy.bwm"
+    BWMFile(BytesIO(original)).write(str(path))
+    assert path.read_bytes() == original
+    with pytest.raises(FileExistsError):
+        BWMFile(BytesIO(original)).write(str(path))
+
+
+def test_every_component_of_a_stride_is_read_and_written():
+    original = make_bwm(5, vertex_count=3)
+    model = BWMFile(BytesIO(original))
+    assert [len(row) for row in model.data[1]] == [2, 2, 2]
+    index, weights = model.data[1][0]
+    assert isinstance(index, int) and len(weights) == 2
+
+    model.data[1][0] = [3, [0.5, 0.25]]
+    written = BWMFile(BytesIO(model.to_bytes()))
+    assert written.data[1][0] == [3, [0.5, 0.25]]
+    assert written.data[1][1:] == model.data[1][1:]
@@ -0,0 +1,110 @@
+# coding=utf-8
+import os
+import shutil
+
+import pytest
+
+import compile_info
+from compile_info import FormatWatcher, investigate, investigate_incrementally
+from conftest import logged_counts, make_bwm, write_file
+from file_discovery import discover, find_duplicates
+from result_store import ResultStore
+
+
+@pytest.fixture
+def copies(corpus):
+    """Two copies of a model and one of the malformed file"""
+    folder = os.path.dirname(corpus["b/bad.bwm"])
+    paths = []
+    for name, original in (
+        ("copy1.bwm", "a/m1.bwm"), ("copy2.bwm", "a/m1.bwm"),
+        ("bad copy.bwm", "b/bad.bwm"),
+    ):
+        paths.append(os.path.join(folder, name))
+        shutil.copy(corpus[original], paths[-1])
+    return paths
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Paths parsed by compile_info from now on"""
+    paths = []
+    read_format_file = compile_info.read_format_file
+
+    def counted(current_format, file_path, value_logger):
+        paths.append(file_path)
+        read_format_file(current_format, file_path, value_logger)
+
+    monkeypatch.setattr(compile_info, "read_format_file", counted)
+    return paths
+
+
+def log_path():
+    return os.path.join("results", "BWMFile")
+
+
+def test_identical_contents_are_grouped(tmp_path):
+    first = write_file(tmp_path / "a", make_bwm(1))
+    second = write_file(tmp_path / "b", make_bwm(1))
+    write_file(tmp_path / "c", make_bwm(2))
+    unique, copies = find_duplicates(
+        sorted(discover(str(tmp_path / "*")), key=lambda file: file.path)
+    )
+    assert [file.path for file in unique] == [first, str(tmp_path / "c")]
+    assert copies == {first: [second]}
+
+
+@pytest.mark.parametrize("mode", ["plain", "store", "watch"])
+def test_copies_are_parsed_once(mode, bwm_format, corpus, copies, parsed):
+    investigate(bwm_format)
+    expected = logged_counts(log_path())
+    parsed.clear()
+
+    bwm_format["dedup"] = True
+    if mode == "plain":
+        investigate(bwm_format)
+    elif mode == "store":
+        store = ResultStore("results.db")
+        investigate_incrementally(bwm_format, store)
+        store.close()
+        # A resumed run still lists the copies
+        os.remove(os.path.join(log_path(), "readFiles.txt"))
+        store = ResultStore("results.db")
+        investigate_incrementally(bwm_format, store)
+        store.close()
+    else:
+        watcher = FormatWatcher(bwm_format)
+        watcher.refresh()
+        watcher.value_logger.write_log()
+        duplicates = watcher.value_logger.duplicates
+        assert len(duplicates) == 3
+        assert set(duplicates) | set(duplicates.values()) == set(
+            copies + [corpus["a/m1.bwm"], corpus["b/bad.bwm"]]
+        )
+        assert copies[2] in watcher.value_logger.error
+
+    # One file of each group of identical files is parsed
+    assert len(parsed) == 7
+    assert len(set(parsed) & {corpus["a/m1.bwm"], *copies[:2]}) == 1
+    assert len(set(parsed) & {corpus["b/bad.bwm"], copies[2]}) == 1
+    assert logged_counts(log_path()) == expected
+    with open(os.path.join(log_path(), "readFiles.txt")) as read_files:
+        assert read_files.read().count("duplicate of") == 3
+
+
+def test_watched_copies_are_removed_alone(bwm_format, corpus, copies):
+    bwm_format["dedup"] = True
+    watcher = FormatWatcher(bwm_format)
+    watcher.refresh()
+    # Whichever was parsed, removing one of the files keeps the others
+    os.remove(copies[0])
+    assert watcher.refresh()
+    watcher.value_logger.write_log()
+    read_files = watcher.value_logger.read_files
+    assert corpus["a/m1.bwm"] in read_files and copies[1] in read_files
+    assert copies[0] not in read_files
+
+    deduplicated = logged_counts(log_path())
+    del bwm_format["dedup"]
+    investigate(bwm_format)
+    assert logged_counts(log_path()) == deduplicated
@@ -0,0 +1,79 @@
+# coding=utf-8
+import math
+import os
+from types import SimpleNamespace
+
+import pandas
+import pytest
+
+from conftest import make_bwm, write_file
+from field_miner import CorrelationMiner, mine, mine_files
+from value_range_logger import NAN
+
+FIELDS = [
+    "self.modelHeader.vertexCount",
+    "self.modelHeader.indexCount",
+    "self.modelHeader.materialDefinitionCount",
+]
+
+
+def test_malformed_files_are_listed(corpus):
+    cut = write_file(
+        os.path.join(os.path.dirname(corpus["b/bad.bwm"]), "cut.bwm"),
+        make_bwm(2)[:0x300]
+    )
+    paths = [path for name, path in corpus.items() if name.endswith("bwm")]
+    miner, errors = mine_files("BWMFile", FIELDS, paths + [cut])
+    assert sorted(errors) == sorted([corpus["b/bad.bwm"], cut])
+    assert miner.files == 6
+
+
+def test_chunks_merge_into_the_whole(corpus):
+    paths = sorted(
+        path for name, path in corpus.items() if name.endswith("bwm")
+    )
+    whole, _ = mine_files("BWMFile", FIELDS, paths)
+    merged, _ = mine_files("BWMFile", FIELDS, paths[:3])
+    merged.merge(mine_files("BWMFile", FIELDS, paths[3:])[0])
+    assert merged.files == whole.files
+    assert merged.pairs == whole.pairs
+    assert merged.co_occurrences == whole.co_occurrences
+    assert merged.boundaries == whole.boundaries
+
+
+def test_linear_counts_correlate(in_tmp, corpus):
+    miner = mine({
+        "files": os.path.join(in_tmp, "corpus", "**", "*.bwm"),
+        "data_type": "BWMFile",
+        "correlate": FIELDS,
+    }, processes=2, chunk_size=2)
+    miner.write_log(str(in_tmp / "results"))
+
+    rows = pandas.read_csv(in_tmp / "results" / "correlations.csv")
+    pearson = rows.set_index(["FieldA", "FieldB"])["Pearson"]
+    assert pearson[(FIELDS[0], FIELDS[1])] == pytest.approx(1.0)
+    boundaries = pandas.read_csv(in_tmp / "results" / "boundaries.csv")
+    assert boundaries.set_index("Field").loc[FIELDS[0], "countRate"] == 1
+
+
+def test_non_finite_values_are_only_counted_as_pairs():
+    nan, inf = float("nan"), float("inf")
+    rows = zip([1.0, 2.0, nan, 3.0, inf, nan], [2.0, 4.0, 1.0, 6.0, 1, 1])
+    model = SimpleNamespace(
+        rows=[SimpleNamespace(a=a, b=b) for a, b in rows],
+        sections=lambda: [],
+    )
+    fields = ["self.rows.a", "self.rows.b"]
+    miner = CorrelationMiner(fields)
+    miner.add_file(model, 0)
+    sums = miner.pairs[tuple(fields)]
+    assert sums[0] == 3
+    assert all(math.isfinite(total) for total in sums)
+    co_occurrence = miner.co_occurrences[tuple(fields)]
+    assert co_occurrence[(NAN, 1.0)] == 2
+    assert co_occurrence[(inf, 1.0)] == 1
+
+    merged = CorrelationMiner(fields)
+    merged.merge(miner)
+    merged.merge(miner)
+    assert merged.co_occurrences[tuple(fields)][(NAN, 1.0)] == 4
@@ -0,0 +1,136 @@
+# coding=utf-8
+from collections import OrderedDict
+from glob import glob
+import os
+import zipfile
+
+import pytest
+
+import file_discovery
+from conftest import write_file
+from file_discovery import (
+    discover, open_asset, pattern_root, split_pattern, stat_asset
+)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in (
+        "a/one.bwm", "a/two.AL", "a/b/three.bwm", "a/b/c/four.bwm",
+        "a/.hidden/five.bwm", "a/.six.bwm", "d/seven.bwm", "d/notes.txt",
+    ):
+        write_file(tmp_path / name, b"x" * len(name))
+    return tmp_path
+
+
+def paths(pattern, **kwargs):
+    return sorted(file.path for file in discover(pattern, **kwargs))
+
+
+def test_patterns_match_like_glob(tree):
+    for pattern in ("*/*.bwm", "**/*.bwm", "a/**/*.bwm", "a/*/*", "d/*"):
+        full = os.path.join(str(tree), pattern)
+        assert paths(full) == sorted(
+            path for path in glob(full, recursive=True)
+            if os.path.isfile(path)
+        )
+
+
+def test_relative_patterns_match_like_glob(tree, monkeypatch):
+    monkeypatch.chdir(tree)
+    for pattern in ("*/*.bwm", "**/*.bwm", "a/*.bwm", "**", "d/*"):
+        assert paths(pattern) == sorted(
+            path for path in glob(pattern, recursive=True)
+            if os.path.isfile(path)
+        )
+    assert paths("./a/*.bwm") == paths("a/*.bwm") == ["a/one.bwm"]
+    monkeypatch.chdir(tree / "a")
+    assert paths("*.bwm") == paths("./**/one.bwm") == ["one.bwm"]
+
+
+def test_either_separator_is_accepted(tree):
+    windows = str(tree).replace("/", "\\") + "\\a\\**\\*.bwm"
+    assert paths(windows) == paths(os.path.join(str(tree), "a/**/*.bwm"))
+    assert split_pattern("a\\b/./c") == ["a", "b", "c"]
+
+
+def test_trailing_double_star_matches_every_file(tree):
+    assert len(paths(os.path.join(str(tree), "a", "**"))) == 4
+
+
+def test_extensions_and_sizes(tree):
+    found = list(discover(
+        os.path.join(str(tree), "**", "*"), extensions=[".al", ".txt"]
+    ))
+    assert sorted(os.path.basename(file.path) for file in found) == [
+        "notes.txt", "two.AL"
+    ]
+    assert all(file.size == os.path.getsize(file.path) for file in found)
+
+
+def test_pattern_root_stops_at_wildcards():
+    assert pattern_root("/data/art/*/x.bwm") == os.sep + os.path.join(
+        "data", "art"
+    )
+    assert pattern_root("data/pack.zip/art/*.bwm") == "data"
+    assert pattern_root("*.bwm") == os.curdir
+
+
+def test_missing_directories_yield_nothing(tmp_path):
+    assert paths(os.path.join(str(tmp_path), "missing", "**", "*")) == []
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_patterns_go_through_archives(tmp_path):
+    archive = write_zip(tmp_path / "pack.zip", {
+        "art/one.bwm": b"one", "art/sub/two.bwm": b"two", "notes.txt": b"",
+    })
+    found = paths(os.path.join(str(tmp_path), "pack.zip", "**", "*.bwm"))
+    assert found == [
+        os.path.join(archive, "art", "one.bwm"),
+        os.path.join(archive, "art", "sub", "two.bwm"),
+    ]
+    with open_asset(found[1]) as reader:
+        assert reader.read() == b"two"
+        assert reader.name == found[1]
+    assert stat_asset(found[0]).size == 3
+    with pytest.raises(FileNotFoundError):
+        open_asset(os.path.join(archive, "art", "missing.bwm"))
+
+
+def test_rewritten_archive_is_opened_again(tmp_path):
+    archive = write_zip(tmp_path / "pack.zip", {"a.bwm": b"old"})
+    with open_asset(os.path.join(archive, "a.bwm")) as reader:
+        assert reader.read() == b"old"
+    handle = file_discovery._archives[archive][1]
+
+    os.remove(archive)
+    write_zip(archive, {"b.bwm": b"new", "a.bwm": b"newer"})
+    with open_asset(os.path.join(archive, "b.bwm")) as reader:
+        assert reader.read() == b"new"
+    with open_asset(os.path.join(archive, "a.bwm")) as reader:
+        assert reader.read() == b"newer"
+    assert handle.fp is None
+
+
+def test_open_archives_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_discovery, "MAX_OPEN_ARCHIVES", 2)
+    monkeypatch.setattr(file_discovery, "_archives", OrderedDict())
+    archives = [
+        write_zip(tmp_path / f"pack{i}.zip", {"m.bwm": bytes([i])})
+        for i in range(3)
+    ]
+    handles = []
+    for i, archive in enumerate(archives):
+        with open_asset(os.path.join(archive, "m.bwm")) as reader:
+            assert reader.read() == bytes([i])
+        handles.append(file_discovery._archives[archive][1])
+    assert list(file_discovery._archives) == archives[1:]
+    assert handles[0].fp is None
+    assert all(handle.fp is not None for handle in handles[1:])
@@ -0,0 +1,77 @@
+# coding=utf-8
+import os
+import sys
+
+import pandas
+import pytest
+
+import memory_profile
+from memory_profile import (
+    MEGABYTE, MemoryLimitError, MemoryProfiler, traced_limit
+)
+from value_range_logger import ValueRangeLogger
+
+
+class Hungry:
+    """Structure taking 256 MB, one 64 KB record at a time"""
+
+    def __init__(self, reader) -> None:
+        self.chunks = [self.read_chunk() for _ in range(4096)]
+
+    def read_chunk(self) -> bytearray:
+        return bytearray(0x10000)
+
+
+def memory_rows():
+    return pandas.read_csv(os.path.join("results", "BWMFile", "memory.csv"))
+
+
+def test_profile_writes_a_row_per_file(bwm_format):
+    profiler = MemoryProfiler(bwm_format)
+    profiler.run()
+    rows = memory_rows()
+    assert len(rows) == 7
+    assert list(rows["Peak"]) == sorted(rows["Peak"], reverse=True)
+    errors = rows[rows["Error"].notna()]
+    assert [os.path.basename(path) for path in errors["Path"]] == ["bad.bwm"]
+    assert len(profiler.value_logger.read_files) == 6
+    assert "largest peaks" in profiler.summary()
+
+
+def test_limit_stops_a_file_while_it_is_parsed(bwm_format, monkeypatch):
+    monkeypatch.setitem(memory_profile.__dict__, "Hungry", Hungry)
+    bwm_format["data_type"] = "Hungry"
+    bwm_format["var_to_check"] = []
+    profiler = MemoryProfiler(bwm_format, limit=4 * MEGABYTE)
+    with pytest.raises(MemoryLimitError):
+        profiler.run()
+    assert sys.getprofile() is None
+
+    row = profiler.rows[0]
+    assert row["Error"].startswith("MemoryLimitError")
+    # Stopped long before the 256 MB the file would take
+    assert 4 * MEGABYTE < row["Peak"] < 64 * MEGABYTE
+    assert len(profiler.rows) == 1
+
+
+def test_without_limit_nothing_is_checked():
+    with traced_limit(0, 0):
+        assert sys.getprofile() is None
+    with traced_limit(MEGABYTE, 0):
+        assert sys.getprofile() is not None
+    assert sys.getprofile() is None
+
+
+def test_counts_past_the_limit_are_spilled(bwm_format, monkeypatch):
+    monkeypatch.setattr(
+        memory_profile, "logged_var_size", lambda values: 65 * MEGABYTE
+    )
+    profiler = MemoryProfiler(bwm_format, 64 * MEGABYTE, on_limit="spill")
+    profiler.run()
+    partials = [ValueRangeLogger.load(path) for path in profiler.spills]
+    assert len(partials) == 8
+    assert sum(len(partial.read_files) for partial in partials) == 6
+    assert sum(len(partial.error) for partial in partials) == 1
+
+    with pytest.raises(MemoryLimitError):
+        MemoryProfiler(bwm_format, 64 * MEGABYTE).run()
@@ -0,0 +1,84 @@
+# coding=utf-8
+from io import BytesIO
+import os
+import resource
+import time
+
+import pytest
+
+import compile_info
+from compile_info import new_logger, parse_file, read_format_file
+from conftest import make_bwm, write_file
+from file_definitions import *
+from file_definitions.file_definition_utilities import CheckedReader
+from scheduler import time_budget
+
+
+def test_checked_reader_stays_inside_the_file():
+    reader = CheckedReader(BytesIO(bytes(range(16))))
+    assert reader.read(4) == bytes(range(4))
+    assert reader.seek(-2, os.SEEK_END) == 14
+    with pytest.raises(ValueError):
+        reader.read(3)
+    with pytest.raises(ValueError):
+        reader.seek(17)
+    with pytest.raises(ValueError):
+        reader.seek(-15, os.SEEK_CUR)
+    assert reader.read() == bytes([14, 15])
+
+
+def test_hardened_parse_matches_a_plain_parse(corpus):
+    plain = parse_file(BWMFile, corpus["a/m3.bwm"])
+    hardened = parse_file(BWMFile, corpus["a/m3.bwm"], hardened=True)
+    assert hardened.to_bytes() == plain.to_bytes()
+
+
+def test_time_budget_interrupts_the_block():
+    with pytest.raises(TimeoutError):
+        with time_budget(0.05):
+            while True:
+                time.sleep(0.01)
+    with time_budget(0.05):
+        pass
+    time.sleep(0.1)
+
+
+class Greedy:
+    """Structure needing far more memory than its file"""
+
+    def __init__(self, reader) -> None:
+        self.buffer = bytearray(512 * 1024 * 1024)
+
+
+def test_memory_limit_applies_without_workers(corpus, monkeypatch):
+    monkeypatch.setitem(compile_info.__dict__, "Greedy", Greedy)
+    current_format = {
+        "data_type": "Greedy", "var_to_check": [], "memory_limit": 64
+    }
+    path = corpus["a/m1.bwm"]
+    soft = resource.getrlimit(resource.RLIMIT_AS)[0]
+    value_logger = new_logger(current_format)
+    read_format_file(current_format, path, value_logger)
+    assert value_logger.error == [path]
+    assert value_logger.error_reasons[path].startswith("MemoryError")
+    assert resource.getrlimit(resource.RLIMIT_AS)[0] == soft
+
+    del current_format["memory_limit"]
+    read_format_file(current_format, path, value_logger)
+    assert value_logger.read_files == [path]
+
+
+@pytest.mark.parametrize("memory_limit", [16, 64])
+def test_files_parse_under_a_budget_smaller_than_the_interpreter(
+    tmp_path, memory_limit
+):
+    path = write_file(tmp_path / "m.bwm", make_bwm(1, vertex_count=3000))
+    current_format = {
+        "data_type": "BWMFile",
+        "var_to_check": ["self.vertices.position"],
+        "memory_limit": memory_limit,
+    }
+    value_logger = new_logger(current_format)
+    read_format_file(current_format, path, value_logger)
+    assert value_logger.error_reasons == {}
+    assert value_logger.read_files == [path]
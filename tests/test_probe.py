@@ -0,0 +1,43 @@
+# coding=utf-8
+from io import BytesIO
+import os
+
+import pandas
+
+from compile_info import triage
+from conftest import make_al, make_bwm
+from file_definitions import *
+
+
+def test_valid_model_counts():
+    probe = BWMFile.probe(BytesIO(make_bwm(1, vertex_count=12)))
+    assert probe.valid, probe.reason
+    assert probe.counts["vertexCount"] == 12
+    assert probe.counts["meshDescriptionCount"] == 2
+
+
+def test_invalid_models_give_a_reason():
+    original = make_bwm(1)
+    for data in (b"tiny", b"x" * 0x100, original[:-2], original + b"\0"):
+        probe = BWMFile.probe(BytesIO(data))
+        assert not probe.valid
+        assert probe.reason
+
+
+def test_animation_bank_probe():
+    probe = AlFile.probe(BytesIO(make_al(2, animation_count=5)))
+    assert probe.valid, probe.reason
+    assert probe.counts == {"animationCount": 5, "boneCount": 4}
+    assert not AlFile.probe(BytesIO(make_al(2)[:0x80])).valid
+
+
+def test_triage_writes_a_row_per_file(in_tmp, corpus):
+    triage({
+        "data_type": "BWMFile",
+        "files": os.path.join(in_tmp, "corpus", "**", "*.bwm"),
+        "var_to_check": [],
+    })
+    rows = pandas.read_csv(in_tmp / "results" / "BWMFile" / "triage.csv")
+    assert len(rows) == 7
+    invalid = rows[~rows["Valid"]]
+    assert list(invalid["Path"]) == [corpus["b/bad.bwm"]]
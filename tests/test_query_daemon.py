@@ -0,0 +1,155 @@
+# coding=utf-8
+import json
+import os
+import socket
+import socketserver
+import threading
+from http.client import HTTPConnection
+from http.server import HTTPServer
+
+import pytest
+
+from conftest import make_bwm, write_file
+from query_daemon import (
+    HTTPQueryHandler, SocketQueryHandler, StructureCache, answer,
+    handle_request
+)
+
+
+@pytest.fixture
+def query(corpus):
+    root = os.path.dirname(os.path.dirname(corpus["b/bad.bwm"]))
+    return {
+        "files": os.path.join(root, "**", "*.bwm"),
+        "data_type": "BWMFile",
+        "var_to_check": ["self.modelHeader.vertexCount"],
+    }
+
+
+def counts(result):
+    return {
+        var_name: dict(values) for var_name, values in result["counts"].items()
+    }
+
+
+def test_answer_counts_the_files(query):
+    result = answer(StructureCache(), query)
+    assert counts(result) == {"self.modelHeader.vertexCount": {
+        repr(4 + i * 10): 1 for i in range(6)
+    }}
+    assert result["read_files"] == 6
+    assert [os.path.basename(path) for path in result["errors"]] == [
+        "bad.bwm"
+    ]
+
+
+def test_files_are_parsed_again_once_changed(query, corpus):
+    cache = StructureCache()
+    answer(cache, query)
+    assert cache.stats()["misses"] == 7
+    answer(cache, query)
+    assert cache.stats()["hits"] == 7
+
+    write_file(corpus["a/m1.bwm"], make_bwm(1, vertex_count=99))
+    result = answer(cache, query)
+    assert cache.stats()["misses"] == 8
+    assert counts(result)["self.modelHeader.vertexCount"]["99"] == 1
+
+
+def test_parse_options_are_cached_apart(query):
+    cache = StructureCache()
+    answer(cache, query)
+    answer(cache, dict(query, hardened=True))
+    answer(cache, dict(query, max_records=2))
+    assert cache.stats()["entries"] == 21
+    assert cache.stats()["hits"] == 0
+
+
+def test_least_recently_used_are_dropped(query):
+    cache = StructureCache(max_entries=3)
+    answer(cache, query)
+    assert cache.stats()["entries"] == 3
+
+
+@pytest.mark.parametrize("request_body, error", [
+    (b"{not json", "JSONDecodeError"),
+    (b'{"files": "\xff"}', "UnicodeDecodeError"),
+    (b"[1, 2]", "TypeError"),
+    (b"\"stats\"", "TypeError"),
+    (b"{}", "KeyError"),
+    (b'{"files": "*", "data_type": "Missing", "var_to_check": []}',
+     "ValueError"),
+    (b'{"files": "*", "data_type": "OrderedDict", "var_to_check": []}',
+     "ValueError"),
+    (b'{"files": "*", "data_type": "StructureCache", "var_to_check": []}',
+     "ValueError"),
+    (b'{"files": "*", "data_type": "Vertex", "var_to_check": []}',
+     "ValueError"),
+    (b'{"files": "*", "data_type": ["BWMFile"], "var_to_check": []}',
+     "TypeError"),
+    (b'{"files": 5, "data_type": "BWMFile", "var_to_check": []}',
+     "TypeError"),
+])
+def test_bad_requests_are_answered_with_an_error(request_body, error):
+    result = handle_request(StructureCache(), request_body)
+    assert result["error"].startswith(f"{error}: ")
+
+
+def test_unknown_variable_is_an_error(query):
+    query["var_to_check"] = ["self.modelHeader.missing"]
+    result = handle_request(StructureCache(), json.dumps(query).encode())
+    assert result["error"].startswith("AttributeError: ")
+
+
+@pytest.fixture
+def http_server():
+    server = HTTPServer(("127.0.0.1", 0), HTTPQueryHandler)
+    server.cache = StructureCache()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield HTTPConnection(*server.server_address)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def post(connection, body: bytes):
+    connection.request("POST", "/", body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_http_errors_are_bad_requests(http_server, query):
+    status, result = post(http_server, b"[]")
+    assert status == 400
+    assert "error" in result
+
+    status, result = post(http_server, json.dumps(query).encode())
+    assert status == 200
+    assert result["read_files"] == 6
+
+    http_server.request("GET", "/stats")
+    response = http_server.getresponse()
+    assert response.status == 200
+    assert json.loads(response.read())["misses"] == 7
+
+
+def test_socket_answers_each_line(tmp_path, query):
+    socket_path = str(tmp_path / "daemon.sock")
+    server = socketserver.UnixStreamServer(socket_path, SocketQueryHandler)
+    server.cache = StructureCache()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(socket_path)
+            client.sendall(
+                b"not json\n\n" + json.dumps(query).encode() + b"\n"
+            )
+            with client.makefile("rb") as reader:
+                assert "error" in json.loads(reader.readline())
+                assert json.loads(reader.readline())["read_files"] == 6
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
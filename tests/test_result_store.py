@@ -0,0 +1,121 @@
+# coding=utf-8
+import os
+import sqlite3
+
+import pytest
+
+import compile_info
+from compile_info import investigate, investigate_incrementally
+from conftest import logged_counts, make_bwm, write_file
+from result_store import ResultStore, decode_key, encode_key
+from value_range_logger import ValueRangeLogger
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def file_logger(path: str, values) -> ValueRangeLogger:
+    value_logger = ValueRangeLogger(["self.x"])
+    value_logger.logged_var["self.x"] = dict(values)
+    value_logger.file_read(path)
+    return value_logger
+
+
+def test_keys_are_stored_as_their_repr():
+    for value in (1, 2.5, "name", (1, 2.0), None):
+        assert decode_key(encode_key(value)) == value
+    assert decode_key(encode_key(float("nan"))) == "nan"
+
+
+def test_files_replace_their_previous_counts(store):
+    settings = ResultStore.settings({"var_to_check": ["self.x"]})
+    store.replace_file("T", "a", 1, 1.0, settings, file_logger("a", {1: 2}))
+    store.replace_file(
+        "T", "b", 1, 1.0, settings, file_logger("b", {1.0: 1, 2: 5})
+    )
+    assert store.aggregate("T", "self.x") == {1: 3, 2: 5}
+
+    store.replace_file("T", "b", 2, 2.0, settings, file_logger("b", {3: 1}))
+    assert store.aggregate("T", "self.x") == {1: 2, 3: 1}
+    assert store.is_current("T", "b", 2, 2.0, settings)
+    assert not store.is_current("T", "b", 1, 1.0, settings)
+    assert not store.is_current("T", "b", 2, 2.0, "other settings")
+
+    store.remove_missing("T", ["a"])
+    value_logger = store.to_logger("T", ["self.x"])
+    assert value_logger.logged_var == {"self.x": {1: 2}}
+    assert value_logger.read_files == ["a"]
+
+
+def test_only_changed_files_are_parsed_again(bwm_format, corpus, monkeypatch):
+    investigate(bwm_format)
+    expected = logged_counts(os.path.join("results", "BWMFile"))
+
+    parsed = []
+    read_format_file = compile_info.read_format_file
+
+    def counted(current_format, file_path, value_logger):
+        parsed.append(file_path)
+        read_format_file(current_format, file_path, value_logger)
+
+    monkeypatch.setattr(compile_info, "read_format_file", counted)
+    store = ResultStore("results.db")
+    investigate_incrementally(bwm_format, store)
+    assert len(parsed) == 7
+    assert logged_counts(os.path.join("results", "BWMFile")) == expected
+
+    parsed.clear()
+    write_file(corpus["a/m1.bwm"], make_bwm(20, vertex_count=99))
+    os.remove(corpus["b/m0.bwm"])
+    investigate_incrementally(bwm_format, store)
+    assert parsed == [corpus["a/m1.bwm"]]
+    counts = logged_counts(os.path.join("results", "BWMFile"))
+    vertex_counts = counts["self.modelHeader.vertexCount.csv"]
+    assert vertex_counts["99"] == 1 and "4" not in vertex_counts
+    store.close()
+
+
+def test_reasons_of_unread_files_are_kept(store):
+    settings = ResultStore.settings({"var_to_check": ["self.x"]})
+    value_logger = ValueRangeLogger(["self.x"])
+    value_logger.file_not_read("a", "ValueError: bad header")
+    store.replace_file("T", "a", 1, 1.0, settings, value_logger)
+    store.replace_file("T", "b", 1, 1.0, settings, file_logger("b", {}))
+
+    value_logger = store.to_logger("T", ["self.x"])
+    assert value_logger.error == ["a"]
+    assert value_logger.error_reasons == {"a": "ValueError: bad header"}
+    assert value_logger.read_files == ["b"]
+
+
+def test_settings_changing_the_counts_parse_every_file_again():
+    current_format = {"var_to_check": ["self.b", "self.a"]}
+    settings = ResultStore.settings(current_format)
+    assert settings == ResultStore.settings(
+        {"var_to_check": ["self.a", "self.b"], "timeout": 5}
+    )
+    for key in ("exact_bits", "hardened", "dedup"):
+        assert settings != ResultStore.settings(
+            {**current_format, key: True}
+        )
+
+
+def test_stores_without_reasons_are_upgraded(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE files (data_type TEXT, path TEXT, size INTEGER,"
+        " mtime REAL, settings TEXT, read INTEGER,"
+        " PRIMARY KEY (data_type, path))"
+    )
+    connection.execute("INSERT INTO files VALUES ('T', 'a', 1, 1, '', 0)")
+    connection.commit()
+    connection.close()
+
+    store = ResultStore(path)
+    assert store.to_logger("T", []).error == ["a"]
+    store.close()
@@ -0,0 +1,67 @@
+# coding=utf-8
+from io import BytesIO
+
+from conftest import make_bwm, write_file
+from file_definitions.file_definition_bwm import (
+    BWMFile, round_trip_difference
+)
+import round_trip
+from round_trip import verify_corpus, verify_file
+
+
+def test_identical_model_has_no_difference():
+    assert round_trip_difference(make_bwm(5)) is None
+
+
+def test_difference_is_located_in_its_section():
+    original = bytearray(make_bwm(5))
+    model = BWMFile(BytesIO(bytes(original)))
+    vertices = next(
+        section for section in model.sections() if section.name == "vertices"
+    )
+    # A size field that doesn't match the content is fixed when written
+    original[0x28] += 1
+    offset, section = round_trip_difference(bytes(original))
+    assert offset == 0x28
+    assert section == "fileHeader"
+    assert model.section_at(vertices.offset).name == "vertices"
+    assert model.section_at(len(original)) is None
+
+
+def test_truncated_file_is_reported(tmp_path):
+    path = write_file(tmp_path / "cut.bwm", make_bwm(6)[:0x300])
+    result = verify_file(path)
+    assert not result.identical
+    assert result.error
+
+
+def test_corpus_keeps_going_past_malformed_files(tmp_path):
+    paths = [
+        write_file(tmp_path / "good.bwm", make_bwm(1)),
+        write_file(tmp_path / "cut.bwm", make_bwm(2)[:100]),
+        write_file(tmp_path / "empty.bwm", b""),
+        write_file(tmp_path / "other.bwm", make_bwm(3, version=5)),
+    ]
+    results = list(verify_corpus(paths, processes=2))
+    assert [result.path for result in results] == paths
+    assert [result.identical for result in results] == [
+        True, False, False, True
+    ]
+    assert results[1].error and results[2].error
+
+
+def test_writer_errors_are_reported_per_file(tmp_path, monkeypatch):
+    def broken(original):
+        raise TypeError("'int' object is not subscriptable")
+
+    monkeypatch.setattr(round_trip, "round_trip_difference", broken)
+    paths = [
+        write_file(tmp_path / "one.bwm", make_bwm(1)),
+        write_file(tmp_path / "two.bwm", make_bwm(2)),
+    ]
+    results = list(verify_corpus(paths, processes=1))
+    assert [result.identical for result in results] == [False, False]
+    assert results[0].error == "TypeError: 'int' object is not subscriptable"
+
+    result = verify_file(str(tmp_path / "missing.bwm"))
+    assert result.error.startswith("FileNotFoundError")
@@ -0,0 +1,131 @@
+# coding=utf-8
+import os
+from io import BytesIO
+
+import pandas
+
+from compile_info import investigate, parse_file, sample_files
+from conftest import make_al, make_bwm, write_file
+from file_definitions.file_definition_al import AlFile
+from file_definitions.file_definition_bwm import BWMFile
+from file_discovery import DiscoveredFile
+from value_range_logger import ValueRangeLogger
+
+
+def files_in(*directories, count=20):
+    return [
+        DiscoveredFile(os.path.join(directory, f"f{i}"), 1, 0.0)
+        for directory in directories
+        for i in range(count)
+    ]
+
+
+def test_sample_keeps_a_share_of_each_directory():
+    files = files_in("a", "b", count=100)
+    sample = sample_files(files, 0.2, seed=3)
+    for directory in ("a", "b"):
+        kept = [file for file in sample if file.path.startswith(directory)]
+        assert 10 <= len(kept) <= 30
+
+
+def test_sample_is_refined_by_a_larger_fraction():
+    files = files_in("a", "b")
+    small = sample_files(list(files), 0.25, seed=7)
+    again = sample_files(list(reversed(files)), 0.25, seed=7)
+    large = sample_files(list(files), 0.5, seed=7)
+    assert sorted(small) == sorted(again)
+    assert set(small) <= set(large)
+    assert set(small) != set(sample_files(list(files), 0.25, seed=8))
+
+
+def test_max_records_decodes_a_random_sample(tmp_path):
+    path = write_file(tmp_path / "m.bwm", make_bwm(1, vertex_count=200))
+    model = BWMFile(BytesIO(make_bwm(1, vertex_count=200)))
+    sampled = parse_file(BWMFile, path, max_records=10, seed=2)
+
+    assert len(sampled.vertices) == 10
+    assert len(sampled.data[0]) == 10
+    assert len(sampled.indexes) == 6
+    assert sampled.sampledRecords == {
+        "vertices": (10, 200), "data": (10, 200), "indexes": (6, 6),
+    }
+    positions = [vertex.position for vertex in model.vertices]
+    rows = [positions.index(vertex.position) for vertex in sampled.vertices]
+    assert rows != list(range(10))
+    assert sampled.data[0] == [model.data[0][row] for row in rows]
+    assert sampled.indexes == model.indexes
+
+    again = parse_file(BWMFile, path, max_records=10, seed=2)
+    other = parse_file(BWMFile, path, max_records=10, seed=3)
+    assert [v.position for v in again.vertices] == \
+        [v.position for v in sampled.vertices]
+    assert [v.position for v in other.vertices] != \
+        [v.position for v in sampled.vertices]
+
+
+def test_max_records_samples_animations(tmp_path):
+    path = write_file(tmp_path / "x.al", make_al(1, animation_count=6))
+    bank = AlFile(BytesIO(make_al(1, animation_count=6)))
+    sampled = parse_file(AlFile, path, max_records=2)
+
+    assert sampled.sampledRecords == {"animationDataArray": (2, 6)}
+    keyframes = [data.keyFrames for data in bank.animationDataArray]
+    assert all(
+        data.keyFrames in keyframes for data in sampled.animationDataArray
+    )
+
+
+def test_sampled_values_stand_for_every_record(tmp_path):
+    path = write_file(tmp_path / "m.bwm", make_bwm(1, vertex_count=200))
+    value_logger = ValueRangeLogger([
+        "self.vertices.position", "self.modelHeader.vertexCount"
+    ])
+    value_logger.update(parse_file(BWMFile, path, max_records=10))
+    value_logger.file_read(path)
+
+    assert sum(value_logger.logged_var["self.vertices.position"].values()) \
+        == 10
+    assert value_logger.sampled_fraction("self.vertices.position") == 0.05
+    assert value_logger.sampled_fraction("self.modelHeader.vertexCount") \
+        == 1.0
+
+
+def test_lengths_of_sampled_lists_count_every_record(tmp_path):
+    path = write_file(tmp_path / "m.bwm", make_bwm(1, vertex_count=200))
+    value_logger = ValueRangeLogger([
+        "self.vertices", "self.data[0]", "self.data", "self.indexes"
+    ])
+    value_logger.update(parse_file(BWMFile, path, max_records=10))
+    value_logger.file_read(path)
+
+    assert value_logger.logged_var == {
+        "self.vertices": {200: 1}, "self.data[0]": {200: 1},
+        "self.data": {2: 1}, "self.indexes": {6: 1},
+    }
+    for var_name in value_logger.logged_var:
+        assert value_logger.sampled_fraction(var_name) == 1.0
+
+    path = write_file(tmp_path / "x.al", make_al(1, animation_count=6))
+    value_logger = ValueRangeLogger(["self.animationDataArray"])
+    value_logger.update(parse_file(AlFile, path, max_records=2))
+    assert value_logger.logged_var["self.animationDataArray"] == {6: 1}
+
+
+def test_estimates_scale_the_sampled_records(bwm_format):
+    bwm_format["var_to_check"] = ["self.vertices.uvs"]
+    bwm_format["max_records"] = 5
+    investigate(bwm_format)
+
+    rows = pandas.read_csv(os.path.join(
+        "results", "BWMFile", "varsDist", "self.vertices.uvs.csv"
+    ))
+    # At most 5 of the 4, 14, 24, 34, 44 and 54 vertices of the models
+    assert rows["Count"].sum() == 4 + 5 * 5
+    assert abs(rows["Estimate"].sum() - 174) < 1e-6
+
+
+def test_without_max_records_every_record_is_decoded(tmp_path):
+    path = write_file(tmp_path / "m.bwm", make_bwm(1, vertex_count=30))
+    model = parse_file(BWMFile, path)
+    assert len(model.vertices) == 30
+    assert not hasattr(model, "sampledRecords")
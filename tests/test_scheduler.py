@@ -0,0 +1,96 @@
+# coding=utf-8
+import os
+import resource
+
+import pytest
+
+from file_discovery import DiscoveredFile
+from scheduler import Scheduler, memory_budget, plan_tasks
+
+
+def files_of_sizes(*sizes):
+    return [DiscoveredFile(f"f{i}", size, 0.0) for i, size in enumerate(sizes)]
+
+
+def task_sizes(tasks):
+    return [sum(file.size for file in task) for task in tasks]
+
+
+def test_large_files_get_their_own_task():
+    files = files_of_sizes(5, 100, 3, 60, 2, 4, 1)
+    tasks = plan_tasks(files, workers=2, batch_bytes=10)
+    assert tasks[0] == [files[1]] and tasks[1] == [files[3]]
+    assert task_sizes(tasks) == sorted(task_sizes(tasks), reverse=True)
+    assert sorted(
+        file.path for task in tasks for file in task
+    ) == sorted(file.path for file in files)
+    assert all(size >= 10 for size in task_sizes(tasks)[:-1])
+
+
+def test_default_batch_is_a_share_of_each_worker():
+    files = files_of_sizes(*[1] * 320)
+    assert len(plan_tasks(files, workers=4)) == 64
+    assert plan_tasks([], workers=4) == []
+
+
+def paths_and_pid(paths):
+    return paths, os.getpid()
+
+
+def test_every_file_is_run_once():
+    files = files_of_sizes(*range(1, 41))
+    scheduler = Scheduler(workers=2)
+    results = list(scheduler.run(paths_and_pid, files))
+    paths = sorted(path for task_paths, _ in results for path in task_paths)
+    assert paths == sorted(file.path for file in files)
+    assert sum(report.files for report in scheduler.reports.values()) == 40
+    assert {pid for _, pid in results} == set(scheduler.reports)
+    assert "workers" in scheduler.utilization()
+
+
+class Unpicklable:
+    def __reduce__(self):
+        raise MemoryError("Result too large to send")
+
+
+def fail_on_large(paths):
+    """Run out of memory counting f30 and sending back f20"""
+    if "f30" in paths:
+        raise MemoryError("Too large")
+    if "f20" in paths:
+        return Unpicklable()
+    return paths
+
+
+def test_memory_errors_become_file_errors():
+    files = files_of_sizes(*range(1, 41))
+    scheduler = Scheduler(workers=2)
+    results = list(scheduler.run(
+        fail_on_large, files,
+        on_error=lambda path, error: ("error", path, str(error))
+    ))
+    errors = sorted(result[1] for result in results if result[0] == "error")
+    assert errors == ["f20", "f30"]
+    paths = sorted(
+        path for result in results if result[0] != "error"
+        for path in result
+    )
+    assert paths == sorted(
+        file.path for file in files if file.path not in errors
+    )
+
+
+def test_memory_errors_are_raised_without_handler():
+    with pytest.raises(MemoryError):
+        list(Scheduler(workers=2).run(
+            fail_on_large, files_of_sizes(*[1] * 31)
+        ))
+
+
+def test_memory_budget_is_restored():
+    soft = resource.getrlimit(resource.RLIMIT_AS)[0]
+    with pytest.raises(MemoryError):
+        with memory_budget(64 * 1024 * 1024):
+            bytearray(128 * 1024 * 1024)
+    assert resource.getrlimit(resource.RLIMIT_AS)[0] == soft
+    bytearray(128 * 1024 * 1024)
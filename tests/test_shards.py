@@ -0,0 +1,87 @@
+# coding=utf-8
+import glob
+import os
+import shutil
+
+import pytest
+
+from compile_info import in_shard, investigate, merge_partials, parse_shard
+from conftest import logged_counts
+from value_range_logger import ValueRangeLogger
+
+
+def partial_path(index, count):
+    return os.path.join(
+        "results", "BWMFile", f"partial_{index}of{count}.pkl.gz"
+    )
+
+
+def run_shards(current_format, count):
+    for index in range(count):
+        investigate(dict(current_format, shard=(index, count)))
+
+
+def test_every_file_is_in_one_shard(corpus):
+    root = os.path.dirname(corpus["a/m1.bwm"])
+    for path in corpus.values():
+        assert sum(in_shard(path, root, (i, 3)) for i in range(3)) == 1
+
+
+def test_shard_argument():
+    assert parse_shard("2/5") == (2, 5)
+    for text in ("5/5", "-1/2", "1", "a/b"):
+        with pytest.raises(Exception):
+            parse_shard(text)
+
+
+def test_merged_shards_match_a_single_run(bwm_format):
+    investigate(bwm_format)
+    expected = logged_counts(os.path.join("results", "BWMFile"))
+    shutil.rmtree("results")
+
+    run_shards(bwm_format, 3)
+    partials = sorted(glob.glob(os.path.join("results", "*", "partial_*")))
+    assert len(partials) == 3
+    assert ValueRangeLogger.load(partial_path(1, 3)).shard == (1, 3)
+    # Matching a partial twice doesn't count it twice
+    merge_partials(["results/*/partial_*.pkl.gz", partial_path(0, 3)])
+    assert logged_counts(os.path.join("results", "BWMFile")) == expected
+
+
+def test_missing_shards_are_rejected(bwm_format):
+    run_shards(bwm_format, 3)
+    os.remove(partial_path(1, 3))
+    with pytest.raises(ValueError, match="miss the shards 1/3"):
+        merge_partials(["results/*/partial_*.pkl.gz"])
+    assert not os.path.exists(os.path.join("results", "BWMFile", "varsDist"))
+
+
+def test_duplicated_shards_are_rejected(bwm_format):
+    run_shards(bwm_format, 2)
+    shutil.copy(partial_path(0, 2), "copy.pkl.gz")
+    with pytest.raises(ValueError, match="both shard 0/2"):
+        merge_partials(["results/*/partial_*.pkl.gz", "copy.pkl.gz"])
+
+
+def test_shards_of_other_runs_are_rejected(bwm_format):
+    run_shards(bwm_format, 2)
+    investigate(dict(bwm_format, shard=(2, 3)))
+    with pytest.raises(ValueError, match="different numbers of shards"):
+        merge_partials(["results/*/partial_*.pkl.gz"])
+
+
+def test_partials_sharing_files_are_rejected(bwm_format, tmp_path):
+    run_shards(bwm_format, 1)
+    partial = ValueRangeLogger.load(partial_path(0, 1))
+    partial.shard = None
+    partial.save(str(tmp_path / "spill0.pkl.gz"))
+    partial.save(str(tmp_path / "spill1.pkl.gz"))
+    with pytest.raises(ValueError, match="was counted by both"):
+        merge_partials([str(tmp_path / "spill*.pkl.gz")])
+
+
+def test_other_settings_are_rejected(bwm_format):
+    investigate(dict(bwm_format, shard=(0, 2)))
+    investigate(dict(bwm_format, shard=(1, 2), exact_bits=True))
+    with pytest.raises(ValueError, match="other settings"):
+        merge_partials(["results/*/partial_*.pkl.gz"])
@@ -0,0 +1,130 @@
+# coding=utf-8
+import os
+import random
+
+import pytest
+
+import spatial_index
+from conftest import make_bwm, write_file
+from file_discovery import discover
+from spatial_index import SpatialIndex, read_bounds
+
+
+def models(corpus):
+    root = os.path.dirname(os.path.dirname(corpus["b/bad.bwm"]))
+    return list(discover(os.path.join(root, "**"), extensions=[".bwm"]))
+
+
+@pytest.fixture
+def index(tmp_path, corpus):
+    index = SpatialIndex(str(tmp_path / "index.db"))
+    index.errors = index.build(models(corpus))
+    yield index
+    index.close()
+
+
+def overlaps(bounds, low, high):
+    return all(
+        bounds.low[axis] <= high[axis] and bounds.high[axis] >= low[axis]
+        for axis in range(3)
+    )
+
+
+def test_every_model_is_indexed_but_the_malformed(index, corpus):
+    assert [os.path.basename(path) for path in index.errors] == ["bad.bwm"]
+    rows = index.connection.execute("SELECT path FROM models").fetchall()
+    assert len(rows) == 6
+    meshes = index.mesh_bounds(corpus["a/m1.bwm"])
+    assert [mesh.name for mesh in meshes] == ["mesh0", "mesh1"]
+    _, expected = read_bounds(corpus["a/m1.bwm"])
+    assert [mesh.low for mesh in meshes] == \
+        [pytest.approx(mesh.low) for mesh in expected]
+
+
+def test_larger_than_sorts_by_measure(index, corpus):
+    bounds = {
+        path: read_bounds(path)[0] for path in corpus.values()
+        if path.endswith(".bwm") and "bad" not in path
+    }
+    extents = {
+        path: max(h - l for l, h in zip(model.low, model.high))
+        for path, model in bounds.items()
+    }
+    middle = sorted(extents.values())[2]
+    assert index.larger_than(middle) == sorted(
+        (path for path, extent in extents.items() if extent > middle),
+        key=extents.get, reverse=True
+    )
+    assert set(index.larger_than(-10, "radius")) == set(bounds)
+    with pytest.raises(ValueError):
+        index.larger_than(1, "volume")
+
+
+@pytest.mark.parametrize("cell_size", [16.0, 1.0, 0.01])
+def test_overlapping_matches_every_box(tmp_path, corpus, cell_size):
+    index = SpatialIndex(str(tmp_path / "grid.db"), cell_size)
+    index.build(models(corpus))
+    bounds = {
+        path: read_bounds(path)[0] for path in corpus.values()
+        if path.endswith(".bwm") and "bad" not in path
+    }
+    generator = random.Random(cell_size)
+    for _ in range(30):
+        corner = [generator.uniform(-8, 8) for _ in range(3)]
+        low = tuple(corner)
+        high = tuple(value + generator.uniform(0, 4) for value in corner)
+        assert index.overlapping(low, high) == sorted(
+            path for path, model in bounds.items()
+            if overlaps(model, low, high)
+        )
+    large = index.connection.execute("SELECT path FROM large").fetchall()
+    if cell_size == 16.0:
+        assert large == []
+    if cell_size == 0.01:
+        assert len(large) == len(bounds)
+    index.close()
+
+
+def test_region_must_be_finite(index):
+    with pytest.raises(ValueError):
+        index.overlapping((0, 0, 0), (float("inf"), 1, 1))
+    assert index.cells_of((0, 0, 0), (float("nan"), 1, 1)) is None
+
+
+def test_unchanged_models_are_not_read_again(index, corpus, monkeypatch):
+    read = []
+    read_model = spatial_index.read_bounds
+
+    def counted(file_path):
+        read.append(file_path)
+        return read_model(file_path)
+
+    monkeypatch.setattr(spatial_index, "read_bounds", counted)
+    files = models(corpus)
+    index.build(files)
+    assert [os.path.basename(path) for path in read] == ["bad.bwm"]
+
+    read.clear()
+    write_file(corpus["a/m1.bwm"], make_bwm(40, vertex_count=9))
+    os.remove(corpus["b/m2.bwm"])
+    index.build(models(corpus))
+    assert sorted(read) == sorted([corpus["a/m1.bwm"], corpus["b/bad.bwm"]])
+    paths = [path for (path,) in index.connection.execute(
+        "SELECT path FROM files"
+    )]
+    assert corpus["b/m2.bwm"] not in paths
+    assert index.mesh_bounds(corpus["b/m2.bwm"]) == []
+
+
+def test_model_broken_after_indexing_is_dropped(index, corpus):
+    write_file(corpus["a/m3.bwm"], make_bwm(3)[:0x60])
+    errors = index.build(models(corpus))
+    assert corpus["a/m3.bwm"] in errors
+    assert corpus["a/m3.bwm"] not in index.larger_than(-1)
+
+
+def test_existing_grid_is_kept(tmp_path):
+    SpatialIndex(str(tmp_path / "grid.db"), 4.0).close()
+    index = SpatialIndex(str(tmp_path / "grid.db"), 32.0)
+    assert index.cell_size == 4.0
+    index.close()
@@ -0,0 +1,42 @@
+# coding=utf-8
+from io import BytesIO
+
+from conftest import make_bwm
+from file_definitions.file_definition_bwm import BWMFile
+from file_definitions.file_definition_utilities import (
+    StringTable, string_table
+)
+
+
+def test_identical_bytes_share_one_string():
+    table = StringTable()
+    first = table.decode(b"diff.dds" + bytes(56))
+    second = table.decode(b"diff.dds" + bytes(56))
+    assert first == "diff.dds"
+    assert first is second
+    assert len(table.strings) == 1
+    table.clear()
+    assert not table.strings
+
+
+def test_names_are_shared_across_models():
+    first = BWMFile(BytesIO(make_bwm(1)))
+    second = BWMFile(BytesIO(make_bwm(2)))
+    assert first.meshDescriptions[0].name == "mesh0"
+    assert first.meshDescriptions[0].name is second.meshDescriptions[0].name
+    assert (
+        first.materialDefinitions[0].diffuseMap
+        is second.materialDefinitions[0].diffuseMap
+    )
+    assert "mesh0" in string_table.strings.values()
+
+
+def test_least_recently_used_strings_are_dropped():
+    table = StringTable(max_strings=2)
+    first = table.decode(b"one\0")
+    table.decode(b"two\0")
+    assert table.decode(b"one\0") is first
+    table.decode(b"three\0")
+    assert list(table.strings.values()) == ["one", "three"]
+    assert table.decode(b"two\0") == "two"
+    assert len(table.strings) == 2
@@ -0,0 +1,70 @@
+# coding=utf-8
+import os
+
+import pytest
+
+from conftest import make_bwm, write_file
+from file_definitions import *
+from structure_index import StructureIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = StructureIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def test_build_reports_malformed_files(index, corpus):
+    cut = write_file(
+        os.path.join(os.path.dirname(corpus["a/m1.bwm"]), "cut.bwm"),
+        make_bwm(9)[:0x400]
+    )
+    errors = index.build(sorted(corpus.values()) + [cut])
+    assert sorted(errors) == sorted([corpus["b/bad.bwm"], cut])
+    assert "vertices" in index.sections(corpus["a/m1.bwm"])
+
+
+def test_records_match_a_full_parse(index, corpus):
+    path = corpus["a/m3.bwm"]
+    with open(path, "rb") as reader:
+        model = BWMFile(reader)
+    index.build([path])
+
+    mesh = index.read(path, "meshDescriptions", 1)
+    assert mesh.name == model.meshDescriptions[1].name
+    assert mesh.box1 == model.meshDescriptions[1].box1
+    assert vars(index.read(path, "vertices", 7)) == vars(model.vertices[7])
+    assert index.read(path, "data[0]", 5) == model.data[0][5]
+    assert index.read(path, "data[1]", 5) == model.data[1][5]
+    assert index.read(path, "indexes", 11) == model.indexes[11]
+    assert index.read(path, "modelCleaves", 1) == model.modelCleaves[1]
+    with pytest.raises(IndexError):
+        index.read(path, "bones", 1)
+
+
+def test_animation_data_is_read_from_its_offset(index, corpus):
+    path = corpus["b/x2.al"]
+    with open(path, "rb") as reader:
+        bank = AlFile(reader)
+    assert index.read(path, "animationDataArray", 3).keyFrames == (
+        bank.animationDataArray[3].keyFrames
+    )
+    with pytest.raises(IndexError):
+        index.read(path, "animationDataArray", len(bank.animationDataArray))
+
+
+def test_rewritten_file_is_indexed_again(index, tmp_path):
+    path = write_file(tmp_path / "model.bwm", make_bwm(1, vertex_count=4))
+    index.build([path])
+    assert index.sections(path)["vertices"].count == 4
+    write_file(tmp_path / "model.bwm", make_bwm(1, vertex_count=9))
+    os.utime(path, (1, 1))
+    assert not index.is_current(path)
+    assert index.sections(path)["vertices"].count == 9
+
+    write_file(tmp_path / "model.bwm", make_bwm(1)[:0x200])
+    assert index.build([path]) == [path]
+    assert not index.connection.execute(
+        "SELECT * FROM sections WHERE path = ?", (path,)
+    ).fetchall()
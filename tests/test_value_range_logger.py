@@ -0,0 +1,124 @@
+# coding=utf-8
+from collections import Counter
+import math
+import struct
+from io import BytesIO
+
+import pandas
+
+from file_definitions.file_definition_utilities import (
+    read_float, read_floats, write_float
+)
+from value_range_logger import (
+    NAN, ValueRangeLogger, canonical_key, count_bulk, count_each,
+    decode_bits, encode_bits, key_bits
+)
+
+
+class Record:
+    def __init__(self, **fields) -> None:
+        self.__dict__.update(fields)
+
+
+def points(values) -> Record:
+    """Record holding a list of records whose x is counted"""
+    return Record(points=[Record(x=value) for value in values])
+
+
+def float_from_bits(bits: int) -> float:
+    return struct.unpack("<f", struct.pack("<I", bits))[0]
+
+
+def test_bits_keys_decode_back():
+    for value in (0, 7, 0xFFFFFFFF, -1, -0x80000000, 1.5, -0.0, (3, -2.25)):
+        assert decode_bits(encode_bits(value)) == value
+    assert encode_bits(1 << 40) == repr(1 << 40)
+    assert encode_bits(1e300) == repr(1e300)
+    assert encode_bits("name") == "name"
+    assert key_bits(encode_bits(-1)) == "0xFFFFFFFF"
+    assert key_bits(encode_bits(1.0)) == "0x3F800000"
+
+
+def test_ints_and_floats_with_the_same_bits_stay_apart():
+    assert encode_bits(0) != encode_bits(0.0)
+    assert encode_bits(-1) != encode_bits(0xFFFFFFFF)
+    assert encode_bits(0.0) != encode_bits(-0.0)
+
+
+def test_every_nan_pattern_is_counted_once(in_tmp):
+    nans = [float_from_bits(0x7FC00000), float_from_bits(0x7FC00001)]
+    value_logger = ValueRangeLogger(["self.points.x"], exact_bits=True)
+    value_logger.update(points(nans + nans + [1.0]))
+    counts = value_logger.logged_var["self.points.x"]
+    assert sorted(counts.values()) == [1, 2, 2]
+
+    value_logger.write_log()
+    rows = pandas.read_csv(
+        in_tmp / "results" / "Record" / "varsDist" / "self.points.x.csv"
+    )
+    assert sorted(rows["Bits"]) == ["0x3F800000", "0x7FC00000", "0x7FC00001"]
+    assert sum(math.isnan(value) for value in rows["Value"]) == 2
+
+
+def test_signaling_nans_keep_their_bits(in_tmp):
+    raw = struct.pack("<3I", 0x7F800001, 0x7FC00001, 0x3F800000)
+    signaling = read_float(BytesIO(raw))
+    assert encode_bits(signaling) == 0x7F800001
+    values = read_floats(BytesIO(raw), 3)
+    assert [key_bits(encode_bits(value)) for value in values] == \
+        ["0x7F800001", "0x7FC00001", "0x3F800000"]
+
+    writer = BytesIO()
+    for value in values:
+        write_float(writer, value)
+    assert writer.getvalue() == raw
+
+    value_logger = ValueRangeLogger(["self.points.x"], exact_bits=True)
+    value_logger.update(points(list(values[:2]) + [signaling]))
+    assert value_logger.logged_var["self.points.x"] == \
+        {0x7F800001: 2, 0x7FC00001: 1}
+
+
+def test_bulk_counts_match_counting_one_by_one():
+    batches = [
+        [3, 1, 3, 2, 3],
+        [0.5, -0.0, 0.0, 0.5],
+        [True, False, True],
+        [(1, 2), (1, 2), (2, 1)],
+        [(1, 2), (1,), 4, "name", None, 4],
+        [1 << 70, 1, 1 << 70],
+        [],
+    ]
+    for values in batches:
+        assert count_bulk(values) == count_each(values) == dict(
+            Counter(values)
+        )
+
+
+def test_numeric_tuples_are_counted_by_value():
+    rows = [(0.0, 1.5), (-0.0, 1.5), (1, 2), (1.0, 2.0), (2, 1)]
+    assert count_bulk(rows) == {(0.0, 1.5): 2, (1, 2): 2, (2, 1): 1}
+    nans = [(float("nan"), 1.0), (float_from_bits(0x7FC00001), 1.0)]
+    assert count_bulk(nans) == {(NAN, 1.0): 2}
+
+
+def test_nans_share_one_key():
+    nans = [float("nan"), float("nan"), float_from_bits(0x7FC00001)]
+    assert count_bulk(nans + [1.0]) == {NAN: 3, 1.0: 1}
+    counts = count_each([(nan, 1) for nan in nans] + [("a", (nans[0],))])
+    assert counts == {(NAN, 1): 3, ("a", (NAN,)): 1}
+    assert canonical_key((1, 2)) == (1, 2)
+
+
+def test_nans_of_every_batch_and_partial_are_merged(tmp_path):
+    value_logger = ValueRangeLogger(["self.points.x"], batch_size=2)
+    for _ in range(3):
+        value_logger.update(points([float("nan"), 2.0, float("nan")]))
+    value_logger.flush()
+    assert value_logger.logged_var["self.points.x"] == {NAN: 6, 2.0: 3}
+
+    value_logger.save(str(tmp_path / "partial.pkl.gz"))
+    total = ValueRangeLogger(["self.points.x"])
+    total.update(points([float("nan")]))
+    total.merge(ValueRangeLogger.load(str(tmp_path / "partial.pkl.gz")))
+    assert total.logged_var["self.points.x"] == {NAN: 7, 2.0: 3}
@@ -0,0 +1,30 @@
+# coding=utf-8
+import os
+
+from compile_info import FormatWatcher, investigate
+from conftest import logged_counts, make_bwm, write_file
+
+
+def test_refresh_follows_changes(bwm_format, corpus):
+    watcher = FormatWatcher(bwm_format)
+    assert watcher.refresh()
+    assert len(watcher.files) == 7
+    assert not watcher.refresh()
+
+    write_file(corpus["a/m1.bwm"], make_bwm(20, vertex_count=99))
+    os.remove(corpus["b/m0.bwm"])
+    write_file(
+        os.path.join(os.path.dirname(corpus["b/m0.bwm"]), "new.bwm"),
+        make_bwm(21, vertex_count=7)
+    )
+    assert watcher.refresh()
+    assert len(watcher.files) == 7
+    assert corpus["b/m0.bwm"] not in watcher.value_logger.read_files
+    assert corpus["b/bad.bwm"] in watcher.value_logger.error
+
+    # The watcher holds the counts a new run would find
+    watcher.value_logger.write_log()
+    watched = logged_counts(os.path.join("results", "BWMFile"))
+    investigate(bwm_format)
+    assert logged_counts(os.path.join("results", "BWMFile")) == watched
+    assert watched["self.modelHeader.vertexCount.csv"]["99"] == 1
@@ -1,20 +1,259 @@
 # coding=utf-8
 """Module containing the value logger and functions nescessary for its work"""
 
+import gzip
+import math
 import os
+import pickle
 import re
+import struct
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
 from os import path
+from types import SimpleNamespace
 
-from typing import Dict, List, Sequence
+from typing import (
+    Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+)
 
+import numpy as np
 from pandas.core.frame import DataFrame
 
+# Kind of an exact bits key, stored above its 32 bits pattern
+FLOAT_BITS = 0
+UNSIGNED_BITS = 1
+SIGNED_BITS = 2
+
+# Key of every NaN counted
+NAN = float("nan")
+
+
+@lru_cache(maxsize=None)
+def parse_var(var_name: str) -> Tuple[Tuple[str, Tuple, bool], ...]:
+    """
+    Split a variable path in its attribute names and indexes, and
+    whether values are counted at this step
+    """
+    var_seq = var_name.split(".")[1:]
+    steps = []
+
+    for seq in var_seq:
+        matches = re.findall(r"\[(-?\d*)(\:?)(-?\d*)\]", seq)
+        end = re.search(r"\[", seq)
+
+        if end:
+            end = end.span()[0]
+
+        indexes = tuple(
+            (int(match[0]), int(match[2])) if match[1] and match[2]
+            else () if match[1]
+            else (int(match[0]),)
+            for match in matches
+        )
+        steps.append((seq[:end], indexes, seq in var_seq[-1]))
+
+    return tuple(steps)
+
+
+def extract_values(file_data_structure, var_name: str) -> Iterator:
+    """Yield every value to count for var_name"""
+    last = [file_data_structure]
+
+    for attribute, indexes, counted in parse_var(var_name):
+        for obj in last:
+            curr = getattr(obj, attribute)
+
+            for index in indexes:
+                if len(index) > 1:
+                    curr = tuple(i for i in curr[index[0]: index[1]])
+                elif len(index) > 0:
+                    curr = curr[index[0]]
+                else:
+                    curr = tuple(i for i in curr)
+
+            new_last = last.copy()
+
+            if isinstance(curr, List):
+                new_last.extend(curr)
+                value = len(curr)
+            else:
+                new_last.extend([curr])
+                value = curr
+
+            last = new_last[1:]
+
+            if counted:
+                yield value
+
+
+def is_record_list(file_data_structure, var_name: str) -> bool:
+    """
+    Whether the first step of a variable selects a list of records of the
+    FileDataStructure without indexing its records, the records of the
+    lists in streamedLists are nested as deep as the value it maps them to
+    """
+    steps = parse_var(var_name)
+    if not steps:
+        return False
+    attribute, indexes, _ = steps[0]
+    depth = getattr(file_data_structure, "streamedLists", {}).get(attribute, 0)
+    return len(indexes) == depth and all(
+        len(index) == 1 for index in indexes
+    )
+
+
+def is_streamed(file_data_structure, var_name: str) -> bool:
+    """
+    Whether a variable goes through a list a streaming FileDataStructure
+    reads in chunks, selected without indexing its records
+    """
+    steps = parse_var(var_name)
+    if not steps or not getattr(file_data_structure, "streaming", False):
+        return False
+    return steps[0][0] in getattr(file_data_structure, "streamedLists", {}) \
+        and is_record_list(file_data_structure, var_name)
+
+
+def extract_streamed_values(file_data_structure, var_name: str) -> Iterator:
+    """
+    extract_values for a variable read in chunks, only one chunk of its
+    records is decoded at a time
+    """
+    steps = parse_var(var_name)
+    attribute = steps[0][0]
+    chunks = (
+        SimpleNamespace(**{attribute: chunk})
+        for chunk in file_data_structure.iter_records(attribute)
+    )
+    if len(steps) > 1:
+        for chunk in chunks:
+            yield from extract_values(chunk, var_name)
+        return
+    # The length of the list is the sum of the lengths of its chunks
+    yield sum(
+        value for chunk in chunks for value in extract_values(chunk, var_name)
+    )
+
+
+def encode_bits(value):
+    """
+    Key of a value in exact bits mode, ints and floats become their kind
+    and 32 bits pattern, tuples are encoded element wise and numbers not
+    fitting in 32 bits are kept as their repr
+    """
+    if isinstance(value, tuple):
+        return tuple(encode_bits(element) for element in value)
+    if isinstance(value, float):
+        if value != value and hasattr(value, "bits"):
+            # A NaN read with its pattern, which may be a signaling one
+            return (FLOAT_BITS << 32) | value.bits
+        try:
+            bits = struct.unpack("<I", struct.pack("<f", value))[0]
+        except OverflowError:
+            return repr(value)
+        return (FLOAT_BITS << 32) | bits
+    if isinstance(value, int):
+        if not -0x80000000 <= value <= 0xFFFFFFFF:
+            return repr(value)
+        if value < 0:
+            return (SIGNED_BITS << 32) | (value & 0xFFFFFFFF)
+        return (UNSIGNED_BITS << 32) | value
+    return value
+
+
+def decode_bits(key):
+    """Value displayed for an exact bits key"""
+    if isinstance(key, tuple):
+        return tuple(decode_bits(element) for element in key)
+    if not isinstance(key, int):
+        return key
+    kind, bits = key >> 32, key & 0xFFFFFFFF
+    if kind == FLOAT_BITS:
+        return struct.unpack("<f", struct.pack("<I", bits))[0]
+    if kind == SIGNED_BITS:
+        return bits - 0x100000000
+    return bits
+
+
+def canonical_key(value):
+    """
+    Value with every NaN replaced by NAN, NaNs are never equal so each
+    would otherwise be counted under a key of its own
+    """
+    if isinstance(value, float):
+        return NAN if math.isnan(value) else value
+    if not isinstance(value, tuple):
+        return value
+    try:
+        # The sum of numbers is only NaN when one of them may be
+        if not math.isnan(sum(value)):
+            return value
+    except (TypeError, OverflowError):
+        pass
+    return tuple(canonical_key(element) for element in value)
+
+
+def count_each(values: Iterable) -> Dict:
+    """Count values by hashing them, NaNs are counted under NAN"""
+    counts = {}
+    for key, count in Counter(values).items():
+        key = canonical_key(key)
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def count_bulk(values: Sequence) -> Dict:
+    """
+    Count a batch of values, numbers are counted by numpy and any other
+    value by count_each
+    """
+    array = None
+    # Tuples, even numeric ones of one length, are left to count_each:
+    # converting them to a 2d array alone takes as long as hashing them
+    # and numpy.unique(axis=0) sorts rows four times slower than that
+    if values and type(values[0]) is not tuple:
+        try:
+            array = np.asarray(values)
+        except (ValueError, OverflowError):
+            pass
+    if array is None or array.dtype.kind not in "biuf" or array.ndim != 1:
+        return count_each(values)
+
+    counts = {}
+    keys, key_counts = np.unique(array, return_counts=True)
+    for key, count in zip(keys.tolist(), key_counts.tolist()):
+        key = canonical_key(key)
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def key_bits(key) -> str:
+    if isinstance(key, tuple):
+        return " ".join(key_bits(element) for element in key)
+    if not isinstance(key, int):
+        return ""
+    return f"0x{key & 0xFFFFFFFF:08X}"
+
 
 class ValueRangeLogger:
     """
     Count the values for asked variables in a FileDataStructure,
     use should be as follow.
     If a variable is a list the value counted will be its size.
+    With exact_bits, ints and floats are counted by their 32 bits pattern,
+    so every NaN pattern is counted once, and decoded by write_log.
+    With a batch_size, values are buffered across files and counted in bulk
+    once a variable holds batch_size of them, call flush before reading
+    logged_var.
+    The records of a streaming FileDataStructure are decoded one chunk at
+    a time while they are counted, its reader must stay open during update.
+    A FileDataStructure parsed from a random sample of its records has a
+    sampledRecords attribute mapping the name of each sampled list to how
+    many of its records were kept out of how many, the values found under
+    it stand for every record. When only a sample of the files is read,
+    set population to the number of files it was drawn from, write_log
+    then adds estimates of the counts over every value of every file.
     Add values to look for using add_var or add_vars.
     Open the file and instanciate a FileDataStructure
     if the file opens:
@@ -26,104 +265,302 @@ class ValueRangeLogger:
 
     logged_var: Dict[str, Dict]
 
-    def __init__(self, variables_name: Sequence[str]) -> None:
+    def __init__(
+        self,
+        variables_name: Sequence[str],
+        exact_bits: bool = False,
+        batch_size: int = 0
+    ) -> None:
         self.logged_var = {}
+        self.exact_bits = exact_bits
+        self.batch_size = batch_size
+        self.population = 0
+        self.values_seen: Dict[str, float] = {}
+        self.values_counted: Dict[str, int] = {}
+        self.buffers: Dict[str, List] = {}
         self.error = []
+        self.error_reasons: Dict[str, str] = {}
         self.read_files = []
+        self.duplicates: Dict[str, str] = {}
+        # Index and count of the shard of a partial result
+        self.shard: Optional[Tuple[int, int]] = None
         self.log_path = ""
         for var_name in variables_name:
             self.logged_var.update({var_name: {}})
 
+    def set_data_type(self, data_type_name: str) -> None:
+        """Name of the FileDataStructure, used to place the logs"""
+        self.log_path = path.join("results", data_type_name)
+
     def update(self, file_data_structure) -> None:
         """Looked for variable value to count inside the FileDataStructure"""
-        self.log_path = f".\\results\\{type(file_data_structure).__name__}"
+        self.set_data_type(type(file_data_structure).__name__)
+        sampled = getattr(file_data_structure, "sampledRecords", None)
 
         for var_name, dict_values in self.logged_var.items():
-            var_seq = var_name.split(".")[1:]
-            last = [file_data_structure]
+            if is_streamed(file_data_structure, var_name):
+                values = extract_streamed_values(file_data_structure, var_name)
+            else:
+                values = extract_values(file_data_structure, var_name)
+            if sampled is not None:
+                # The length of a sampled list is counted once per file
+                steps = parse_var(var_name)
+                kept, total = (1, 1)
+                if len(steps) > 1:
+                    kept, total = sampled.get(steps[0][0], (1, 1))
+                elif is_record_list(file_data_structure, var_name) and \
+                        steps[0][0] in sampled:
+                    # Its length is the number of records of the file
+                    values = [sampled[steps[0][0]][1]]
+                values = self._sampled(var_name, values, kept, total)
+            if self.batch_size:
+                self._buffer(var_name, values)
+            else:
+                self._tally(dict_values, values)
 
-            for seq in var_seq:
-                matches = re.findall(r"\[(-?\d*)(\:?)(-?\d*)\]", seq)
-                end = re.search(r"\[", seq)
+    def _sampled(
+        self,
+        var_name: str,
+        values: Iterator,
+        kept: int,
+        total: int
+    ) -> List:
+        """
+        Values of kept records out of total, each of them standing for
+        total / kept records when counting the values seen
+        """
+        values = list(values)
+        self.values_counted[var_name] = \
+            self.values_counted.get(var_name, 0) + len(values)
+        self.values_seen[var_name] = self.values_seen.get(var_name, 0) + (
+            len(values) * total / kept if kept else 0
+        )
+        return values
 
-                if end:
-                    end = end.span()[0]
+    def _buffer(self, var_name: str, values: Iterable) -> None:
+        buffer = self.buffers.setdefault(var_name, [])
+        values = iter(values)
+        while True:
+            buffer.extend(islice(values, self.batch_size - len(buffer)))
+            if len(buffer) < self.batch_size:
+                return
+            self._tally(self.logged_var[var_name], buffer, bulk=True)
+            buffer.clear()
 
-                indexes = [
-                    (int(match[0]), int(match[2])) if match[1] and match[2]
-                    else () if match[1]
-                    else (int(match[0]),)
-                    for match in matches
-                ]
+    def flush(self) -> None:
+        """Count every buffered value"""
+        for var_name, buffer in self.buffers.items():
+            self._tally(self.logged_var[var_name], buffer, bulk=True)
+            buffer.clear()
 
-                for obj in last:
-                    curr = getattr(obj, seq[:end])
+    def _tally(
+        self,
+        dict_values: Dict,
+        values: Iterable,
+        bulk: bool = False
+    ) -> None:
+        if not self.exact_bits:
+            counts = count_bulk(values) if bulk else count_each(values)
+            for key, count in counts.items():
+                dict_values[key] = dict_values.get(key, 0) + count
+            return
 
-                    for index in indexes:
-                        if len(index) > 1:
-                            curr = tuple(i for i in curr[index[0]: index[1]])
-                        elif len(index) > 0:
-                            curr = curr[index[0]]
-                        else:
-                            curr = tuple(i for i in curr)
+        # Scalars are counted in bulk by their bit pattern
+        keys = []
+        for value in values:
+            key = encode_bits(value)
+            if isinstance(key, int):
+                keys.append(key)
+            else:
+                dict_values[key] = dict_values.get(key, 0) + 1
+        if keys:
+            unique, counts = np.unique(
+                np.array(keys, dtype=np.uint64), return_counts=True
+            )
+            for key, count in zip(unique.tolist(), counts.tolist()):
+                dict_values[key] = dict_values.get(key, 0) + count
+
+    def merge(self, other: "ValueRangeLogger", factor: int = 1) -> None:
+        """
+        Add the counts and files of another logger, multiplied by factor,
+        with a negative factor its files are removed from this logger
+        """
+        self.flush()
+        other.flush()
+        for var_name, values in other.logged_var.items():
+            dict_values = self.logged_var.setdefault(var_name, {})
+            for value, count in values.items():
+                # NaN keys don't survive pickling as the same object
+                value = canonical_key(value)
+                count = dict_values.get(value, 0) + factor * count
+                if count:
+                    dict_values[value] = count
+                else:
+                    dict_values.pop(value, None)
+        for totals, other_totals in (
+            (self.values_seen, other.values_seen),
+            (self.values_counted, other.values_counted)
+        ):
+            for var_name, total in other_totals.items():
+                totals[var_name] = totals.get(var_name, 0) + factor * total
 
-                    new_last = last.copy()
+        if factor > 0:
+            self.population += other.population
+            self.read_files.extend(other.read_files)
+            self.error.extend(other.error)
+            self.error_reasons.update(other.error_reasons)
+            self.duplicates.update(other.duplicates)
+        else:
+            removed = set(other.read_files) | set(other.error)
+            self.read_files = [
+                file for file in self.read_files if file not in removed
+            ]
+            self.error = [file for file in self.error if file not in removed]
+            for file in removed:
+                self.error_reasons.pop(file, None)
+                self.duplicates.pop(file, None)
+
+    def for_copy(self, filepath: str, original: str) -> "ValueRangeLogger":
+        """
+        Logger of a copy of original, the only file this logger saw, with
+        the same counts and read or not like original
+        """
+        value_logger = ValueRangeLogger(
+            [], self.exact_bits, self.batch_size
+        )
+        value_logger.log_path = self.log_path
+        value_logger.merge(self)
+        value_logger.read_files, value_logger.error = [], []
+        value_logger.error_reasons, value_logger.duplicates = {}, {}
+        if original in self.error:
+            value_logger.file_not_read(
+                filepath, self.error_reasons.get(original, "")
+            )
+        else:
+            value_logger.file_read(filepath)
+        value_logger.duplicates[filepath] = original
+        return value_logger
 
-                    if isinstance(curr, List):
-                        new_last.extend(curr)
-                        value = len(curr)
-                    else:
-                        new_last.extend([curr])
-                        value = curr
+    def save(self, file_path: str) -> None:
+        """Write the counts and files to a compressed partial result"""
+        self.flush()
+        with gzip.open(file_path, "wb") as writer:
+            pickle.dump(self, writer, protocol=pickle.HIGHEST_PROTOCOL)
 
-                    last = new_last[1:]
+    @staticmethod
+    def load(file_path: str) -> "ValueRangeLogger":
+        """Logger written by save, only load partials from trusted runs"""
+        with gzip.open(file_path, "rb") as reader:
+            value_logger = pickle.load(reader)
+        if not isinstance(value_logger, ValueRangeLogger):
+            raise ValueError(f"{file_path} isn't a partial result")
+        return value_logger
 
-                    if seq in var_seq[-1]:
-                        if value in dict_values.keys():
-                            dict_values[value] += 1
-                        else:
-                            dict_values[value] = 1
+    def sampled_fraction(self, var_name: str) -> float:
+        """Share of the values of var_name which were counted"""
+        fraction = 1.0
+        files = len(self.read_files) + len(self.error)
+        if self.population and files:
+            fraction = min(1.0, files / self.population)
+        if self.values_seen.get(var_name):
+            fraction *= self.values_counted[var_name] / \
+                self.values_seen[var_name]
+        return fraction
+
+    @staticmethod
+    def estimate(
+        count: int,
+        fraction: float,
+        z: float = 1.96
+    ) -> Tuple[float, float, float]:
+        """
+        Count scaled to every value with its 95% confidence interval, the
+        count is taken as Poisson with a finite population correction
+        """
+        if not fraction:
+            return 0.0, 0.0, 0.0
+        scale = 1 / fraction
+        margin = z * scale * math.sqrt(count * (1 - fraction))
+        estimate = count * scale
+        return estimate, max(count, estimate - margin), estimate + margin
 
     def write_log(self) -> None:
         """Write the compiled info in the ./resulsts folder"""
+        self.flush()
         if not path.exists(self.log_path):
             os.makedirs(self.log_path)
 
         for var_name, values in self.logged_var.items():
-            path_to_csv = f"{self.log_path}\\varsDist\\"
+            path_to_csv = path.join(self.log_path, "varsDist")
 
             if not path.exists(path_to_csv):
                 os.mkdir(path_to_csv)
 
             file_name = re.sub(r"\.", "_", var_name)
             file_name = re.sub(r"\:", "to", var_name)
-            path_to_csv += f"{file_name}.csv"
+            path_to_csv = path.join(path_to_csv, f"{file_name}.csv")
             temp_dict = {
                 "Value": list(values.keys()),
                 "Count": list(values.values()),
             }
+            if self.exact_bits:
+                temp_dict["Value"] = [decode_bits(key) for key in values]
+                temp_dict["Bits"] = [key_bits(key) for key in values]
+            fraction = self.sampled_fraction(var_name)
+            if fraction < 1:
+                estimates = [
+                    self.estimate(count, fraction)
+                    for count in values.values()
+                ]
+                temp_dict["Estimate"] = [row[0] for row in estimates]
+                temp_dict["Low"] = [row[1] for row in estimates]
+                temp_dict["High"] = [row[2] for row in estimates]
 
             with open(path_to_csv, "wb") as writer:
                 DataFrame(temp_dict).to_csv(writer)
 
         with open(
-            f"{self.log_path}\\readFiles.txt", "wt", encoding="utf-8"
+            path.join(self.log_path, "readFiles.txt"), "wt", encoding="utf-8"
         ) as err_file:
             err_file.write(f"Completed file parse : {len(self.read_files)}\n")
+            if self.population:
+                err_file.write(f"Sampled from {self.population} files\n")
 
             for successful_read in self.read_files:
-                err_file.write(f"{successful_read}\n")
+                original = self.duplicates.get(successful_read)
+                if original:
+                    err_file.write(
+                        f"{successful_read} : duplicate of {original}\n"
+                    )
+                else:
+                    err_file.write(f"{successful_read}\n")
             err_file.write(
                 f"\nFiles where an error was encountered : {len(self.error)}\n"
             )
 
             for err in self.error:
-                err_file.write(f"{err}\n")
+                reason = self.error_reasons.get(err)
+                if err in self.duplicates:
+                    reason = f"duplicate of {self.duplicates[err]}"
+                err_file.write(f"{err} : {reason}\n" if reason else f"{err}\n")
 
-    def file_not_read(self, filepath: str) -> None:
+    def file_not_read(self, filepath: str, reason: str = "") -> None:
         """Add the filepath to the list of file not read"""
         self.error.append(filepath)
+        if reason:
+            self.error_reasons[filepath] = reason
 
     def file_read(self, filepath: str) -> None:
         """Add the filepath to the list of file read"""
         self.read_files.append(filepath)
+
+    def file_duplicate(self, filepath: str, original: str) -> None:
+        """
+        Add the filepath of a copy of original, it goes in the same list
+        as original, its counts are added by merging with a factor
+        """
+        self.duplicates[filepath] = original
+        if original in self.error:
+            self.error.append(filepath)
+        else:
+            self.read_files.append(filepath)